@@ -1,17 +1,87 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
-from app.api.v1.utils.langchain_utils import contextualise_chain
-from app.api.v1.utils.langgraph_agent import agent
+from app.api.v1.utils.langchain_utils import get_contextualise_chain, get_contextualise_route_chain
+from app.api.v1.utils.shared import ContextualRouteModel
+from app.api.v1.utils.langgraph_agent import get_session_agent
+from app.api.v1.utils.checkpointer import thread_config, latest_state, prune_checkpoints
+from app.api.v1.utils.session_lifecycle import get_session_lifecycle
+from app.api.v1.utils.metrics import record_cache_lookup
 from app.api.v1.utils.azure_sql_manager import AzureSQLManager
-from app.api.v1.ai.agentic.models import AgenticChatRequest, ChatResponse
+from app.api.v1.utils.vector_db_manager import get_vector_db_manager
+from app.api.v1.utils.admission import llm_priority, PRIORITY_BACKGROUND
+from app.api.v1.ai.agentic.models import AgenticChatRequest, ChatResponse, ChatBatchRequest, AnalystExportRequest
+from app.api.v1.utils.tools import open_analyst_export
+from app.api.v1.utils.columnar import csv_chunks, parquet_chunks
 from app.api.v1.utils.config import Config
-from app.api.v1.utils.utils import history_to_lc_messages, append_message
+from app.api.v1.utils.utils import history_to_lc_messages, append_message, encode_cursor, decode_cursor, is_sql_timestamp
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+import contextvars
+import importlib.util
+import json
 import logging
+import time
 
 agentic_router = APIRouter(prefix= "/agentic")
 logging.basicConfig(filename='app.log', level=logging.INFO)
 
 
+def contextualiser():
+    """
+    The chain turning (chat_history, input) into the turn's stand-alone question. With
+    AGENT_COMBINED_ROUTING it also decides the route, saving the router's LLM round trip.
+    """
+    if Config().agent_combined_routing:
+        return get_contextualise_route_chain()
+    return get_contextualise_chain()
+
+
+def split_contextualised(result) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """(stand-alone question, preset route or None) from a `contextualiser()` result."""
+    if isinstance(result, ContextualRouteModel):
+        return result.standalone_question, {"route": result.route, "reply": result.reply}
+    return result, None
+
+
+def run_agent(messages: List[BaseMessage], standalone_q: str, session_id: str,
+              preset_route: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Run the LangGraph agent for one stand-alone question and return the final AI answer.
+    The turn is checkpointed under the session id so the next one can resume from it.
+    A `preset_route` from the combined contextualise-and-route call replaces the router's LLM call.
+    """
+    conf = Config()
+    messages = append_message(messages, HumanMessage(content=standalone_q))[-conf.agent_max_messages:]
+
+    # Invoke the LangGraph; per-turn fields are reset so a previous turn's results never
+    # leak into this answer, while `reuse` carries over from the checkpoint.
+    result = get_session_agent().invoke(
+        {"messages": messages, "session_id": session_id, "rag": [], "web": "", "analyst": None,
+         "preset_route": preset_route},
+        config=thread_config(session_id),
+        durability="exit",
+    )
+    prune_checkpoints(session_id, conf.agent_checkpoint_keep)
+
+    # Get the last AI message
+    last_message = next((m for m in reversed(result["messages"])
+                       if isinstance(m, AIMessage)), None)
+
+    if last_message:
+        return last_message.content
+    return "I apologize, but I couldn't generate a response at this time."
+
+
+def session_messages(azure_db: AzureSQLManager, session_id: str) -> List[BaseMessage]:
+    """Conversation so far: from the session's checkpoint, or rebuilt from the SQL history."""
+    state = latest_state(get_session_agent(), session_id)
+    record_cache_lookup("agent_checkpoint", state is not None)
+    if state is not None:
+        return state.get("messages", [])
+    return history_to_lc_messages(azure_db.get_chat_history(session_id))
+
+
 @agentic_router.post("/chat")
 def chat(query_input: AgenticChatRequest):
     """
@@ -24,32 +94,17 @@ def chat(query_input: AgenticChatRequest):
         # Store the conversation
         azure_db = AzureSQLManager(Config())
 
-        # Convert chat history to LangChain messages
-        chat_history = azure_db.get_chat_history(query_input.session_id)
-        messages = history_to_lc_messages(chat_history)
+        # Resume from the checkpoint; the SQL history is only read when there is none
+        messages = session_messages(azure_db, query_input.session_id)
 
         # Add current user message
-        # 2. Generate a stand-alone question
-        standalone_q = contextualise_chain.invoke({
+        # 2. Generate a stand-alone question (and, in combined mode, its route)
+        standalone_q, preset_route = split_contextualised(contextualiser().invoke({
             "chat_history": messages,
             "input": query_input.question,
-        })
-
-        messages = append_message(messages, HumanMessage(content=standalone_q))
-
-        # Invoke the LangGraph
-        result = agent.invoke(
-            {"messages": messages, "session_id": query_input.session_id}
-        )
-
-        # Get the last AI message
-        last_message = next((m for m in reversed(result["messages"])
-                           if isinstance(m, AIMessage)), None)
+        }))
 
-        if last_message:
-            answer = last_message.content
-        else:
-            answer = "I apologize, but I couldn't generate a response at this time."
+        answer = run_agent(messages, standalone_q, query_input.session_id, preset_route)
 
         params = (query_input.session_id, query_input.user_id, query_input.question, answer, query_input.user_id)
         azure_db.insert_chat_history(params)
@@ -62,27 +117,205 @@ def chat(query_input: AgenticChatRequest):
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
 
+@agentic_router.post("/chat-batch")
+def chat_batch(request: ChatBatchRequest):
+    """
+    Runs many (session_id, question) items through the agent and streams one JSON line per item
+    as it finishes. Items of the same session run in order so follow-up questions see earlier
+    answers; each round contextualises its questions concurrently (`Runnable.batch` still sends
+    one LLM request per question, on a thread pool), pre-embeds them in one embedding request,
+    and runs the agent with bounded concurrency. History is written in bulk.
+    """
+    conf = Config()
+    if len(request.items) > conf.chat_batch_max_items:
+        raise HTTPException(status_code=413, detail=f"At most {conf.chat_batch_max_items} items per batch.")
+    concurrency = min(request.max_concurrency or conf.chat_batch_max_concurrency, conf.chat_batch_max_concurrency)
+
+    def line(payload):
+        return json.dumps(payload, default=str) + "\n"
+
+    def generate():
+        azure_db = AzureSQLManager(conf)
+        pending_rows = []
+
+        def flush_history():
+            if request.persist_history and pending_rows:
+                if not azure_db.insert_chat_history_bulk(pending_rows):
+                    logging.error(f"Bulk chat history insert failed for {len(pending_rows)} rows")
+                pending_rows.clear()
+
+        try:
+            try:
+                session_ids = list(dict.fromkeys(item.session_id for item in request.items))
+                histories = {sid: history_to_lc_messages(rows)
+                             for sid, rows in azure_db.get_chat_histories(session_ids).items()}
+            except Exception as e:
+                logging.error(f"Error loading chat histories for batch: {str(e)}")
+                for index, item in enumerate(request.items):
+                    yield line({"index": index, "id": item.id, "session_id": item.session_id,
+                                "error": f"History lookup failed: {str(e)}"})
+                return
+
+            # Round n holds the n-th item of every session.
+            rounds, seen = [], {}
+            for index, item in enumerate(request.items):
+                position = seen.get(item.session_id, 0)
+                seen[item.session_id] = position + 1
+                if position == len(rounds):
+                    rounds.append([])
+                rounds[position].append(index)
+
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                for round_indices in rounds:
+                    items = [request.items[i] for i in round_indices]
+                    # Bulk traffic queues behind interactive /chat calls.
+                    with llm_priority(PRIORITY_BACKGROUND):
+                        standalone = [
+                            result if isinstance(result, Exception) else split_contextualised(result)
+                            for result in contextualiser().batch(
+                                [{"chat_history": histories[item.session_id], "input": item.question} for item in items],
+                                config={"max_concurrency": concurrency},
+                                return_exceptions=True,
+                            )
+                        ]
+                        try:
+                            # Only questions that may reach retrieval need an embedding.
+                            get_vector_db_manager().prime_query_embeddings(
+                                [q for q, preset in (r for r in standalone if not isinstance(r, Exception))
+                                 if preset is None or preset["route"] == "rag"])
+                        except Exception as e:
+                            logging.warning(f"Batch query embedding failed, falling back to per-query: {str(e)}")
+
+                        futures, failed = {}, []
+                        for index, item, contextualised in zip(round_indices, items, standalone):
+                            if isinstance(contextualised, Exception):
+                                failed.append((index, item, contextualised))
+                                continue
+                            standalone_q, preset_route = contextualised
+                            future = pool.submit(contextvars.copy_context().run, _timed_run_agent,
+                                                 histories[item.session_id], standalone_q, item.session_id,
+                                                 preset_route)
+                            futures[future] = (index, item)
+
+                    # Yield outside the priority block: the generator may resume in another context.
+                    for index, item, error in failed:
+                        yield line({"index": index, "id": item.id, "session_id": item.session_id,
+                                    "error": f"Chat error: {str(error)}"})
+                    for future in as_completed(futures):
+                        index, item = futures[future]
+                        try:
+                            answer, seconds = future.result()
+                        except Exception as e:
+                            logging.error(f"Error in chat batch item {index}: {str(e)}")
+                            yield line({"index": index, "id": item.id, "session_id": item.session_id,
+                                        "error": f"Chat error: {str(e)}"})
+                            continue
+                        histories[item.session_id] = histories[item.session_id] + [
+                            HumanMessage(content=item.question), AIMessage(content=answer)]
+                        pending_rows.append((item.session_id, item.user_id, item.question, answer, item.user_id))
+                        if len(pending_rows) >= conf.chat_batch_history_flush:
+                            flush_history()
+                        yield line({"index": index, "id": item.id, "session_id": item.session_id,
+                                    "answer": answer, "latency_ms": round(seconds * 1000, 1)})
+        finally:
+            flush_history()
+            azure_db.disconnect()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+def _timed_run_agent(messages: List[BaseMessage], standalone_q: str, session_id: str,
+                     preset_route: Optional[Dict[str, Any]] = None):
+    start = time.perf_counter()
+    answer = run_agent(messages, standalone_q, session_id, preset_route)
+    return answer, time.perf_counter() - start
+
+
+@agentic_router.post("/analyst-export")
+def analyst_export(request: AnalystExportRequest):
+    """
+    Generates SQL for the question and streams its full result as CSV or Parquet straight from
+    a server-side cursor; nothing goes through the answer LLM.
+    """
+    if request.format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow on the server.")
+
+    try:
+        analyst, batches = open_analyst_export(request.question)
+    except Exception as e:
+        logging.error(f"Error in analyst export: {str(e)}")
+        raise HTTPException(status_code=422, detail=f"Could not build a query for the question: {str(e)}")
+
+    logging.info(f"Analyst export ({request.format}) SQL: {analyst.sql} params: {analyst.params}")
+    if request.format == "parquet":
+        body, media_type = parquet_chunks(batches), "application/vnd.apache.parquet"
+    else:
+        body, media_type = csv_chunks(batches), "text/csv"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="analyst_export.{request.format}"'},
+    )
+
+
+def _page_args(limit: Optional[int], cursor: Optional[str], types: Tuple[type, ...], default: int, conf: Config):
+    """(page size, keyset key or None); both listings key on a DATETIME2 text first."""
+    try:
+        key = decode_cursor(cursor, types)
+        if key is not None and not is_sql_timestamp(key[0]):
+            raise ValueError("Malformed cursor")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    return max(1, min(limit or default, conf.max_page_size)), key
+
+
 @agentic_router.get("/get-chat-history")
-def get_chat_history(session_id: str):
-    azure_sql_manager = AzureSQLManager(Config())
-    chat_history = azure_sql_manager.get_chat_history([session_id])
-    messages = [{"human": hum, "ai": ai} for hum, ai in chat_history]
-    response = {"session_id": session_id, "messages": messages}
+def get_chat_history(session_id: str, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """
+    Latest `limit` turns of a session in chronological order. Pass `next_cursor` back as
+    `cursor` to load the turns before them; it is null on the oldest page.
+    """
+    conf = Config()
+    limit, key = _page_args(limit, cursor, (str, int), conf.history_page_size, conf)
+    azure_sql_manager = AzureSQLManager(conf)
+    # One extra row tells whether an older page exists.
+    rows = azure_sql_manager.get_chat_history_page(session_id, limit + 1, key)
+    azure_sql_manager.disconnect()
+    page = rows[:limit]
+    next_cursor = encode_cursor((page[-1][2], page[-1][3])) if len(rows) > limit else None
+    messages = [{"human": hum, "ai": ai} for hum, ai, _, _ in reversed(page)]
+    response = {"session_id": session_id, "messages": messages, "next_cursor": next_cursor}
     return response
 
 @agentic_router.delete("/delete-chat-history")
 def delete_chat_history(session_id: str):
-    azure_sql_manager = AzureSQLManager(Config())
-    status = azure_sql_manager.delete_chat_history([session_id])
-    return status
+    """
+    Deletes the session's chat history together with its indexed chunks, uploaded files and
+    checkpoints. Returns False when something could not be removed; the call can be repeated.
+    """
+    try:
+        return get_session_lifecycle().purge([session_id], archive=False)["sessions"] == 1
+    except Exception as e:
+        logging.error(f"Deleting session {session_id} failed: {str(e)}")
+        return False
 
 
 @agentic_router.get("/all-session-ids")
-def get_all_session_ids(user_id: str):
-    azure_sql_manager = AzureSQLManager(Config())
-    chat_history = azure_sql_manager.get_first_record_per_group([user_id])
-    response = [{"session_id": sid, "user_question": q} for sid, q in chat_history]
-    return response
+def get_all_session_ids(user_id: str, response: Response, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """
+    A user's sessions, most recently active first. The cursor for the next page is returned
+    in the `X-Next-Cursor` header (absent on the last page) so the body keeps its list shape.
+    """
+    conf = Config()
+    limit, key = _page_args(limit, cursor, (str, str), conf.sessions_page_size, conf)
+    azure_sql_manager = AzureSQLManager(conf)
+    rows = azure_sql_manager.get_sessions_page(user_id, limit + 1, key)
+    azure_sql_manager.disconnect()
+    page = rows[:limit]
+    if len(rows) > limit:
+        response.headers["X-Next-Cursor"] = encode_cursor((page[-1][3], page[-1][0]))
+    return [{"session_id": sid, "user_question": q, "turn_count": turns, "last_activity": last_activity}
+            for sid, q, turns, last_activity in page]
 
 
 
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
 
 class AgenticChatRequest(BaseModel):
     session_id: str
@@ -7,4 +8,19 @@ class AgenticChatRequest(BaseModel):
 
 class ChatResponse(BaseModel):
     answer: str
-    session_id: str
\ No newline at end of file
+    session_id: str
+
+class ChatBatchItem(BaseModel):
+    session_id: str
+    user_id: str
+    question: str
+    id: Optional[str] = None
+
+class ChatBatchRequest(BaseModel):
+    items: List[ChatBatchItem] = Field(..., min_length=1)
+    max_concurrency: Optional[int] = Field(None, ge=1)
+    persist_history: bool = True
+
+class AnalystExportRequest(BaseModel):
+    question: str
+    format: Literal["csv", "parquet"] = "csv"
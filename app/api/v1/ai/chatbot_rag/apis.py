@@ -1,12 +1,17 @@
 from fastapi import APIRouter, File, UploadFile, Form
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 from app.api.v1.ai.chatbot_rag.models import AskQuestionRequest
 from app.api.v1.ai.chatbot_rag.services import *
-from app.api.v1.utils.vector_db_manager import VectorDBManager
+from app.api.v1.utils.vector_db_manager import get_vector_db_manager
 from app.api.v1.utils.azure_sql_manager import AzureSQLManager
-from langchain_community.document_loaders import Docx2txtLoader
+from app.api.v1.utils.admission import llm_priority, PRIORITY_BACKGROUND
+from app.api.v1.utils.document_parser import get_document_parser, DocumentParseError
+from app.api.v1.utils.langgraph_agent import forget_reusable_context
 from app.api.v1.utils.config import Config
 from typing import List
+import asyncio
+import logging
 import os
 import json
 
@@ -14,41 +19,95 @@ import json
 
 rag_router = APIRouter(prefix= "/chatbot-rag")
 
+UPLOAD_READ_BYTES = 1024 * 1024
+
+
+async def _save_upload(file: UploadFile, file_location: str, max_bytes: int):
+    """Stream the upload to disk, aborting as soon as it exceeds `max_bytes`."""
+    size = 0
+    try:
+        with open(file_location, "wb") as f:
+            while chunk := await file.read(UPLOAD_READ_BYTES):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise DocumentParseError(f"File exceeds {max_bytes} bytes.")
+                f.write(chunk)
+    except BaseException:
+        # Never leave a partial file in the session's upload dir (also when cancelled).
+        _discard(file_location)
+        raise
+
+
+def _discard(file_location: str):
+    if os.path.exists(file_location):
+        os.remove(file_location)
+
+
+def _index_and_record(text, file_location, file_name, session_id, user_id):
+    """Blocking half of an upload (embedding + SQL), run in the threadpool."""
+    # Ingestion embeddings queue behind interactive chat traffic.
+    with llm_priority(PRIORITY_BACKGROUND):
+        stats = get_vector_db_manager().index_text(text, file_location, session_id)
+    # A repeated question must now search the new document too.
+    forget_reusable_context(session_id, "rag")
+    sql_db = AzureSQLManager(Config())
+    params = (session_id, user_id, file_name, user_id)
+    status = sql_db.insert_file_metadata(params)
+    sql_db.disconnect()
+    if not status:
+        raise Exception("Insertion to Azure SQL failed.")
+    return stats
+
 
 @rag_router.post("/file-upload")
 async def upload_files(session_id: str, user_id: str, files: List[UploadFile] = File(...)):
     """
-    Endpoint to upload multiple files.
-    Files are stored in the `temp_data` directory.
+    Endpoint to upload multiple files (.docx, .pdf, .txt, .md, .csv; detected from content).
+    Files are stored under UPLOAD_DIR (default `temp_data`), parsed concurrently in the parser process
+    pool and indexed off the event loop. Files that fail are reported in `failed_files`.
     """
-    try:
-        uploaded_file_names = []
-        folder_base_path = f"temp_data/{session_id}"
-        os.makedirs(folder_base_path, exist_ok = True)
-        vector_db = VectorDBManager(Config())
-        sql_db = AzureSQLManager(Config())
-        for file in files:
-            file_location = f"{folder_base_path}/{file.filename}"
-            with open(file_location, "wb") as f:
-                f.write(await file.read())
-            uploaded_file_names.append(file.filename)
-
-            loader = Docx2txtLoader(file_location)
-            document = loader.load()
-            vector_db.add_document_if_not_exist(document, session_id)
-            params = (session_id, user_id, file.filename, user_id)
-            status = sql_db.insert_file_metadata(params)
-            sql_db.disconnect()
-            if not status:
-                raise Exception("Insertion to Azure SQL failed.")
-        return {"uploaded_files": uploaded_file_names, "message": "Files uploaded successfully!"}
-    except Exception as e:
-        return {"uploaded_files": [], "message": "Files upload failed!"}
+    conf = Config()
+    folder_base_path = os.path.join(conf.upload_dir, session_id)
+    os.makedirs(folder_base_path, exist_ok = True)
+    parser = get_document_parser()
+
+    async def process(file: UploadFile):
+        file_name = os.path.basename(file.filename or "upload")
+        file_location = f"{folder_base_path}/{file_name}"
+        try:
+            await _save_upload(file, file_location, conf.parser_max_file_bytes)
+            try:
+                text = await parser.parse(file_location)
+            except BaseException:
+                # A file that cannot be parsed is never indexed; do not keep it either.
+                _discard(file_location)
+                raise
+            stats = await run_in_threadpool(_index_and_record, text, file_location, file_name, session_id, user_id)
+            return file_name, stats, None
+        except Exception as e:
+            logging.error(f"Upload of {file_name} failed: {str(e)}")
+            return file_name, None, str(e)
+
+    results = await asyncio.gather(*(process(file) for file in files))
+    uploaded = [name for name, _, error in results if error is None]
+    failed = [{"file": name, "error": error} for name, _, error in results if error is not None]
+    if not uploaded:
+        message = "Files upload failed!"
+    elif failed:
+        message = "Some files failed to upload."
+    else:
+        message = "Files uploaded successfully!"
+    return {
+        "uploaded_files": uploaded,
+        "failed_files": failed,
+        "chunks": {name: stats for name, stats, error in results if error is None},
+        "message": message,
+    }
 
 
 @rag_router.post("/ask-question")
 async def ask_question(request: AskQuestionRequest):
-    vector_db_manager = VectorDBManager(Config())
+    vector_db_manager = get_vector_db_manager()
     response = vector_db_manager.query_with_document(
                         request.user_question
                         ,request.session_id)
@@ -1,9 +1,11 @@
 from fastapi import APIRouter
-from app.api.v1.spark.services import PostgresSparkHelper
+from app.api.v1.spark.services import PostgresSparkHelper, NumpySalesDataGenerator, SALES_COLUMNS, BRONZE_SALES_DDL, dataframe_to_csv_buffer, prefetch
 from db.connect import PostgreSQLDatabase
 from dotenv import load_dotenv
+from typing import Literal, Optional
 import os
 import json
+import time
 
 spark_router = APIRouter(prefix= "/spark")
 
@@ -29,24 +31,7 @@ async def create_bronze_table():
     )
 
     db.connect()
-    create_table_script = """
-            CREATE SCHEMA IF NOT EXISTS bronze;
-            CREATE TABLE IF NOT EXISTS bronze.sales_data (
-                date DATE NOT NULL,                              -- Sale date
-                store_id INTEGER NOT NULL,                      -- Store ID
-                store_region VARCHAR(50) NOT NULL,             -- Store region
-                sku_id INTEGER NOT NULL,                        -- SKU (product) ID
-                category VARCHAR(50) NOT NULL,                 -- Product category
-                units_sold INTEGER NOT NULL,                    -- Number of units sold
-                revenue NUMERIC(10, 2) NOT NULL,                -- Revenue generated
-                promo_flag BOOLEAN NOT NULL,                    -- Promotion flag (true if promo is active)
-                promo_type VARCHAR(50),                         -- Type of promotion (can be NULL)
-                price NUMERIC(10, 2) NOT NULL,                  -- Product price
-                inventory_level INTEGER NOT NULL,               -- Inventory level
-                store_size VARCHAR(20) NOT NULL,               -- Size of the store (Small, Medium, Large)
-                holiday_flag BOOLEAN NOT NULL                  -- Weekend/holiday flag (true for Sat/Sun)
-            );
-    """
+    create_table_script = f"CREATE SCHEMA IF NOT EXISTS bronze;\n{BRONZE_SALES_DDL.format(table='bronze.sales_data')}"
     tbl_status = db.execute_ddl_script(create_table_script)
     # Close the database connection
     db.close_connection()
@@ -60,7 +45,14 @@ async def create_bronze_table():
 
 
 @spark_router.post("/ingest-bronze-tables")
-async def ingest_bronze_table():
+def ingest_bronze_table(mode: Literal["spark", "numpy"] = "spark", num_rows: int = 5000,
+                        chunk_size: int = 100_000, seed: Optional[int] = None):
+    """
+    Truncates and reloads the bronze sales table with synthetic data.
+    `mode="spark"` generates and writes through a SparkSession over JDBC; `mode="numpy"`
+    generates `chunk_size` rows at a time with NumPy and streams each chunk with COPY FROM
+    STDIN, without starting a JVM.
+    """
     try:
         # load config to enviroment variables.
         load_dotenv()
@@ -83,22 +75,34 @@ async def ingest_bronze_table():
             port= port
         )
 
+        start = time.perf_counter()
         db.connect()
-        truncate_statment = f"""TRUNCATE TABLE {schema_name}.{tbl_name}"""
-        tbl_status = db.execute_ddl_script(truncate_statment)
-        # Close the database connection
-        db.close_connection()
 
-        spark = PostgresSparkHelper(app_name= "BronzeLayerIngestion",
-                                jdbc_url= jdbc_url, 
-                                user= user, password= password)
-        
-        df = spark.generate_pyspark_data(num_rows= 5000)
-        record_count = df.count()
-        spark.write_table(df, schema_name= schema_name, table_name= tbl_name)
+        if mode == "numpy":
+            generator = NumpySalesDataGenerator(seed= seed)
+            chunks = prefetch(dataframe_to_csv_buffer(df) for df in generator.generate_chunks(num_rows, chunk_size))
+            # TRUNCATE and COPY commit together: a failed load keeps the previous rows.
+            record_count = db.copy_csv_chunks(f"{schema_name}.{tbl_name}", SALES_COLUMNS, chunks, truncate=True)
+            db.close_connection()
+            if record_count < 0:
+                raise Exception("COPY into bronze table failed")
+        else:
+            truncate_statment = f"""TRUNCATE TABLE {schema_name}.{tbl_name}"""
+            tbl_status = db.execute_ddl_script(truncate_statment)
+            # Close the database connection
+            db.close_connection()
+
+            spark = PostgresSparkHelper(app_name= "BronzeLayerIngestion",
+                                    jdbc_url= jdbc_url, 
+                                    user= user, password= password)
+            
+            df = spark.generate_pyspark_data(num_rows= num_rows)
+            record_count = df.count()
+            spark.write_table(df, schema_name= schema_name, table_name= tbl_name)
 
-        spark.stop_spark()
-        return {"message": f"{record_count} records loaded successfully"}
+            spark.stop_spark()
+        return {"message": f"{record_count} records loaded successfully",
+                "mode": mode, "seconds": round(time.perf_counter() - start, 2)}
     except Exception as e:
         print(e)
-        return {"message": f"Data ingestion failed"}
\ No newline at end of file
+        return {"message": f"Data ingestion failed"}
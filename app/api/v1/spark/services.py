@@ -1,11 +1,45 @@
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import col, lit, rand, floor, when, expr, udf
-from pyspark.sql.types import StructType, StructField, StringType, IntegerType, FloatType, DateType, BooleanType
+import io
+import os
+import queue
 import random
+import threading
+from typing import Iterable, Iterator, Optional
+from urllib.parse import urlparse
+
 import numpy as np
+import pandas as pd
+
+# Column order of bronze.sales_data, used by both generators and the COPY loader.
+SALES_COLUMNS = [
+    "date", "store_id", "store_region", "sku_id", "category", "units_sold", "revenue",
+    "promo_flag", "promo_type", "price", "inventory_level", "store_size", "holiday_flag",
+]
+
+# Table definition of bronze.sales_data; `{table}` is the schema-qualified name.
+BRONZE_SALES_DDL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        date DATE NOT NULL,                              -- Sale date
+        store_id INTEGER NOT NULL,                      -- Store ID
+        store_region VARCHAR(50) NOT NULL,             -- Store region
+        sku_id INTEGER NOT NULL,                        -- SKU (product) ID
+        category VARCHAR(50) NOT NULL,                 -- Product category
+        units_sold INTEGER NOT NULL,                    -- Number of units sold
+        revenue NUMERIC(10, 2) NOT NULL,                -- Revenue generated
+        promo_flag BOOLEAN NOT NULL,                    -- Promotion flag (true if promo is active)
+        promo_type VARCHAR(50),                         -- Type of promotion (can be NULL)
+        price NUMERIC(10, 2) NOT NULL,                  -- Product price
+        inventory_level INTEGER NOT NULL,               -- Inventory level
+        store_size VARCHAR(20) NOT NULL,               -- Size of the store (Small, Medium, Large)
+        holiday_flag BOOLEAN NOT NULL                  -- Weekend/holiday flag (true for Sat/Sun)
+    );
+"""
+
+# Postgres JDBC driver jar; override with SPARK_JARS.
+DEFAULT_SPARK_JARS = r"C:\Users\dinesh_vel\Desktop\learning\llm_capstone\package\postgresql-42.7.8.jar"
 
 class PostgresSparkHelper:
-    def __init__(self, app_name: str, jdbc_url: str, user: str, password: str, driver: str = "org.postgresql.Driver"):
+    def __init__(self, app_name: str, jdbc_url: str, user: str, password: str, driver: str = "org.postgresql.Driver",
+                 master: str = "local", jars: Optional[str] = None):
         """
         Constructor to initialize the helper class with PostgreSQL JDBC connection details.
         
@@ -14,19 +48,24 @@ class PostgresSparkHelper:
         :param user: Database username.
         :param password: Database password.
         :param driver: JDBC driver class (default: 'org.postgresql.Driver').
+        :param master: Spark master (default: 'local', a single core; 'local[*]' uses all cores).
+        :param jars: Comma-separated jars for the session (default: SPARK_JARS or the bundled JDBC driver).
         """
         self.app_name = app_name
         self.jdbc_url = jdbc_url
         self.user = user
         self.password = password
         self.driver = driver
-        
+
+        # PySpark is imported here rather than at module level so the API starts without the JVM tooling.
+        from pyspark.sql import SparkSession
+
         # Create a Spark session
         self.spark = SparkSession.builder \
-            .master("local")\
+            .master(master)\
             .config("spark.sql.execution.pyspark.udf.faulthandler.enabled", "true") \
             .config("spark.python.worker.faulthandler.enabled", "true") \
-            .config("spark.jars", r"C:\Users\dinesh_vel\Desktop\learning\llm_capstone\package\postgresql-42.7.8.jar") \
+            .config("spark.jars", jars or os.getenv("SPARK_JARS", DEFAULT_SPARK_JARS)) \
             .appName(self.app_name) \
             .getOrCreate()
 
@@ -47,22 +86,69 @@ class PostgresSparkHelper:
         
         return df
     
-    def write_table(self, df, schema_name: str, table_name: str, write_mode: str = "append"):
+    def write_table(self, df, schema_name: str, table_name: str, write_mode: str = "append",
+                    batch_size: Optional[int] = None, num_partitions: Optional[int] = None,
+                    rewrite_batched_inserts: bool = False):
         """
         Writes a Spark DataFrame to a PostgreSQL table.
 
         :param df: Spark DataFrame to be written.
         :param table_name: Target table name in PostgreSQL.
         :param write_mode: Write mode (default: 'append'). Can be 'overwrite', 'append', etc.
+        :param batch_size: Rows per JDBC batch (Spark's default is 1000).
+        :param num_partitions: Maximum concurrent JDBC connections; larger DataFrames are coalesced.
+        :param rewrite_batched_inserts: Let the Postgres driver rewrite each batch into multi-row INSERTs.
         """
-        df.write.format("jdbc") \
+        writer = df.write.format("jdbc") \
             .option("url", self.jdbc_url) \
             .option("dbtable", f"{schema_name}.{table_name}") \
             .option("user", self.user) \
             .option("password", self.password) \
-            .option("driver", self.driver)\
-            .mode(write_mode) \
-            .save()
+            .option("driver", self.driver)
+        if batch_size:
+            writer = writer.option("batchsize", batch_size)
+        if num_partitions:
+            writer = writer.option("numPartitions", num_partitions)
+        if rewrite_batched_inserts:
+            # Unknown options are passed to the driver as connection properties.
+            writer = writer.option("reWriteBatchedInserts", "true")
+        writer.mode(write_mode).save()
+
+    def copy_table(self, df, schema_name: str, table_name: str, columns=SALES_COLUMNS) -> int:
+        """
+        Appends a Spark DataFrame to a PostgreSQL table with COPY FROM STDIN, one connection
+        and transaction per partition, bypassing JDBC INSERT batches.
+
+        :param df: Spark DataFrame whose columns are `columns`, in order.
+        :param table_name: Target table name in PostgreSQL.
+        :return: Number of rows copied.
+        """
+        url = urlparse(self.jdbc_url[len("jdbc:"):])
+        params = {
+            "db_name": url.path.lstrip("/"), "user": self.user, "password": self.password,
+            "host": url.hostname, "port": url.port or 5432,
+        }
+        table = f"{schema_name}.{table_name}"
+        columns = list(columns)
+
+        def copy_partition(rows):
+            # Runs in the Python workers, so everything is imported and connected here.
+            from db.connect import PostgreSQLDatabase
+
+            pdf = pd.DataFrame([tuple(row) for row in rows], columns=columns)
+            if pdf.empty:
+                return iter([0])
+            db = PostgreSQLDatabase(**params)
+            db.connect()
+            try:
+                copied = db.copy_csv_chunks(table, columns, [dataframe_to_csv_buffer(pdf)])
+            finally:
+                db.close_connection()
+            if copied < 0:
+                raise RuntimeError(f"COPY into {table} failed")
+            return iter([copied])
+
+        return sum(df.select(*columns).rdd.mapPartitions(copy_partition).collect())
     
     def stop_spark(self):
         """
@@ -71,6 +157,9 @@ class PostgresSparkHelper:
         self.spark.stop()
 
     def generate_pyspark_data(self, num_rows):
+        from pyspark.sql.functions import col, rand, floor, when, expr
+        from pyspark.sql.types import StringType, IntegerType, FloatType, DateType, BooleanType
+
         # Generate Data in PySpark
         df = self.spark.range(0, num_rows).withColumn("id", col("id"))
 
@@ -109,3 +198,114 @@ class PostgresSparkHelper:
         )
         
         return df
+
+
+def _chained_choice(rng: np.random.Generator, size: int, thresholds, labels) -> np.ndarray:
+    """
+    Vectorised `when(rand() < t1, l1).when(rand() < t2, l2)...otherwise(last)`: like Spark,
+    every branch draws its own uniform, so e.g. P(l2) = (1 - t1) * t2 rather than t2 - t1.
+    """
+    out = np.full(size, labels[-1], dtype=object)
+    undecided = np.ones(size, dtype=bool)
+    for threshold, label in zip(thresholds, labels):
+        take = undecided & (rng.random(size) < threshold)
+        out[take] = label
+        undecided &= ~take
+    return out
+
+
+class NumpySalesDataGenerator:
+    """
+    Spark-free generator for `bronze.sales_data` with the same distributions as
+    `PostgresSparkHelper.generate_pyspark_data`, produced in fixed-size pandas chunks so
+    memory stays bounded regardless of the total row count.
+    """
+
+    START_DATE = np.datetime64("2022-01-01")
+
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = np.random.default_rng(seed)
+
+    def generate_chunk(self, size: int) -> pd.DataFrame:
+        rng = self.rng
+        date = self.START_DATE + np.floor(rng.random(size) * 365).astype("timedelta64[D]")
+        promo_flag = rng.random(size) < 0.2
+        base_price = np.floor(rng.random(size) * 8 + 2)
+        price = base_price * np.where(promo_flag, 0.8, 1.0)
+        units_sold = np.where(
+            promo_flag, np.floor(rng.random(size) * 20 + 20), np.floor(rng.random(size) * 10 + 10)
+        ).astype(np.int32)
+        promo_type = _chained_choice(rng, size, (0.33, 0.66), ("Discount", "BuyOneGetOne", "FlashSale"))
+        promo_type[~promo_flag] = None
+        # 1970-01-01 was a Thursday; Monday = 0 like Spark's WEEKDAY().
+        weekday = (date.astype("int64") + 3) % 7
+
+        return pd.DataFrame({
+            "date": date,
+            "store_id": np.floor(rng.random(size) * 10 + 1).astype(np.int32),
+            "store_region": _chained_choice(rng, size, (0.33, 0.66), ("North", "South", "East")),
+            "sku_id": np.floor(rng.random(size) * 50 + 101).astype(np.int32),
+            "category": _chained_choice(rng, size, (0.2, 0.4, 0.6, 0.8),
+                                        ("Beverages", "Snacks", "Dairy", "Household", "Personal Care")),
+            "units_sold": units_sold,
+            # Spark casts revenue and price to FloatType before the NUMERIC(10, 2) columns.
+            "revenue": (units_sold * price).astype(np.float32),
+            "promo_flag": promo_flag,
+            "promo_type": promo_type,
+            "price": price.astype(np.float32),
+            "inventory_level": np.floor(rng.random(size) * 900 + 100).astype(np.int32),
+            "store_size": _chained_choice(rng, size, (0.33, 0.66), ("Small", "Medium", "Large")),
+            "holiday_flag": np.isin(weekday, (5, 6)),
+        }, columns=SALES_COLUMNS)
+
+    def generate_chunks(self, num_rows: int, chunk_size: int = 100_000) -> Iterator[pd.DataFrame]:
+        for start in range(0, num_rows, chunk_size):
+            yield self.generate_chunk(min(chunk_size, num_rows - start))
+
+
+def dataframe_to_csv_buffer(df: pd.DataFrame) -> io.StringIO:
+    """CSV payload for `COPY ... FROM STDIN WITH (FORMAT csv)`; None becomes an unquoted empty field (NULL)."""
+    buffer = io.StringIO()
+    df.to_csv(buffer, header=False, index=False, float_format="%.2f", date_format="%Y-%m-%d")
+    buffer.seek(0)
+    return buffer
+
+
+def prefetch(items: Iterable, depth: int = 2) -> Iterator:
+    """
+    Produce `items` on a background thread, at most `depth` ahead of the consumer, so chunk
+    generation and CSV encoding overlap with COPY (psycopg2 releases the GIL on I/O) while
+    memory stays bounded to a few chunks.
+    """
+    done = object()
+    buffer: "queue.Queue" = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in items:
+                if stop.is_set():
+                    return
+                buffer.put(item)
+            buffer.put(done)
+        except BaseException as e:
+            buffer.put(e)
+
+    thread = threading.Thread(target=produce, name="chunk-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # Unblock a producer waiting on a full queue.
+        while thread.is_alive():
+            try:
+                buffer.get(timeout=0.1)
+            except queue.Empty:
+                pass
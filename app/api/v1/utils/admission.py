@@ -0,0 +1,437 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+import httpx
+from app.api.v1.utils.config import Config
+from app.api.v1.utils.metrics import (
+    ADMISSION_CONCURRENCY,
+    ADMISSION_REJECTED,
+    ADMISSION_THROTTLED,
+    ADMISSION_WAIT,
+)
+
+# Lower value is served first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+_priority: ContextVar[int] = ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+DEPLOYMENT_RE = re.compile(r"/openai/deployments/([^/]+)/")
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """Run the enclosed Azure OpenAI calls with the given admission priority."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class AdmissionTimeout(Exception):
+    """A queued call could not be admitted before its deadline."""
+
+
+class TokenBucket:
+    """Refills `capacity` units per minute; a capacity of 0 disables the bucket."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 when they are now)."""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        # A single call larger than the whole budget is admitted once the bucket is full.
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float):
+        if self.capacity:
+            self.level -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class _Waiter:
+    __slots__ = ("priority", "tokens", "deadline", "cancelled")
+
+    def __init__(self, priority: int, tokens: int, deadline: float):
+        self.priority = priority
+        self.tokens = tokens
+        self.deadline = deadline
+        self.cancelled = False
+
+
+class DeploymentLimiter:
+    """
+    Admission for one Azure OpenAI deployment.
+
+    Calls wait in a priority queue (interactive before background, FIFO within a priority)
+    and are admitted when they reach the head, a concurrency slot is free and the request
+    and token buckets have budget. The concurrency limit adapts with AIMD: it grows by
+    1/limit per successful call and is cut multiplicatively on a 429 or when latency
+    exceeds the target. A 429 with Retry-After also pauses admission for that long.
+    """
+
+    def __init__(self, name: str, rpm: int, tpm: int, initial: int, minimum: int, maximum: int,
+                 latency_target: float, decrease_factor: float = 0.7):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._last_decrease = 0.0
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        ADMISSION_CONCURRENCY.labels(deployment=name).set(self.limit)
+
+    def _head(self) -> Optional[_Waiter]:
+        while self._queue and self._queue[0][2].cancelled:
+            heapq.heappop(self._queue)
+        return self._queue[0][2] if self._queue else None
+
+    def _admission_delay(self, waiter: _Waiter, now: float) -> float:
+        """0 when `waiter` can be admitted now, otherwise how long to sleep before re-checking."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= int(self.limit):
+            return float("inf")  # woken by release()
+        return max(self.requests.wait_time(1, now), self.tokens.wait_time(waiter.tokens, now))
+
+    def acquire(self, tokens: int, priority: int, timeout: float) -> None:
+        start = time.monotonic()
+        waiter = _Waiter(priority, tokens, start + timeout)
+        with self._cond:
+            heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = float("inf")
+                    if self._head() is waiter:
+                        delay = self._admission_delay(waiter, now)
+                        if delay == 0:
+                            heapq.heappop(self._queue)
+                            self.requests.consume(1)
+                            self.tokens.consume(tokens)
+                            self.in_flight += 1
+                            break
+                    remaining = waiter.deadline - now
+                    if remaining <= 0:
+                        waiter.cancelled = True
+                        ADMISSION_REJECTED.labels(
+                            deployment=self.name, priority=PRIORITY_NAMES.get(priority, str(priority))
+                        ).inc()
+                        raise AdmissionTimeout(
+                            f"No capacity on deployment '{self.name}' within {timeout:.0f}s "
+                            f"({self.in_flight} in flight, limit {int(self.limit)})"
+                        )
+                    self._cond.wait(min(delay, remaining))
+            finally:
+                # Whoever is at the head now may be admissible.
+                self._cond.notify_all()
+        ADMISSION_WAIT.labels(
+            deployment=self.name, priority=PRIORITY_NAMES.get(priority, str(priority))
+        ).observe(time.monotonic() - start)
+
+    def abandon(self, tokens: int):
+        """Return an admitted slot whose call was never sent, with its budget and no AIMD step."""
+        with self._cond:
+            self.in_flight -= 1
+            self.requests.refund(1)
+            self.tokens.refund(tokens)
+            self._cond.notify_all()
+
+    def release(self, tokens: int, latency: float, throttled: bool, retry_after: Optional[float] = None,
+                used_tokens: Optional[int] = None):
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if used_tokens is not None and used_tokens < tokens:
+                self.tokens.refund(tokens - used_tokens)
+            if throttled:
+                ADMISSION_THROTTLED.labels(deployment=self.name).inc()
+                if retry_after:
+                    self.paused_until = max(self.paused_until, now + retry_after)
+            if throttled or latency > self.latency_target:
+                # At most one decrease per latency target window, so a burst of 429s from
+                # calls admitted together does not collapse the limit to the minimum.
+                if now - self._last_decrease > min(self.latency_target, 5.0):
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            ADMISSION_CONCURRENCY.labels(deployment=self.name).set(self.limit)
+            self._cond.notify_all()
+
+
+class AdmissionController:
+    """Process-wide registry of per-deployment limiters for the shared Azure OpenAI transport."""
+
+    def __init__(self, conf: Config):
+        self.conf = conf
+        self._limiters: Dict[str, DeploymentLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, deployment: str) -> DeploymentLimiter:
+        with self._lock:
+            limiter = self._limiters.get(deployment)
+            if limiter is None:
+                rpm, tpm = self.conf.get_deployment_rate_limits(deployment)
+                limiter = DeploymentLimiter(
+                    deployment,
+                    rpm=rpm,
+                    tpm=tpm,
+                    initial=self.conf.llm_concurrency_initial,
+                    minimum=self.conf.llm_concurrency_min,
+                    maximum=self.conf.llm_concurrency_max,
+                    latency_target=self.conf.llm_latency_target,
+                )
+                self._limiters[deployment] = limiter
+            return limiter
+
+    def queue_timeout(self, priority: int) -> float:
+        if priority == PRIORITY_BACKGROUND:
+            return self.conf.llm_queue_timeout_background
+        return self.conf.llm_queue_timeout_interactive
+
+    def estimate_tokens(self, request: httpx.Request) -> int:
+        """Prompt size from the body (~4 bytes per token) plus the completion budget for chat calls."""
+        body = request.content or b""
+        estimate = len(body) // 4
+        if request.url.path.endswith("/chat/completions"):
+            completion = self.conf.llm_default_completion_tokens
+            try:
+                payload = json.loads(body)
+                completion = payload.get("max_completion_tokens") or payload.get("max_tokens") or completion
+            except ValueError:
+                pass
+            estimate += completion
+        return max(estimate, 1)
+
+
+def deployment_name(request: httpx.Request) -> str:
+    match = DEPLOYMENT_RE.search(request.url.path)
+    return match.group(1) if match else request.url.host
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def _used_tokens(response: httpx.Response) -> Optional[int]:
+    """Actual usage from a non-streamed JSON response, to refund over-estimated budget."""
+    if response.status_code != 200 or "json" not in response.headers.get("content-type", ""):
+        return None
+    try:
+        return int(response.json()["usage"]["total_tokens"])
+    except Exception:
+        return None
+
+
+def _rejection(request: httpx.Request, error: AdmissionTimeout) -> httpx.Response:
+    # `x-should-retry: false` stops the OpenAI SDK from re-queuing the call with its own retries.
+    return httpx.Response(
+        429,
+        headers={"x-should-retry": "false", "content-type": "application/json"},
+        json={"error": {"code": "admission_timeout", "message": str(error)}},
+        request=request,
+    )
+
+
+def _is_stream(response: httpx.Response) -> bool:
+    """A successful streamed (server-sent events) response; its body is read by the caller."""
+    return response.status_code == 200 and "json" not in response.headers.get("content-type", "")
+
+
+def _release(limiter: DeploymentLimiter, tokens: int, latency: float, response: Optional[httpx.Response]):
+    throttled = response is not None and response.status_code == 429
+    limiter.release(
+        tokens,
+        latency,
+        throttled,
+        retry_after=_retry_after(response) if throttled else None,
+        used_tokens=_used_tokens(response) if response is not None else None,
+    )
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that hands the admission slot back once the caller closes it."""
+
+    def __init__(self, stream: httpx.SyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    """Async counterpart of `_ReleasingStream`."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class AdmissionTransport(httpx.BaseTransport):
+    """
+    httpx transport that puts every request through the admission controller first. A call
+    holds its slot until its response is complete: JSON bodies are read here, streamed
+    bodies release the slot when they are closed. Latency is measured to the response headers.
+    """
+
+    def __init__(self, inner: httpx.BaseTransport, controller: AdmissionController):
+        self._inner = inner
+        self._controller = controller
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        priority = current_priority()
+        limiter = self._controller.limiter(deployment_name(request))
+        tokens = self._controller.estimate_tokens(request)
+        try:
+            limiter.acquire(tokens, priority, self._controller.queue_timeout(priority))
+        except AdmissionTimeout as e:
+            logging.warning(str(e))
+            return _rejection(request, e)
+
+        start = time.monotonic()
+        response = None
+        streaming = False
+        try:
+            response = self._inner.handle_request(request)
+            if _is_stream(response):
+                release = functools.partial(_release, limiter, tokens, time.monotonic() - start, response)
+                response.stream = _ReleasingStream(response.stream, release)
+                streaming = True
+            elif response.status_code == 200:
+                response.read()
+            return response
+        finally:
+            if not streaming:
+                _release(limiter, tokens, time.monotonic() - start, response)
+
+    def close(self):
+        self._inner.close()
+
+
+class AsyncAdmissionTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of `AdmissionTransport`; queue waits run in a worker thread."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, controller: AdmissionController):
+        self._inner = inner
+        self._controller = controller
+
+    async def _acquire(self, limiter: DeploymentLimiter, tokens: int, priority: int):
+        acquire = asyncio.ensure_future(
+            asyncio.to_thread(limiter.acquire, tokens, priority, self._controller.queue_timeout(priority))
+        )
+        try:
+            await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            # The worker thread keeps waiting in the queue; give the slot back once it has one.
+            def abandon(future):
+                if not future.cancelled() and future.exception() is None:
+                    limiter.abandon(tokens)
+
+            acquire.add_done_callback(abandon)
+            raise
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        priority = current_priority()
+        limiter = self._controller.limiter(deployment_name(request))
+        tokens = self._controller.estimate_tokens(request)
+        try:
+            await self._acquire(limiter, tokens, priority)
+        except AdmissionTimeout as e:
+            logging.warning(str(e))
+            return _rejection(request, e)
+
+        start = time.monotonic()
+        response = None
+        streaming = False
+        try:
+            response = await self._inner.handle_async_request(request)
+            if _is_stream(response):
+                release = functools.partial(_release, limiter, tokens, time.monotonic() - start, response)
+                response.stream = _AsyncReleasingStream(response.stream, release)
+                streaming = True
+            elif response.status_code == 200:
+                await response.aread()
+            return response
+        finally:
+            if not streaming:
+                _release(limiter, tokens, time.monotonic() - start, response)
+
+    async def aclose(self):
+        await self._inner.aclose()
@@ -1,6 +1,86 @@
+import logging
 import pyodbc
 from app.api.v1.utils.config import Config
+from app.api.v1.utils.metrics import SQL_LATENCY
 
+# Idempotent schema for the per-session summary table and the keyset pagination indexes.
+# Run as separate batches: SQL Server compiles a batch before ALTER TABLE adds the column.
+# Applied by `apply_session_schema` as a migration, never on the request path. The first
+# batch takes an exclusive application lock held until the commit, so concurrent runs
+# (several workers with SESSION_SCHEMA_ON_STARTUP) apply it one after the other.
+SESSION_SCHEMA = [
+    """
+    DECLARE @lock INT;
+    EXEC @lock = sp_getapplock @Resource = 'dbo.sessions schema', @LockMode = 'Exclusive',
+                               @LockOwner = 'Transaction', @LockTimeout = 600000;
+    IF @lock < 0
+        THROW 50000, 'Timed out waiting for another run of the session schema.', 1;
+    """,
+    """
+    IF COL_LENGTH('dbo.chat_history', 'id') IS NULL
+        ALTER TABLE dbo.chat_history ADD id BIGINT IDENTITY(1, 1) NOT NULL
+    """,
+    """
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes
+                   WHERE name = 'IX_chat_history_session_created' AND object_id = OBJECT_ID('dbo.chat_history'))
+        CREATE INDEX IX_chat_history_session_created ON dbo.chat_history(session_id, created_at, id)
+    """,
+    """
+    IF OBJECT_ID('dbo.sessions', 'U') IS NULL
+    BEGIN
+        CREATE TABLE dbo.sessions (
+            session_id NVARCHAR(255) NOT NULL PRIMARY KEY,
+            user_id NVARCHAR(255) NOT NULL,
+            first_question NVARCHAR(MAX) NULL,
+            turn_count INT NOT NULL DEFAULT 0,
+            created_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+            last_activity DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+        );
+        INSERT INTO dbo.sessions(session_id, user_id, first_question, turn_count, created_at, last_activity)
+        SELECT session_id, user_id, user_query, turn_count, created_at, last_activity
+        FROM (
+            SELECT session_id, user_id, user_query, created_at,
+                ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY created_at, id) AS rn,
+                COUNT(*) OVER (PARTITION BY session_id) AS turn_count,
+                MAX(created_at) OVER (PARTITION BY session_id) AS last_activity
+            FROM dbo.chat_history
+        ) t
+        WHERE rn = 1;
+    END
+    """,
+    """
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes
+                   WHERE name = 'IX_sessions_user_last_activity' AND object_id = OBJECT_ID('dbo.sessions'))
+        CREATE INDEX IX_sessions_user_last_activity ON dbo.sessions(user_id, last_activity DESC, session_id DESC)
+            INCLUDE (turn_count)
+    """,
+    """
+    IF OBJECT_ID('dbo.chat_history_archive', 'U') IS NULL
+        CREATE TABLE dbo.chat_history_archive (
+            id BIGINT NOT NULL,
+            session_id NVARCHAR(255) NOT NULL,
+            user_id NVARCHAR(255) NULL,
+            user_query NVARCHAR(MAX) NULL,
+            bot_response NVARCHAR(MAX) NULL,
+            created_at DATETIME2 NULL,
+            archived_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+        )
+    """,
+]
+
+# Upsert one session summary row; parameters: session_id, user_id, first_question, turns.
+# Skipped until the schema migration created dbo.sessions, so chat turns are never lost to it.
+SESSION_UPSERT = """
+    IF OBJECT_ID('dbo.sessions', 'U') IS NOT NULL
+    MERGE dbo.sessions WITH (HOLDLOCK) AS t
+    USING (SELECT ? AS session_id, ? AS user_id, ? AS first_question, ? AS turns) AS s
+    ON t.session_id = s.session_id
+    WHEN MATCHED THEN
+        UPDATE SET last_activity = SYSUTCDATETIME(), turn_count = t.turn_count + s.turns
+    WHEN NOT MATCHED THEN
+        INSERT (session_id, user_id, first_question, turn_count)
+        VALUES (s.session_id, s.user_id, s.first_question, s.turns);
+"""
 
 class AzureSQLManager:
     def __init__(self, config: Config):
@@ -32,25 +112,95 @@ class AzureSQLManager:
             self.connection.close()
             print("Disconnected from Azure SQL.")
 
+    # ---------- Schema ----------
+    def ensure_session_schema(self):
+        """
+        Apply SESSION_SCHEMA in one transaction; the first run adds the id column, backfills
+        dbo.sessions and builds indexes. Waits while another connection is applying it.
+        """
+        if not self.connection:
+            self.connect()
+        cursor = self.connection.cursor()
+        try:
+            with SQL_LATENCY.labels(database="azure_sql", operation="schema").time():
+                for statement in SESSION_SCHEMA:
+                    cursor.execute(statement)
+                self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def session_schema_applied(self):
+        """True once the session schema migration has created dbo.sessions and the history archive."""
+        rows = self.read_data("""
+                SELECT CASE WHEN OBJECT_ID('dbo.sessions', 'U') IS NOT NULL
+                            AND OBJECT_ID('dbo.chat_history_archive', 'U') IS NOT NULL THEN 1 ELSE 0 END
+            """)
+        return rows[0][0] == 1
+
+    # ---------- Application locks ----------
+    def try_app_lock(self, resource):
+        """
+        Take the exclusive application lock `resource` for this connection without waiting;
+        True when granted. Release it with `release_app_lock`.
+        """
+        rows = self.read_data("""
+                SET NOCOUNT ON;
+                DECLARE @lock INT;
+                EXEC @lock = sp_getapplock @Resource = ?, @LockMode = 'Exclusive',
+                                           @LockOwner = 'Session', @LockTimeout = 0;
+                SET NOCOUNT OFF;
+                SELECT @lock;
+            """, [resource])
+        return rows[0][0] >= 0
+
+    def release_app_lock(self, resource):
+        self._execute_query("EXEC sp_releaseapplock @Resource = ?, @LockOwner = 'Session'", [resource])
+
     # ---------- Read ----------
     def read_data(self, query, params=None):
         """Execute SELECT query and return results."""
         if not self.connection:
             self.connect()
         cursor = self.connection.cursor()
-        cursor.execute(query, params or [])
-        rows = cursor.fetchall()
+        with SQL_LATENCY.labels(database="azure_sql", operation="read").time():
+            cursor.execute(query, params or [])
+            rows = cursor.fetchall()
         cursor.close()
         return rows
 
+    # ---------- Internal Execute Many ----------
+    def _execute_many(self, statements):
+        """
+        Internal method for bulk writes: runs each (query, rows) with fast_executemany
+        (one round trip per batch) and commits them as one transaction.
+        """
+        if not self.connection:
+            self.connect()
+        cursor = self.connection.cursor()
+        cursor.fast_executemany = True
+        try:
+            with SQL_LATENCY.labels(database="azure_sql", operation="execute_many").time():
+                for query, rows in statements:
+                    cursor.executemany(query, rows)
+                self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
     # ---------- Internal Execute ----------
     def _execute_query(self, query, params):
         """Internal method for INSERT/UPDATE/DELETE."""
         if not self.connection:
             self.connect()
         cursor = self.connection.cursor()
-        cursor.execute(query, params)
-        self.connection.commit()
+        with SQL_LATENCY.labels(database="azure_sql", operation="execute").time():
+            cursor.execute(query, params)
+            self.connection.commit()
         cursor.close()
 
     def insert_file_metadata(self, params):
@@ -75,18 +225,62 @@ class AzureSQLManager:
         try:
             if not self.connection:
                 self.connect()
-            query= """
+            session_id, user_id, user_query = params[0], params[1], params[2]
+            query= f"""
                     INSERT INTO dbo.chat_history(session_id, user_id, user_query, bot_response, created_by)
-                    VALUES (?, ?, ?, ?, ?)
+                    VALUES (?, ?, ?, ?, ?);
+                    {SESSION_UPSERT}
                 """
             
-            self._execute_query(query, params)
+            self._execute_query(query, list(params) + [session_id, user_id, user_query, 1])
             status = True
             return status
         except Exception as e:
             print("Insert to chat history table failed", str(e))
             return status
 
+    def insert_chat_history_bulk(self, rows):
+        """rows: (session_id, user_id, user_query, bot_response, created_by) tuples."""
+        status = False
+        if not rows:
+            return True
+        try:
+            query= """
+                    INSERT INTO dbo.chat_history(session_id, user_id, user_query, bot_response, created_by)
+                    VALUES (?, ?, ?, ?, ?)
+                """
+
+            # One summary upsert per session: (session_id, user_id, first question, turns).
+            summaries = {}
+            for session_id, user_id, user_query, _, _ in rows:
+                if session_id in summaries:
+                    summaries[session_id][3] += 1
+                else:
+                    summaries[session_id] = [session_id, user_id, user_query, 1]
+
+            self._execute_many([(query, rows), (SESSION_UPSERT, list(summaries.values()))])
+            status = True
+            return status
+        except Exception as e:
+            print("Bulk insert to chat history table failed", str(e))
+            return status
+
+    def get_chat_histories(self, session_ids, batch_size=500):
+        """Chat history for many sessions in one query per `batch_size` ids: {session_id: [(query, response)]}."""
+        histories = {sid: [] for sid in session_ids}
+        ids = list(histories)
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            placeholders = ", ".join("?" for _ in batch)
+            query= f"""
+                    SELECT session_id, user_query, bot_response FROM dbo.chat_history
+                    WHERE session_id IN ({placeholders})
+                    ORDER BY created_at
+                    """
+            for session_id, user_query, bot_response in self.read_data(query, batch):
+                histories[session_id].append((user_query, bot_response))
+        return histories
+
     def get_chat_history(self, params):
 
         if not self.connection:
@@ -100,25 +294,95 @@ class AzureSQLManager:
 
         return data
 
-    def get_first_record_per_group(self, params):
+    def get_chat_history_page(self, session_id, limit, cursor=None):
+        """
+        Newest-first page of a session's history. `cursor` is the (created_at, id) key of the
+        oldest row of the previous page; created_at travels as its ISO text so no precision is lost.
+        Returns (user_query, bot_response, created_key, id) rows.
+        """
+        query= """
+                SELECT TOP (?) user_query, bot_response, CONVERT(VARCHAR(33), created_at, 126), id
+                FROM dbo.chat_history
+                WHERE session_id = ?
+                """
+        params = [limit, session_id]
+        if cursor:
+            query += " AND (created_at < ? OR (created_at = ? AND id < ?))"
+            params += [cursor[0], cursor[0], cursor[1]]
+        query += " ORDER BY created_at DESC, id DESC"
+        return self.read_data(query, params)
 
-        if not self.connection:
-                self.connect()
-        
+    def get_sessions_page(self, user_id, limit, cursor=None):
+        """
+        A user's sessions by most recent activity, served from dbo.sessions. `cursor` is the
+        (last_activity, session_id) key of the last row of the previous page.
+        Returns (session_id, first_question, turn_count, last_activity_key) rows.
+        """
         query= """
-                SELECT session_id, user_query
-                    FROM (
-                        SELECT *,
-                            ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY created_at) AS rn
-                        FROM dbo.chat_history
-                        WHERE user_id = ?
-                    ) t
-                    WHERE rn = 1
+                SELECT TOP (?) session_id, first_question, turn_count, CONVERT(VARCHAR(33), last_activity, 126)
+                FROM dbo.sessions
+                WHERE user_id = ?
                 """
-        data = self.read_data(query, params)
+        params = [limit, user_id]
+        if cursor:
+            query += " AND (last_activity < ? OR (last_activity = ? AND session_id < ?))"
+            params += [cursor[0], cursor[0], cursor[1]]
+        query += " ORDER BY last_activity DESC, session_id DESC"
+        return self.read_data(query, params)
+
+    def get_expired_sessions(self, idle_seconds, limit):
+        """Up to `limit` sessions whose last chat turn or upload is older than `idle_seconds`, oldest first."""
+        query= """
+                SELECT TOP (?) session_id FROM (
+                    SELECT session_id, last_activity AS seen FROM dbo.sessions
+                    UNION ALL
+                    SELECT session_id, created_at FROM dbo.file_metadata
+                ) t
+                GROUP BY session_id
+                HAVING MAX(seen) < DATEADD(second, -?, SYSUTCDATETIME())
+                ORDER BY MAX(seen)
+            """
+        return [row[0] for row in self.read_data(query, [limit, int(idle_seconds)])]
+
+    def purge_sessions(self, session_ids, archive=True):
+        """
+        Remove the sessions' chat history, summary rows and file metadata in one transaction,
+        first copying the history to dbo.chat_history_archive when `archive` is set.
+        Returns the number of chat history rows removed.
+        """
+        if not session_ids:
+            return 0
+        placeholders = ", ".join("?" for _ in session_ids)
+        statements = []
+        if archive:
+            statements.append(f"""
+                    INSERT INTO dbo.chat_history_archive(id, session_id, user_id, user_query, bot_response, created_at)
+                    SELECT id, session_id, user_id, user_query, bot_response, created_at
+                    FROM dbo.chat_history WHERE session_id IN ({placeholders})
+                """)
+        statements += [
+            f"DELETE FROM dbo.chat_history WHERE session_id IN ({placeholders})",
+            f"IF OBJECT_ID('dbo.sessions', 'U') IS NOT NULL DELETE FROM dbo.sessions WHERE session_id IN ({placeholders})",
+            f"DELETE FROM dbo.file_metadata WHERE session_id IN ({placeholders})",
+        ]
+        if not self.connection:
+            self.connect()
+        cursor = self.connection.cursor()
+        removed = 0
+        try:
+            with SQL_LATENCY.labels(database="azure_sql", operation="purge").time():
+                for statement in statements:
+                    cursor.execute(statement, list(session_ids))
+                    if statement.lstrip().startswith("DELETE FROM dbo.chat_history"):
+                        removed = cursor.rowcount
+                self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            cursor.close()
+        return removed
 
-        return data
-    
     def delete_chat_history(self, params):
         status = False
         try:
@@ -126,12 +390,37 @@ class AzureSQLManager:
                 self.connect()
             query= """
                     DELETE FROM dbo.chat_history
-                    WHERE session_id = ?
+                    WHERE session_id = ?;
+                    IF OBJECT_ID('dbo.sessions', 'U') IS NOT NULL
+                        DELETE FROM dbo.sessions WHERE session_id = ?;
                 """
             
-            self._execute_query(query, params)
+            self._execute_query(query, list(params) * 2)
             status = True
             return status
         except Exception as e:
             print("Delete chat history failed", str(e))
-            return status
\ No newline at end of file
+            return status
+
+
+def apply_session_schema():
+    """
+    Bring the session tables and indexes up to date. Run this module once per deployment,
+    before starting the API: `python -m app.api.v1.utils.azure_sql_manager`. The first run
+    adds an IDENTITY column to dbo.chat_history, which rewrites the table.
+    SESSION_SCHEMA_ON_STARTUP=true runs it in every worker at startup instead.
+    """
+    manager = AzureSQLManager(Config())
+    try:
+        manager.ensure_session_schema()
+        logging.info("Session schema is up to date.")
+    finally:
+        manager.disconnect()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    apply_session_schema()
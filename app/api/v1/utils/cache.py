@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from app.api.v1.utils.metrics import CACHE_SAVED_SECONDS, record_cache_lookup
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory LRU cache whose entries expire `ttl` seconds after being set.
+    Every `get` is counted as a hit or miss under `name` in the cache metrics.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 300.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            hit, value = self._lookup(key)
+        record_cache_lookup(self.name, hit)
+        return value if hit else default
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Membership test that is not counted as a lookup."""
+        with self._lock:
+            return self._lookup(key)[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[1] if entry else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DiskCache:
+    """
+    Second cache tier: one JSON file per entry under `directory`, so entries survive restarts
+    and are shared by worker processes on the same host. Keys and values must be JSON-serialisable;
+    expired files are removed when read and by `purge_expired`.
+    """
+
+    def __init__(self, name: str, directory: str, ttl: float = 3600.0):
+        self.name = name
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: Hashable) -> str:
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        path = self._path(key)
+        hit, value = False, None
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+            if entry["expires_at"] >= time.time():
+                hit, value = True, entry["value"]
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Unreadable {self.name} cache entry {path}: {str(e)}")
+        record_cache_lookup(self.name, hit)
+        return value if hit else default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        entry = {"expires_at": time.time() + (self.ttl if ttl is None else ttl), "value": value}
+        try:
+            # Write then rename, so readers never see a partial file.
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            logging.warning(f"Could not write {self.name} cache entry: {str(e)}")
+
+    def purge_expired(self) -> int:
+        removed, now = 0, time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    expired = json.load(f)["expires_at"] < now
+            except (OSError, ValueError, KeyError):
+                expired = True
+            if expired:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+
+def record_saved_latency(cache: str, seconds: float):
+    """Count the latency a cache hit avoided (the duration of the call that filled the entry)."""
+    CACHE_SAVED_SECONDS.labels(cache=cache).inc(seconds)
@@ -0,0 +1,103 @@
+import logging
+import os
+import sqlite3
+from typing import Any, Dict, Optional
+
+from app.api.v1.utils.config import Config
+from app.api.v1.utils.startup import lazy_client
+
+CHECKPOINT_BACKENDS = ("sqlite", "memory", "none")
+
+
+def thread_config(session_id: str) -> Dict[str, Any]:
+    """Run config addressing the agent checkpoint thread of a chat session."""
+    return {"configurable": {"thread_id": session_id}}
+
+
+@lazy_client("checkpointer")
+def get_checkpointer():
+    """
+    The LangGraph checkpointer for agent state, or None when AGENT_CHECKPOINTER=none.
+
+    `sqlite` keeps checkpoints in a local file, so a session resumes from saved state only on the
+    instance that served its previous turn; elsewhere the turn falls back to the SQL history.
+    """
+    conf = Config()
+    backend = conf.agent_checkpointer
+    if backend == "none":
+        return None
+    if backend == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+        return InMemorySaver()
+    if backend == "sqlite":
+        try:
+            from langgraph.checkpoint.sqlite import SqliteSaver
+        except ImportError:
+            raise ImportError("AGENT_CHECKPOINTER=sqlite requires the `langgraph-checkpoint-sqlite` package.")
+        directory = os.path.dirname(conf.agent_checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Shared by the threadpool workers; SqliteSaver serialises access with its own lock.
+        saver = SqliteSaver(sqlite3.connect(conf.agent_checkpoint_path, check_same_thread=False))
+        saver.setup()
+        return saver
+    raise ValueError(f"Unknown AGENT_CHECKPOINTER '{backend}'; expected one of {', '.join(CHECKPOINT_BACKENDS)}.")
+
+
+def prune_checkpoints(session_id: str, keep: int) -> None:
+    """
+    Drop all but the newest `keep` checkpoints of a session; resuming only needs the latest.
+    Only the public saver API is used, so this holds for any checkpointer: the kept checkpoints
+    are read, the thread is deleted and they are put back. Should that fail in between, the
+    session has no checkpoint and its next turn falls back to the SQL history.
+    """
+    saver = get_checkpointer()
+    if saver is None or keep < 1:
+        return
+    try:
+        config = {"configurable": {"thread_id": session_id, "checkpoint_ns": ""}}
+        # Newest first.
+        saved = list(saver.list(config, limit=keep + 1))
+        if len(saved) <= keep:
+            return
+        saver.delete_thread(session_id)
+        for checkpoint in reversed(saved[:keep]):
+            _restore(saver, checkpoint)
+    except Exception as e:
+        logging.warning(f"Pruning checkpoints for session {session_id} failed: {str(e)}")
+
+
+def _restore(saver, saved) -> None:
+    """Put a listed checkpoint, and its pending writes, back under its own id and parent."""
+    configurable = dict(saved.config["configurable"])
+    parent = (saved.parent_config or {}).get("configurable", {}).get("checkpoint_id")
+    if parent:
+        configurable["checkpoint_id"] = parent
+    else:
+        configurable.pop("checkpoint_id", None)
+    # Every channel is new to the emptied thread.
+    saver.put({"configurable": configurable}, saved.checkpoint, saved.metadata,
+              saved.checkpoint["channel_versions"])
+    writes: Dict[str, list] = {}
+    for task_id, channel, value in saved.pending_writes or ():
+        writes.setdefault(task_id, []).append((channel, value))
+    for task_id, task_writes in writes.items():
+        saver.put_writes(saved.config, task_writes, task_id)
+
+
+def delete_checkpoints(session_id: str) -> None:
+    saver = get_checkpointer()
+    if saver is not None:
+        saver.delete_thread(session_id)
+
+
+def latest_state(agent, session_id: str) -> Optional[Dict[str, Any]]:
+    """Values of the session's latest checkpoint, or None when there is none to resume from."""
+    if get_checkpointer() is None:
+        return None
+    try:
+        values = agent.get_state(thread_config(session_id)).values
+    except Exception as e:
+        logging.warning(f"Loading checkpoint for session {session_id} failed: {str(e)}")
+        return None
+    return values or None
@@ -0,0 +1,67 @@
+import hashlib
+import random
+from typing import List, Tuple
+
+# Gear table for the rolling hash; fixed seed so boundaries are stable across processes and releases.
+_gear_rng = random.Random(0x5EED_C0DE)
+_GEAR = tuple(_gear_rng.getrandbits(64) for _ in range(256))
+_MASK64 = (1 << 64) - 1
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _cut_points(text: str, min_chars: int, max_chars: int, mask_bits: int) -> List[int]:
+    """
+    Content-defined boundaries (FastCDC-style gear hash). A chunk ends at the first whitespace
+    after `min_chars` where the top `mask_bits` bits of the rolling hash are zero. The hash only
+    depends on the last 64 characters, so an edit moves the boundaries around it and the ones
+    after it fall back onto the same positions. Chunks without a natural boundary are cut at the
+    last whitespace before `max_chars`.
+    """
+    cuts, start, n = [], 0, len(text)
+    shift = 64 - mask_bits
+    while start < n:
+        if n - start <= min_chars:
+            cuts.append(n)
+            break
+        end = min(start + max_chars, n)
+        h, cut, last_space = 0, None, None
+        for i in range(start, end):
+            h = ((h << 1) + _GEAR[ord(text[i]) & 0xFF]) & _MASK64
+            if i - start + 1 < min_chars or not text[i].isspace():
+                continue
+            last_space = i + 1
+            if h >> shift == 0:
+                cut = i + 1
+                break
+        if cut is None:
+            cut = n if end == n else (last_space or end)
+        cuts.append(cut)
+        start = cut
+    return cuts
+
+
+def content_defined_chunks(text: str, min_chars: int = 500, max_chars: int = 1500, mask_bits: int = 6,
+                           overlap_chars: int = 100) -> List[Tuple[str, str]]:
+    """
+    Split `text` into chunks with content-defined boundaries and return `(chunk_text, chunk_hash)`
+    pairs. Each chunk is prefixed with up to `overlap_chars` from the end of the previous one
+    (starting on a word) for retrieval context; the hash covers the stored text.
+    """
+    chunks, start, previous = [], 0, ""
+    for cut in _cut_points(text, min_chars, max_chars, mask_bits):
+        core = text[start:cut].strip()
+        start = cut
+        if not core:
+            continue
+        prefix = ""
+        if overlap_chars and previous:
+            tail = previous[-overlap_chars:]
+            space = tail.find(" ")
+            prefix = tail[space + 1:] if 0 <= space < len(tail) - 1 else tail
+        stored = f"{prefix} {core}" if prefix else core
+        chunks.append((stored, chunk_hash(stored)))
+        previous = core
+    return chunks
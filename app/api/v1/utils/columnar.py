@@ -0,0 +1,147 @@
+import csv
+import io
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+# (name, postgres type oid) pairs as yielded by `PostgresDBManager.stream_query`.
+Columns = List[Tuple[str, int]]
+
+# Postgres type OIDs -> (numpy dtype, arrow type name). Anything else is text.
+PG_TYPES = {
+    16: ("bool", "bool_"),
+    20: ("int64", "int64"),
+    21: ("int64", "int16"),
+    23: ("int64", "int32"),
+    700: ("float64", "float32"),
+    701: ("float64", "float64"),
+    1700: ("float64", "float64"),  # NUMERIC is exported as float
+    1082: ("datetime64[D]", "date32"),
+    1114: ("datetime64[us]", "timestamp_us"),
+    1184: ("datetime64[us]", "timestamp_us_utc"),
+}
+
+
+def _numeric(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def rows_to_numpy(columns: Columns, rows: Sequence[Tuple]) -> Dict[str, np.ndarray]:
+    """
+    Column-major NumPy arrays for one batch. Integer and boolean columns containing NULLs
+    fall back to float (NaN) and object arrays respectively.
+    """
+    arrays = {}
+    for i, (name, type_code) in enumerate(columns):
+        values = [row[i] for row in rows]
+        dtype = PG_TYPES.get(type_code, ("object", None))[0]
+        has_null = any(v is None for v in values)
+        if dtype in ("int64", "float64"):
+            if has_null or dtype == "float64":
+                arrays[name] = np.array([np.nan if v is None else float(_numeric(v)) for v in values], dtype="float64")
+            else:
+                arrays[name] = np.array(values, dtype="int64")
+        elif dtype.startswith("datetime64"):
+            if type_code == 1184:
+                values = [v.replace(tzinfo=None) if v is not None else None for v in values]
+            arrays[name] = np.array([np.datetime64("NaT") if v is None else v for v in values], dtype=dtype)
+        elif dtype == "bool" and not has_null:
+            arrays[name] = np.array(values, dtype="bool")
+        else:
+            arrays[name] = np.array(values, dtype="object")
+    return arrays
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise ImportError("Arrow/Parquet output requires the `pyarrow` package.")
+
+
+def arrow_schema(columns: Columns):
+    pa = _pyarrow()
+    types = {
+        "bool_": pa.bool_(), "int16": pa.int16(), "int32": pa.int32(), "int64": pa.int64(),
+        "float32": pa.float32(), "float64": pa.float64(), "date32": pa.date32(),
+        "timestamp_us": pa.timestamp("us"), "timestamp_us_utc": pa.timestamp("us", tz="UTC"),
+    }
+    return pa.schema([(name, types.get(PG_TYPES.get(type_code, (None, None))[1], pa.string()))
+                      for name, type_code in columns])
+
+
+def rows_to_arrow(columns: Columns, rows: Sequence[Tuple], schema=None):
+    """One Arrow RecordBatch for a batch of rows, typed from the Postgres column types."""
+    pa = _pyarrow()
+    schema = schema or arrow_schema(columns)
+    arrays = []
+    for i, field in enumerate(schema):
+        values = [row[i] for row in rows]
+        if pa.types.is_string(field.type):
+            values = [None if v is None else str(v) for v in values]
+        elif pa.types.is_floating(field.type):
+            values = [_numeric(v) for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def csv_chunks(batches: Iterable[Tuple[Columns, Sequence[Tuple]]]) -> Iterator[bytes]:
+    """Encode streamed (columns, rows) batches as CSV, one chunk per batch."""
+    header_written = False
+    for columns, rows in batches:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not header_written:
+            writer.writerow([name for name, _ in columns])
+            header_written = True
+        writer.writerows([_numeric(v) for v in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file object collecting what the Parquet writer emits between yields."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def parquet_chunks(batches: Iterable[Tuple[Columns, Sequence[Tuple]]]) -> Iterator[bytes]:
+    """Encode streamed batches as a Parquet file, one row group per batch, without buffering it whole."""
+    pa = _pyarrow()
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = schema = None
+    try:
+        for columns, rows in batches:
+            if writer is None:
+                schema = arrow_schema(columns)
+                writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="snappy")
+            if rows:
+                writer.write_batch(rows_to_arrow(columns, rows, schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        if writer is not None:
+            writer.close()
+    data = sink.drain()
+    if data:
+        yield data
@@ -10,10 +10,45 @@ class Config:
         self.ai_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
         self.ai_deployment_name = os.getenv("OPENAI_DEPLOYMENT_NAME")
         self.ai_api_version = os.getenv("OPENAI_API_VERSION")
+        # Deployments tried after a role's own ones fail (comma separated); see get_role_deployments.
+        self.ai_fallback_deployments = [d.strip() for d in os.getenv("OPENAI_FALLBACK_DEPLOYMENTS", "").split(",") if d.strip()]
+        # Hedged requests: once a role's primary call has run for its recent p95 latency, the same
+        # request is sent to the role's next deployment and the first response wins.
+        self.llm_hedge_enabled = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+        self.llm_hedge_roles = {r.strip() for r in os.getenv("LLM_HEDGE_ROLES", "router,judge,contextualise,contextualise_route").split(",") if r.strip()}
+        self.llm_hedge_quantile = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+        self.llm_hedge_min_samples = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+        self.llm_hedge_min_delay = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.25"))
+        self.llm_hedge_window = int(os.getenv("LLM_HEDGE_WINDOW", "500"))
 
         # Embedding model configuration.
         self.embedding_deployment_name = os.getenv("AZURE_EMBEDDING_DEPLOYMENT_NAME")
         self.embedding_api_version = os.getenv("AZURE_EMBEDDING_API_VERSION")
+        # Optional: skips the probe embedding call used to discover the vector size.
+        self.embedding_dimensions = int(os.getenv("AZURE_EMBEDDING_DIMENSIONS", "0")) or None
+        # In-memory cache of query embeddings (exact text -> vector).
+        self.embedding_cache_size = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+        self.embedding_cache_ttl = float(os.getenv("EMBEDDING_CACHE_TTL", "3600"))
+
+        # Shared HTTP transport for Azure OpenAI chat and embedding clients.
+        self.http_max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+        self.http_max_keepalive_connections = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+        self.http_keepalive_expiry = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+        self.http2_enabled = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+        self.llm_connect_timeout = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+        self.llm_read_timeout = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+
+        # Admission control for Azure OpenAI calls (0 disables a rate budget).
+        self.admission_enabled = os.getenv("LLM_ADMISSION_ENABLED", "true").lower() == "true"
+        self.llm_rpm_limit = int(os.getenv("LLM_RPM_LIMIT", "0"))
+        self.llm_tpm_limit = int(os.getenv("LLM_TPM_LIMIT", "0"))
+        self.llm_concurrency_initial = int(os.getenv("LLM_CONCURRENCY_INITIAL", "8"))
+        self.llm_concurrency_min = int(os.getenv("LLM_CONCURRENCY_MIN", "1"))
+        self.llm_concurrency_max = int(os.getenv("LLM_CONCURRENCY_MAX", "32"))
+        self.llm_latency_target = float(os.getenv("LLM_LATENCY_TARGET", "15"))
+        self.llm_queue_timeout_interactive = float(os.getenv("LLM_QUEUE_TIMEOUT_INTERACTIVE", "15"))
+        self.llm_queue_timeout_background = float(os.getenv("LLM_QUEUE_TIMEOUT_BACKGROUND", "120"))
+        self.llm_default_completion_tokens = int(os.getenv("LLM_DEFAULT_COMPLETION_TOKENS", "512"))
 
         # Ai search configuration.
         self.ai_search_endpoint = os.getenv("AZURE_AI_SEARCH_ENDPOINT")
@@ -33,6 +68,144 @@ class Config:
         self.postgres_username = os.getenv("POSTGRE_USERNAME")
         self.postgres_password = os.getenv("POSTGRE_PASSWORD")
         self.postgres_port = os.getenv("POSTGRE_PORT")
+        # Rows per fetchmany() round trip on streaming (server-side) cursors.
+        self.sql_stream_batch_size = int(os.getenv("SQL_STREAM_BATCH_SIZE", "5000"))
+        # Rows fetched for the analyst tool; larger results are summarised and offered for export.
+        self.analyst_max_result_rows = int(os.getenv("ANALYST_MAX_RESULT_ROWS", "1000"))
+        # Learned NL-to-SQL templates that answer recurring question shapes without the analyst LLM.
+        self.sql_templates_enabled = os.getenv("SQL_TEMPLATES_ENABLED", "true").lower() == "true"
+        # Offer executed analyst queries to the template library; opt-in, the matching above runs either way.
+        self.sql_templates_learn = os.getenv("SQL_TEMPLATES_LEARN", "false").lower() == "true"
+        self.sql_template_path = os.getenv("SQL_TEMPLATE_PATH", "temp_data/sql_templates.json")
+        self.sql_template_min_similarity = float(os.getenv("SQL_TEMPLATE_MIN_SIMILARITY", "0.85"))
+        self.sql_template_min_support = int(os.getenv("SQL_TEMPLATE_MIN_SUPPORT", "2"))
+        self.sql_template_max_failures = int(os.getenv("SQL_TEMPLATE_MAX_FAILURES", "3"))
+
+        # Batch chat endpoint.
+        self.chat_batch_max_items = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "1000"))
+        self.chat_batch_max_concurrency = int(os.getenv("CHAT_BATCH_MAX_CONCURRENCY", "8"))
+        self.chat_batch_history_flush = int(os.getenv("CHAT_BATCH_HISTORY_FLUSH", "50"))
+
+        # Durable agent state per session (sqlite | memory | none).
+        self.agent_checkpointer = os.getenv("AGENT_CHECKPOINTER", "sqlite").lower()
+        self.agent_checkpoint_path = os.getenv("AGENT_CHECKPOINT_PATH", "temp_data/agent_checkpoints.sqlite")
+        self.agent_checkpoint_keep = int(os.getenv("AGENT_CHECKPOINT_KEEP", "1"))
+        self.agent_max_messages = int(os.getenv("AGENT_MAX_MESSAGES", "40"))
+        # Seconds a checkpointed RAG/analyst result is reused for the same question.
+        self.agent_context_reuse_ttl = float(os.getenv("AGENT_CONTEXT_REUSE_TTL", "300"))
+        # One structured call yields the stand-alone question and the route, skipping the router LLM.
+        self.agent_combined_routing = os.getenv("AGENT_COMBINED_ROUTING", "false").lower() == "true"
+
+        # Keyset pagination for chat history and session listings.
+        self.history_page_size = int(os.getenv("HISTORY_PAGE_SIZE", "100"))
+        self.sessions_page_size = int(os.getenv("SESSIONS_PAGE_SIZE", "50"))
+        self.max_page_size = int(os.getenv("MAX_PAGE_SIZE", "500"))
+        # Also apply the sessions table/index schema when a worker starts; by default it is run as a
+        # migration before deploying (python -m app.api.v1.utils.azure_sql_manager).
+        self.session_schema_on_startup = os.getenv("SESSION_SCHEMA_ON_STARTUP", "false").lower() == "true"
+
+        # Uploaded files live under <upload_dir>/<session_id>.
+        self.upload_dir = os.getenv("UPLOAD_DIR", "temp_data")
+        # Session garbage collection: sessions idle for SESSION_TTL_SECONDS (0 = keep forever) lose
+        # their vector chunks, uploads and checkpoints; their chat history is archived or deleted.
+        # Every worker runs a sweeper, but an application lock lets only one of them sweep at a time.
+        self.session_ttl_seconds = float(os.getenv("SESSION_TTL_SECONDS", str(30 * 24 * 3600)))
+        self.session_gc_interval = float(os.getenv("SESSION_GC_INTERVAL", "3600"))
+        self.session_gc_batch_size = int(os.getenv("SESSION_GC_BATCH_SIZE", "100"))
+        self.session_archive_history = os.getenv("SESSION_ARCHIVE_HISTORY", "true").lower() == "true"
+
+        # Upload parsing in a process pool (0 workers = one per core).
+        self.parser_workers = int(os.getenv("PARSER_WORKERS", "0"))
+        self.parser_timeout = float(os.getenv("PARSER_TIMEOUT", "60"))
+        self.parser_max_file_bytes = int(os.getenv("PARSER_MAX_FILE_BYTES", str(25 * 1024 * 1024)))
+        self.parser_max_text_chars = int(os.getenv("PARSER_MAX_TEXT_CHARS", "5000000"))
+        self.parser_max_pdf_pages = int(os.getenv("PARSER_MAX_PDF_PAGES", "500"))
+        # Zip-bomb guards for .docx: total decompressed size and number of archive entries.
+        self.parser_max_docx_bytes = int(os.getenv("PARSER_MAX_DOCX_BYTES", str(200 * 1024 * 1024)))
+        self.parser_max_docx_entries = int(os.getenv("PARSER_MAX_DOCX_ENTRIES", "5000"))
+
+        # Content-defined chunking of uploaded documents.
+        self.chunk_min_chars = int(os.getenv("CHUNK_MIN_CHARS", "500"))
+        self.chunk_max_chars = int(os.getenv("CHUNK_MAX_CHARS", "1500"))
+        self.chunk_mask_bits = int(os.getenv("CHUNK_MASK_BITS", "6"))
+        self.chunk_overlap_chars = int(os.getenv("CHUNK_OVERLAP_CHARS", "100"))
+        # Also add the chunk identity fields to an older search index when a worker starts; by default
+        # it is run as a migration before deploying (python -m app.api.v1.utils.vector_db_manager).
+        self.search_index_schema_on_startup = os.getenv("SEARCH_INDEX_SCHEMA_ON_STARTUP", "false").lower() == "true"
+
+        # Lexical (BM25) retrieval over uploaded chunks.
+        # Kept apart from UPLOAD_DIR so an uploaded file can never replace a session's index.
+        self.lexical_index_dir = os.getenv("LEXICAL_INDEX_DIR", "temp_lexical_index")
+        self.lexical_fast_path_min_score = float(os.getenv("LEXICAL_FAST_PATH_MIN_SCORE", "2.0"))
+        self.lexical_fast_path_ratio = float(os.getenv("LEXICAL_FAST_PATH_RATIO", "2.0"))
+        self.rrf_k = int(os.getenv("RRF_K", "60"))
+        # Per-session retrieval results; entries are invalidated by uploads, the TTL is a backstop.
+        self.retrieval_cache_size = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+        self.retrieval_cache_ttl = float(os.getenv("RETRIEVAL_CACHE_TTL", "3600"))
+        # RAG sufficiency gate on the best cosine similarity of a retrieved chunk (the raw Azure
+        # Search score is converted first, and hybrid results are gated on their vector scores,
+        # not on the fused rank): at or above ANSWER the chunks are used without asking the judge
+        # LLM, below WEB (or no hits) the turn goes to web search; scores in between, and
+        # lexical-only retrievals such as the lexical fast path, which carry no score, still go
+        # to the judge.
+        self.rag_gate_enabled = os.getenv("RAG_GATE_ENABLED", "true").lower() == "true"
+        self.rag_gate_answer_score = float(os.getenv("RAG_GATE_ANSWER_SCORE", "0.9"))
+        self.rag_gate_web_score = float(os.getenv("RAG_GATE_WEB_SCORE", "0.7"))
+
+        # Answer prompt packing (token budgets).
+        self.answer_context_token_budget = int(os.getenv("ANSWER_CONTEXT_TOKEN_BUDGET", "3000"))
+        self.answer_history_token_budget = int(os.getenv("ANSWER_HISTORY_TOKEN_BUDGET", "1500"))
+        self.answer_max_table_rows = int(os.getenv("ANSWER_MAX_TABLE_ROWS", "25"))
 
         # Tavily configuration
-        self.tavily_api_key = os.getenv("TAVILY_API_KEY")
\ No newline at end of file
+        self.tavily_api_key = os.getenv("TAVILY_API_KEY")
+        self.tavily_max_results = int(os.getenv("TAVILY_MAX_RESULTS", "3"))
+        self.tavily_topic = os.getenv("TAVILY_TOPIC", "general")
+        # Web result cache: in-memory LRU plus an optional on-disk tier (empty dir = memory only).
+        self.web_cache_size = int(os.getenv("WEB_CACHE_SIZE", "512"))
+        self.web_cache_ttl = float(os.getenv("WEB_CACHE_TTL", "900"))
+        self.web_cache_error_ttl = float(os.getenv("WEB_CACHE_ERROR_TTL", "30"))
+        self.web_cache_dir = os.getenv("WEB_CACHE_DIR", "")
+
+    # Read timeouts per LLM role; classification-style roles should fail fast.
+    ROLE_READ_TIMEOUTS = {
+        "router": 20,
+        "judge": 20,
+        "contextualise": 20,
+        "contextualise_route": 20,
+        "analyst": 45,
+        "answer": 60,
+        "document_qa": 60,
+        "embedding": 30,
+    }
+
+    def get_role_timeouts(self, role: str):
+        """
+        Returns (connect, read) timeouts in seconds for an LLM role.
+        Override per role with LLM_READ_TIMEOUT_<ROLE> / LLM_CONNECT_TIMEOUT_<ROLE>.
+        """
+        read_default = self.ROLE_READ_TIMEOUTS.get(role, self.llm_read_timeout)
+        connect = float(os.getenv(f"LLM_CONNECT_TIMEOUT_{role.upper()}", self.llm_connect_timeout))
+        read = float(os.getenv(f"LLM_READ_TIMEOUT_{role.upper()}", read_default))
+        return connect, read
+
+    def get_role_deployments(self, role: str):
+        """
+        Deployments for an LLM role, primary first. Set LLM_DEPLOYMENTS_<ROLE> (comma separated) to
+        move a role to its own, e.g. smaller and faster, model; OPENAI_DEPLOYMENT_NAME is the default.
+        OPENAI_FALLBACK_DEPLOYMENTS are appended. The second deployment also receives hedged requests.
+        """
+        configured = os.getenv(f"LLM_DEPLOYMENTS_{role.upper()}", "")
+        deployments = [d.strip() for d in configured.split(",") if d.strip()] or [self.ai_deployment_name]
+        return list(dict.fromkeys(deployments + self.ai_fallback_deployments))
+
+    def get_deployment_rate_limits(self, deployment: str):
+        """
+        Returns (requests per minute, tokens per minute) for an Azure OpenAI deployment.
+        Override per deployment with LLM_RPM_LIMIT_<DEPLOYMENT> / LLM_TPM_LIMIT_<DEPLOYMENT>
+        (name upper-cased, non-alphanumerics replaced by "_").
+        """
+        suffix = "".join(c if c.isalnum() else "_" for c in deployment).upper()
+        rpm = int(os.getenv(f"LLM_RPM_LIMIT_{suffix}", self.llm_rpm_limit))
+        tpm = int(os.getenv(f"LLM_TPM_LIMIT_{suffix}", self.llm_tpm_limit))
+        return rpm, tpm
\ No newline at end of file
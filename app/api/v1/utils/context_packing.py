@@ -0,0 +1,162 @@
+import datetime
+import hashlib
+from decimal import Decimal
+from typing import Any, Dict, List, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage
+from app.api.v1.utils.tokens import count_tokens, count_message_tokens, truncate_to_tokens
+
+
+# ── SQL results ──────────────────────────────────────────────────────
+def _column_type(values: Sequence[Any]) -> str:
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            return "bool"
+        if isinstance(value, int):
+            return "int"
+        if isinstance(value, (float, Decimal)):
+            return "num"
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return "date"
+        return "text"
+    return "text"
+
+
+def _format_value(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, Decimal):
+        # Decimal('1234.50') -> 1234.5, without switching to exponent notation.
+        text = format(value.normalize(), "f")
+        return text if text != "-0" else "0"
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value).replace("|", "/").replace("\n", " ")
+
+
+def _summary(name: str, kind: str, values: Sequence[Any]) -> str | None:
+    present = [v for v in values if v is not None]
+    if not present:
+        return None
+    if kind in ("int", "num"):
+        numbers = [float(v) for v in present]
+        total = sum(numbers)
+        return (f"{name}: sum={total:.6g} mean={total / len(numbers):.6g} "
+                f"min={min(numbers):.6g} max={max(numbers):.6g}")
+    if kind == "date":
+        return f"{name}: {min(present).isoformat()} .. {max(present).isoformat()}"
+    if kind == "text":
+        return f"{name}: {len(set(present))} distinct"
+    return None
+
+
+def render_sql_result(result: Any, max_rows: int = 25) -> str:
+    """
+    Render analyst output as a compact typed table: a `name:type` header, pipe separated rows
+    truncated to `max_rows`, and summary statistics computed over all returned rows.
+    Plain strings (e.g. "Failed") and row lists without column names are handled as well.
+    """
+    if isinstance(result, str):
+        return result
+    truncated = False
+    if isinstance(result, dict):
+        columns, rows = list(result.get("columns") or []), list(result.get("rows") or [])
+        truncated = bool(result.get("truncated"))
+    else:
+        rows = list(result or [])
+        columns = [f"col{i + 1}" for i in range(len(rows[0]))] if rows else []
+    if not rows:
+        return "Query returned no rows."
+
+    by_column = list(zip(*rows))
+    kinds = [_column_type(values) for values in by_column]
+    lines = [" | ".join(f"{c}:{k}" for c, k in zip(columns, kinds))]
+    lines += [" | ".join(_format_value(v) for v in row) for row in rows[:max_rows]]
+    if len(rows) > max_rows:
+        lines.append(f"… {len(rows) - max_rows} more rows omitted ({len(rows)} total)")
+
+    stats = [s for s in (_summary(c, k, v) for c, k, v in zip(columns, kinds, by_column)) if s]
+    if stats and len(rows) > 1:
+        lines.append(("Summary (fetched rows): " if truncated else "Summary (all rows): ") + "; ".join(stats))
+    if truncated:
+        lines.append(f"Result was cut off at {len(rows)} rows; the full result is available via export.")
+    return "\n".join(lines)
+
+
+# ── Retrieved text ───────────────────────────────────────────────────
+def _strip_overlap(previous: str, chunk: str, max_overlap: int = 300) -> str:
+    """Drop the prefix of `chunk` that repeats the tail of `previous` (splitter chunk overlap)."""
+    limit = min(len(previous), len(chunk), max_overlap)
+    for size in range(limit, 20, -1):
+        if previous.endswith(chunk[:size]):
+            return chunk[size:].lstrip()
+    return chunk
+
+
+def pack_chunks(chunks: Sequence[str], budget_tokens: int) -> Tuple[List[str], int]:
+    """
+    Deduplicate retrieved chunks (exact, whitespace/case-insensitive and contained duplicates),
+    strip splitter overlap, and keep them in rank order until the token budget is used.
+    Returns the packed chunks and the tokens they use.
+    """
+    packed, seen, used = [], set(), 0
+    for chunk in chunks:
+        text = " ".join(str(chunk).split())
+        if not text:
+            continue
+        key = hashlib.sha1(text.lower().encode("utf-8")).hexdigest()
+        if key in seen or any(text in kept for kept in packed):
+            continue
+        seen.add(key)
+        for kept in packed:
+            text = _strip_overlap(kept, text)
+        if not text:
+            continue
+        remaining = budget_tokens - used
+        if remaining <= 0:
+            break
+        tokens = count_tokens(text)
+        if tokens > remaining:
+            text = truncate_to_tokens(text, remaining)
+            if not text:
+                break
+            tokens = count_tokens(text)
+        packed.append(text)
+        used += tokens
+    return packed, used
+
+
+def trim_history(messages: Sequence[BaseMessage], budget_tokens: int) -> List[BaseMessage]:
+    """Keep the most recent messages that fit in the token budget (always at least the last one)."""
+    kept, used = [], 0
+    for message in reversed(messages):
+        tokens = count_message_tokens([message])
+        if kept and used + tokens > budget_tokens:
+            break
+        kept.append(message)
+        used += tokens
+    return list(reversed(kept))
+
+
+def build_answer_context(state: Dict[str, Any], context_budget: int, max_table_rows: int) -> str:
+    """Assemble the compact context block for the answer prompt from the graph state."""
+    if state.get("analyst"):
+        return "Analyst Results:\n" + render_sql_result(state["analyst"], max_rows=max_table_rows)
+
+    parts = []
+    budget = context_budget
+    if state.get("rag"):
+        rag = state["rag"] if isinstance(state["rag"], list) else [state["rag"]]
+        # Reserve part of the budget for web results when both are present.
+        rag_budget = budget // 2 if state.get("web") else budget
+        chunks, used = pack_chunks(rag, rag_budget)
+        budget -= used
+        if chunks:
+            parts.append("Knowledge Base Information:\n" + "\n---\n".join(chunks))
+    if state.get("web"):
+        parts.append("Web Search Results:\n" + truncate_to_tokens(state["web"], budget))
+    return "\n\n".join(parts) if parts else "No external context available."
@@ -0,0 +1,205 @@
+import asyncio
+import csv
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.api.v1.utils.config import Config
+from app.api.v1.utils.startup import lazy_client
+
+SUPPORTED_FORMATS = ("docx", "pdf", "txt", "md", "csv")
+
+
+class DocumentParseError(Exception):
+    """The file is unsupported, too large, timed out or could not be parsed."""
+
+
+# ── Format sniffing ──────────────────────────────────────────────────
+def sniff_format(path: str) -> str:
+    """
+    Detect the format from the file content, using the extension only to tell apart text
+    flavours (txt/md/csv). A `.docx` that is not a Word zip, or binary data named `.txt`,
+    is rejected rather than parsed as garbage.
+    """
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    with open(path, "rb") as f:
+        head = f.read(8192)
+
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(path) as archive:
+                if "word/document.xml" in archive.namelist():
+                    return "docx"
+        except zipfile.BadZipFile:
+            pass
+        raise DocumentParseError("Unsupported archive; only .docx Word documents are accepted.")
+    if b"\x00" in head:
+        raise DocumentParseError("Unsupported binary file.")
+    if extension in ("md", "markdown"):
+        return "md"
+    if extension == "csv":
+        return "csv"
+    if extension not in ("txt", "text", ""):
+        # Text content with an unknown extension: treat delimited data as CSV.
+        try:
+            csv.Sniffer().sniff(_decode(head), delimiters=",;\t|")
+            return "csv"
+        except csv.Error:
+            pass
+    return "txt"
+
+
+def _decode(data: bytes) -> str:
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        from charset_normalizer import from_bytes
+
+        matches = list(from_bytes(data))
+        if not matches:
+            raise DocumentParseError("Could not detect the text encoding.")
+        # Short Western text is ambiguous between single-byte code pages; among the least
+        # chaotic candidates prefer Windows-1252, by far the most common legacy encoding.
+        least_chaos = min(match.chaos for match in matches)
+        candidates = [match for match in matches if match.chaos == least_chaos]
+        preferred = next((m for m in candidates if m.encoding in ("cp1252", "latin_1")), candidates[0])
+        return str(preferred)
+
+
+# ── Parsers (run in worker processes) ────────────────────────────────
+def _parse_docx(path: str, limits: dict) -> str:
+    import docx2txt
+
+    # zipfile never inflates an entry beyond its declared size, so the directory is enough
+    # to bound the work before anything is decompressed.
+    with zipfile.ZipFile(path) as archive:
+        entries = archive.infolist()
+    if len(entries) > limits["max_docx_entries"]:
+        raise DocumentParseError(f"Word document has {len(entries)} parts; the limit is {limits['max_docx_entries']}.")
+    if sum(entry.file_size for entry in entries) > limits["max_docx_bytes"]:
+        raise DocumentParseError(f"Word document expands beyond {limits['max_docx_bytes']} bytes.")
+    return docx2txt.process(path)
+
+
+def _parse_pdf(path: str, limits: dict) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise DocumentParseError("PDF support requires the `pypdf` package.")
+
+    reader = PdfReader(path)
+    if len(reader.pages) > limits["max_pdf_pages"]:
+        raise DocumentParseError(f"PDF has {len(reader.pages)} pages; the limit is {limits['max_pdf_pages']}.")
+    return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def _parse_text(path: str, limits: dict) -> str:
+    with open(path, "rb") as f:
+        return _decode(f.read())
+
+
+def _parse_csv(path: str, limits: dict) -> str:
+    """One line per row as `column: value; ...` so each chunk carries its own headers."""
+    text = _parse_text(path, limits)
+    try:
+        dialect = csv.Sniffer().sniff(text[:8192], delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    rows = csv.reader(io.StringIO(text), dialect)
+    header = next(rows, [])
+    return "\n".join(
+        "; ".join(f"{name}: {value}" for name, value in zip(header, row) if value != "")
+        for row in rows if any(row)
+    )
+
+
+_PARSERS = {"docx": _parse_docx, "pdf": _parse_pdf, "txt": _parse_text, "md": _parse_text, "csv": _parse_csv}
+
+
+def parse_file(path: str, limits: dict) -> str:
+    """Sniff and parse one file; the entry point executed in the worker processes."""
+    fmt = sniff_format(path)
+    text = _PARSERS[fmt](path, limits).strip()
+    if not text:
+        raise DocumentParseError("No text could be extracted.")
+    if len(text) > limits["max_text_chars"]:
+        raise DocumentParseError(f"Extracted text exceeds {limits['max_text_chars']} characters.")
+    return text
+
+
+# ── Process pool ─────────────────────────────────────────────────────
+class DocumentParserPool:
+    """
+    Parses uploads in a process pool so CPU-bound extraction neither blocks the event loop nor
+    competes for the GIL. Each file gets a timeout; since a running task cannot be cancelled,
+    a timeout retires the pool and starts a fresh one (other files caught in the restart are
+    retried once). The retired pool's workers are terminated where the executor supports it
+    (Python 3.14+); otherwise they finish their current file, bounded by the parser limits.
+    """
+
+    def __init__(self, conf: Config):
+        self.conf = conf
+        self.limits = {
+            "max_text_chars": conf.parser_max_text_chars,
+            "max_pdf_pages": conf.parser_max_pdf_pages,
+            "max_docx_bytes": conf.parser_max_docx_bytes,
+            "max_docx_entries": conf.parser_max_docx_entries,
+        }
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # forkserver: workers fork from a clean process, not from the threaded API server.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.conf.parser_workers or os.cpu_count(),
+                    mp_context=multiprocessing.get_context("forkserver"),
+                )
+            return self._executor
+
+    def _restart(self, executor: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        terminate = getattr(executor, "terminate_workers", None)
+        if terminate is not None:
+            terminate()
+        else:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def parse(self, path: str) -> str:
+        if os.path.getsize(path) > self.conf.parser_max_file_bytes:
+            raise DocumentParseError(f"File exceeds {self.conf.parser_max_file_bytes} bytes.")
+        for attempt in (1, 2):
+            executor = self._pool()
+            future = executor.submit(parse_file, path, self.limits)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future), self.conf.parser_timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"Parsing {os.path.basename(path)} timed out; restarting parser pool")
+                self._restart(executor)
+                raise DocumentParseError(f"Parsing timed out after {self.conf.parser_timeout:.0f}s.")
+            except BrokenProcessPool:
+                self._restart(executor)
+                if attempt == 2:
+                    raise DocumentParseError("Parser worker crashed.")
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+@lazy_client("document_parser")
+def get_document_parser() -> DocumentParserPool:
+    return DocumentParserPool(Config())
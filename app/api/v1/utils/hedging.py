@@ -0,0 +1,116 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Optional
+
+from langchain_core.runnables import RunnableConfig, ensure_config
+from langchain_core.runnables.fallbacks import RunnableWithFallbacks
+
+from app.api.v1.utils.config import Config
+from app.api.v1.utils.metrics import LLM_HEDGES
+from app.api.v1.utils.startup import lazy_client
+
+
+class LatencyWindow:
+    """The most recent call latencies of one LLM role, for its hedging delay."""
+
+    def __init__(self, size: int):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < max(1, min_samples):
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+_windows: Dict[str, LatencyWindow] = {}
+_windows_lock = threading.Lock()
+
+
+def latency_window(role: str, size: int) -> LatencyWindow:
+    with _windows_lock:
+        return _windows.setdefault(role, LatencyWindow(size))
+
+
+@lazy_client("hedge_executor")
+def get_hedge_executor() -> ThreadPoolExecutor:
+    # A hedged call holds up to two threads; losers run to completion as they cannot be cancelled.
+    return ThreadPoolExecutor(max_workers=4 * Config().llm_concurrency_max, thread_name_prefix="llm-hedge")
+
+
+class HedgedRunnable(RunnableWithFallbacks):
+    """
+    `with_fallbacks` over a role's deployments that also hedges: when the primary has not
+    answered within the role's recent p95 latency, the same request goes to the first fallback
+    and whichever answers first wins. Further fallbacks are tried in order once both failed.
+
+    Method calls returning a runnable (`with_structured_output`, `bind_tools`, ...) apply to
+    every deployment, as with `with_fallbacks`. Only `invoke` hedges; batches and async calls
+    use plain fallbacks.
+    """
+
+    role: str = "default"
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        conf = Config()
+        if not conf.llm_hedge_enabled or self.role not in conf.llm_hedge_roles or self.exception_key:
+            return super().invoke(input, config, **kwargs)
+
+        config = ensure_config(config)
+        config.pop("run_id", None)
+        window = latency_window(self.role, conf.llm_hedge_window)
+        delay = window.quantile(conf.llm_hedge_quantile, conf.llm_hedge_min_samples)
+        if delay is not None:
+            delay = max(delay, conf.llm_hedge_min_delay)
+
+        runnables = list(self.runnables)
+        executor = get_hedge_executor()
+
+        def submit(index: int):
+            runnable = runnables[index]
+
+            def call():
+                start = time.perf_counter()
+                output = runnable.invoke(input, config, **kwargs)
+                if index == 0:
+                    # Losing primaries are recorded too, so slow replicas raise the delay honestly.
+                    window.add(time.perf_counter() - start)
+                return output
+
+            # Copied context: the admission priority of this request applies to both calls.
+            return executor.submit(contextvars.copy_context().run, call)
+
+        primary = submit(0)
+        pending, launched, hedged, errors = [primary], 1, False, []
+        if delay is not None and len(runnables) > 1 and not wait([primary], timeout=delay).done:
+            pending.append(submit(1))
+            launched, hedged = 2, True
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                try:
+                    output = future.result()
+                except self.exceptions_to_handle as e:
+                    errors.append(e)
+                    continue
+                if hedged:
+                    LLM_HEDGES.labels(role=self.role, winner="primary" if future is primary else "hedge").inc()
+                return output
+            if not pending and launched < len(runnables):
+                pending.append(submit(launched))
+                launched += 1
+
+        if hedged:
+            LLM_HEDGES.labels(role=self.role, winner="failed").inc()
+        raise errors[0]
@@ -0,0 +1,50 @@
+import importlib.util
+import httpx
+from app.api.v1.utils.admission import AdmissionController, AdmissionTransport, AsyncAdmissionTransport
+from app.api.v1.utils.config import Config
+from app.api.v1.utils.startup import lazy_client
+
+
+def _http2_available(conf: Config) -> bool:
+    # httpx only speaks HTTP/2 when the optional `h2` package is installed.
+    return conf.http2_enabled and importlib.util.find_spec("h2") is not None
+
+
+def _limits(conf: Config) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=conf.http_max_connections,
+        max_keepalive_connections=conf.http_max_keepalive_connections,
+        keepalive_expiry=conf.http_keepalive_expiry,
+    )
+
+
+def role_timeout(conf: Config, role: str) -> httpx.Timeout:
+    """Timeout for one LLM role; the pool timeout matches connect so a saturated pool fails fast too."""
+    connect, read = conf.get_role_timeouts(role)
+    return httpx.Timeout(connect=connect, read=read, write=read, pool=connect)
+
+
+@lazy_client("admission_controller")
+def get_admission_controller() -> AdmissionController:
+    """Shared by the sync and async clients so both draw from the same per-deployment budgets."""
+    return AdmissionController(Config())
+
+
+@lazy_client("http_client")
+def get_http_client() -> httpx.Client:
+    """Process-wide keep-alive connection pool shared by every Azure OpenAI chat and embedding client."""
+    conf = Config()
+    transport = httpx.HTTPTransport(limits=_limits(conf), http2=_http2_available(conf))
+    if conf.admission_enabled:
+        transport = AdmissionTransport(transport, get_admission_controller())
+    return httpx.Client(transport=transport, timeout=role_timeout(conf, "default"))
+
+
+@lazy_client("http_async_client")
+def get_http_async_client() -> httpx.AsyncClient:
+    """Async counterpart of `get_http_client` for `ainvoke`/`astream` calls."""
+    conf = Config()
+    transport = httpx.AsyncHTTPTransport(limits=_limits(conf), http2=_http2_available(conf))
+    if conf.admission_enabled:
+        transport = AsyncAdmissionTransport(transport, get_admission_controller())
+    return httpx.AsyncClient(transport=transport, timeout=role_timeout(conf, "default"))
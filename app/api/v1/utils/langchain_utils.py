@@ -1,24 +1,22 @@
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
 from app.api.v1.utils.llm_manager import LLMManager
 from app.api.v1.utils.config import Config
+from app.api.v1.utils.startup import lazy_client
+from app.api.v1.utils.prompts import get_prompt
+from app.api.v1.utils.shared import ContextualRouteModel
 
 
 
-contextualize_q_system_prompt = (
-    "Given a chat history and the latest user question "
-    "which might reference context in the chat history, "
-    "formulate a standalone question which can be understood "
-    "without the chat history. Do NOT answer the question, "
-    "just reformulate it if needed and otherwise return it as is. "
-    "⟹ Return **only** the reformulated question (no explanations, no answers)."
-)
+CONTEXT_PROMPT = get_prompt("contextualise").template
 
-CONTEXT_PROMPT = ChatPromptTemplate.from_messages([
-    ("system", contextualize_q_system_prompt),
-    MessagesPlaceholder(variable_name="chat_history"),
-    ("human", "{input}")
-])
+@lazy_client("contextualise_chain")
+def get_contextualise_chain():
+    prompt = get_prompt("contextualise")
+    return ( prompt.template | prompt.observe | LLMManager(Config(), role="contextualise").connect() | StrOutputParser()).with_config(run_name="contextualise_chain")
 
-contextualise_chain = ( CONTEXT_PROMPT | LLMManager(Config()).connect() | StrOutputParser()).with_config(run_name="contextualise_chain")
\ No newline at end of file
+@lazy_client("contextualise_route_chain")
+def get_contextualise_route_chain():
+    """Stand-alone question, route and (for `end`) the reply from one structured call over the history."""
+    prompt = get_prompt("contextualise_route")
+    llm = LLMManager(Config(), temperature=0, role="contextualise_route").connect()
+    return (prompt.template | prompt.observe | llm.with_structured_output(ContextualRouteModel)).with_config(run_name="contextualise_route_chain")
@@ -3,6 +3,10 @@ from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 from langgraph.graph import StateGraph, END
 from app.api.v1.utils.nodes import router_node, rag_node, web_node, answer_node, analyst_node
 from app.api.v1.utils.shared import AgentState
+from app.api.v1.utils.metrics import instrument_node
+from app.api.v1.utils.checkpointer import get_checkpointer, latest_state, thread_config
+from app.api.v1.utils.startup import lazy_client
+import logging
 
 # Routing helpers
 def from_router(st: AgentState) -> Literal["rag", "answer", "analyst", "end"]:
@@ -19,11 +23,11 @@ def after_analyst(_) -> Literal["answer"]:
     
 # Build graph
 g = StateGraph(AgentState)
-g.add_node("router", router_node)
-g.add_node("rag_lookup", rag_node)
-g.add_node("web_search", web_node)
-g.add_node("analyst", analyst_node)
-g.add_node("answer", answer_node)
+g.add_node("router", instrument_node("router", router_node))
+g.add_node("rag_lookup", instrument_node("rag_lookup", rag_node))
+g.add_node("web_search", instrument_node("web_search", web_node))
+g.add_node("analyst", instrument_node("analyst", analyst_node))
+g.add_node("answer", instrument_node("answer", answer_node))
 g.set_entry_point("router")
 g.add_conditional_edges("router", from_router,
                         {"analyst": "analyst", "rag": "rag_lookup", "answer": "answer", "end": END})
@@ -37,4 +41,23 @@ g.add_edge("analyst", "answer")
 g.add_edge("web_search",  "answer")
 g.add_edge("answer", END)
 
-agent = g.compile()
\ No newline at end of file
+agent = g.compile()
+
+
+@lazy_client("session_agent")
+def get_session_agent():
+    """The same graph with durable per-session state; invoke it with `thread_config(session_id)`."""
+    return g.compile(checkpointer=get_checkpointer())
+
+
+def forget_reusable_context(session_id: str, node: str = "rag") -> None:
+    """Drop a node's reusable result from the session checkpoint, e.g. after new documents are indexed."""
+    session_agent = get_session_agent()
+    state = latest_state(session_agent, session_id)
+    if not state or node not in (state.get("reuse") or {}):
+        return
+    reuse = {k: v for k, v in state["reuse"].items() if k != node}
+    try:
+        session_agent.update_state(thread_config(session_id), {"reuse": reuse}, as_node="answer")
+    except Exception as e:
+        logging.warning(f"Resetting {node} context for session {session_id} failed: {str(e)}")
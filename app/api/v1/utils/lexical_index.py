@@ -0,0 +1,244 @@
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: updates are then only serialised within one process.
+    fcntl = None
+
+# Keeps identifiers such as "sku-105", "4.2.1" or "promo_type" together as one token.
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it its me my of on "
+    "or our please show tell that the their there these this to us was we what when where "
+    "which who why will with you your".split()
+)
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive advisory lock on `path` (created if missing) for a read-modify-write across processes."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def write_json_atomic(path: str, data) -> None:
+    """Write JSON to a unique temporary file next to `path`, then rename it over `path`."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords; compound identifiers also yield their parts."""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        parts = re.split(r"[-_./]", token)
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p and p not in STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """In-memory inverted index over document chunks with Okapi BM25 scoring."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.texts: Dict[str, str] = {}
+        self.lengths: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, doc_id: str, text: str):
+        if doc_id in self.texts:
+            self.remove(doc_id)
+        tokens = tokenize(text)
+        self.texts[doc_id] = text
+        self.lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+        for token in tokens:
+            postings = self.postings.setdefault(token, {})
+            postings[doc_id] = postings.get(doc_id, 0) + 1
+
+    def remove(self, doc_id: str):
+        text = self.texts.pop(doc_id, None)
+        if text is None:
+            return
+        self.total_length -= self.lengths.pop(doc_id)
+        for token in set(tokenize(text)):
+            postings = self.postings.get(token)
+            if postings:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[token]
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        if not self.texts:
+            return []
+        n = len(self.texts)
+        avg_length = self.total_length / n or 1.0
+        scores: Dict[str, float] = {}
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def to_dict(self) -> Dict:
+        return {"k1": self.k1, "b": self.b, "texts": self.texts}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BM25Index":
+        index = cls(k1=data.get("k1", 1.5), b=data.get("b", 0.75))
+        for doc_id, text in data.get("texts", {}).items():
+            index.add(doc_id, text)
+        return index
+
+
+class LexicalIndexRegistry:
+    """
+    Per-session BM25 indexes. Each index is persisted as JSON at
+    `<base_dir>/<session_id>/lexical_index.json` and at most `max_sessions` indexes are kept in
+    memory; evicted ones are reloaded from disk on demand. `base_dir` must not be the upload
+    directory, where an uploaded file of the same name would replace the index.
+
+    Every worker process keeps its own copies, so each cached index remembers the file version
+    it was loaded from and is reloaded once another worker rewrote the file. Updates hold an
+    exclusive lock on `lexical_index.json.lock` across their read-modify-write.
+    """
+
+    FILE_NAME = "lexical_index.json"
+
+    def __init__(self, base_dir: str = "temp_lexical_index", max_sessions: int = 256):
+        self.base_dir = base_dir
+        self.max_sessions = max_sessions
+        self._indexes: "OrderedDict[str, Tuple[BM25Index, Tuple[int, int, int]]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.base_dir, session_id, self.FILE_NAME)
+
+    def _file_lock(self, session_id: str):
+        return file_lock(self._path(session_id) + ".lock")
+
+    def _load(self, session_id: str) -> Tuple[Optional[BM25Index], Tuple[int, int, int]]:
+        try:
+            with open(self._path(session_id), "r", encoding="utf-8") as f:
+                # The open file's own version: a concurrent `os.replace` cannot slip in between.
+                stat = os.fstat(f.fileno())
+                index = BM25Index.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None, (0, 0, 0)
+        return index, (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def snapshot(self, session_id: str) -> Tuple[Optional[BM25Index], Tuple[int, int, int]]:
+        """
+        `(index, version)` for the session, reloaded when the persisted file changed since it
+        was cached. The version is the one of the returned index, so results computed from it
+        can be cached under it. `(None, (0, 0, 0))` when nothing was indexed for the session.
+        """
+        version = self.version(session_id)
+        with self._lock:
+            cached = self._indexes.get(session_id)
+            if cached is not None and cached[1] == version:
+                self._indexes.move_to_end(session_id)
+                return cached
+            index, version = self._load(session_id)
+            if index is None:
+                self._indexes.pop(session_id, None)
+            else:
+                self._remember(session_id, index, version)
+            return index, version
+
+    def get(self, session_id: str) -> Optional[BM25Index]:
+        """Index for the session, or None when nothing was indexed for it."""
+        return self.snapshot(session_id)[0]
+
+    def version(self, session_id: str) -> Tuple[int, int, int]:
+        """
+        Changes whenever the session's indexed chunks change, in any worker process on this host,
+        since every `update` and `drop` replaces or removes the persisted file. (0, 0, 0) when absent.
+        """
+        try:
+            stat = os.stat(self._path(session_id))
+        except FileNotFoundError:
+            return 0, 0, 0
+        # The inode too: two updates within one mtime tick may leave files of equal size.
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _remember(self, session_id: str, index: BM25Index, version: Tuple[int, int, int]):
+        self._indexes[session_id] = (index, version)
+        self._indexes.move_to_end(session_id)
+        while len(self._indexes) > self.max_sessions:
+            self._indexes.popitem(last=False)
+
+    def update(self, session_id: str, added: Dict[str, str], removed: List[str] = ()):
+        """Add `{chunk_id: text}` and drop `removed` chunk ids, then persist the session index."""
+        with self._lock, self._file_lock(session_id):
+            # Always the file as persisted, never a cached copy: another worker may have
+            # updated it, and readers of the cached index must not see it change under them.
+            index = self._load(session_id)[0] or BM25Index()
+            for doc_id in removed:
+                index.remove(doc_id)
+            for doc_id, text in added.items():
+                index.add(doc_id, text)
+            write_json_atomic(self._path(session_id), index.to_dict())
+            self._remember(session_id, index, self.version(session_id))
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._indexes.pop(session_id, None)
+            path = self._path(session_id)
+            # Never create the directory of a session that has nothing indexed just to lock it.
+            if not os.path.isdir(os.path.dirname(path)):
+                return
+            with self._file_lock(session_id):
+                if os.path.exists(path):
+                    os.remove(path)
+                # The session is gone: leave no lock file or directory behind for it.
+                os.remove(path + ".lock")
+            try:
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                pass
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse several ranked id lists: score(d) = sum(1 / (k + rank))."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
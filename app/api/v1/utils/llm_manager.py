@@ -1,19 +1,35 @@
-from langchain_community.vectorstores.azuresearch import AzureSearch
-from langchain_openai import AzureChatOpenAI
 from app.api.v1.utils.config import Config
+from app.api.v1.utils.metrics import LLMMetricsCallback
+from app.api.v1.utils.http_client import get_http_client, get_http_async_client, role_timeout
 
 
 class LLMManager:
-    def __init__(self, config: Config, temperature: int = 0):
+    def __init__(self, config: Config, temperature: int = 0, role: str = "default"):
         self.conf = config
-        self.llm = AzureChatOpenAI(
-                azure_deployment= self.conf.ai_deployment_name,
+        self.role = role
+        # Imported here: the OpenAI SDK adds about a second to module import time.
+        from langchain_openai import AzureChatOpenAI
+        # One client per deployment of the role (primary first); see Config.get_role_deployments.
+        self.deployments = self.conf.get_role_deployments(role)
+        llms = [
+            AzureChatOpenAI(
+                azure_deployment= deployment,
                 api_version= self.conf.ai_api_version,
                 temperature= temperature,
                 max_tokens= None,
-                timeout= None,
+                timeout= role_timeout(self.conf, role),
                 max_retries=2,
-        )
+                http_client= get_http_client(),
+                http_async_client= get_http_async_client(),
+                callbacks=[LLMMetricsCallback(role)],
+            )
+            for deployment in self.deployments
+        ]
+        if len(llms) == 1:
+            self.llm = llms[0]
+        else:
+            from app.api.v1.utils.hedging import HedgedRunnable
+            self.llm = HedgedRunnable(runnable=llms[0], fallbacks=llms[1:], role=role)
 
     def connect(self):
-        return self.llm
\ No newline at end of file
+        return self.llm
@@ -0,0 +1,296 @@
+import functools
+import os
+import time
+import threading
+from typing import Any, Dict
+from uuid import UUID
+
+from fastapi import Request, Response
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+
+# ── Metric definitions ───────────────────────────────────────────────
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ["method", "route", "status"],
+)
+
+NODE_LATENCY = Histogram(
+    "agent_node_duration_seconds",
+    "Time spent inside each LangGraph node.",
+    ["node"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40),
+)
+
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds",
+    "Chat model call latency per role.",
+    ["role"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64),
+)
+
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Prompt and completion tokens consumed per role; kind=cached_prompt is the part of the "
+    "prompt the provider served from its prefix cache.",
+    ["role", "kind"],
+)
+
+PROMPT_TOKENS = Histogram(
+    "prompt_tokens",
+    "Tokens per rendered registry prompt and part (static prefix, chat history, variable tail).",
+    ["prompt", "part"],
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+)
+
+LLM_ERRORS = Counter(
+    "llm_errors_total",
+    "Chat model calls that raised, per role.",
+    ["role"],
+)
+
+LLM_HEDGES = Counter(
+    "llm_hedged_requests_total",
+    "Hedged chat model calls per role and which request answered: primary, hedge, or failed.",
+    ["role", "winner"],
+)
+
+EMBEDDING_LATENCY = Histogram(
+    "embedding_request_duration_seconds",
+    "Embedding call latency.",
+    ["operation"],
+)
+
+SEARCH_LATENCY = Histogram(
+    "vector_search_duration_seconds",
+    "Vector store search latency, including the query embedding.",
+    ["operation"],
+)
+
+ANSWER_PROMPT_TOKENS = Histogram(
+    "answer_prompt_tokens",
+    "answer_node prompt size: 'packed' is what is sent, 'unpacked' the pre-packing equivalent.",
+    ["variant"],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000),
+)
+
+RETRIEVAL_PATHS = Counter(
+    "retrieval_path_total",
+    "RAG retrievals by path: lexical fast path, vector only, or lexical+vector fusion.",
+    ["path"],
+)
+
+RAG_SUFFICIENCY = Counter(
+    "rag_sufficiency_decisions_total",
+    "RAG answer/web decisions by who made them: the local relevance-score gate or the judge LLM.",
+    ["decider", "outcome"],
+)
+
+RAG_TOP_SCORE = Histogram(
+    "rag_top_relevance_score",
+    "Best cosine similarity of a RAG retrieval, by decider and outcome; the judge's "
+    "verdicts over the ambiguous band are what the gate thresholds are tuned from.",
+    ["decider", "outcome"],
+    buckets=(0.3, 0.4, 0.5, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0),
+)
+
+SQL_LATENCY = Histogram(
+    "sql_query_duration_seconds",
+    "SQL execution time per database and operation.",
+    ["database", "operation"],
+)
+
+SQL_ANALYST_RETRIES = Counter(
+    "sql_analyst_retries_total",
+    "Failed sql_analyst_tool attempts that were retried with error feedback.",
+)
+
+SQL_ANALYST_OUTCOMES = Counter(
+    "sql_analyst_outcomes_total",
+    "Final outcome of sql_analyst_tool invocations: success (LLM-written SQL), template (learned SQL template) or failed.",
+    ["outcome"],
+)
+
+SINGLE_FLIGHT_COALESCED = Counter(
+    "single_flight_coalesced_total",
+    "Calls that waited on an identical in-flight call instead of executing, per group.",
+    ["group"],
+)
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups per cache and result (hit/miss); hit ratio = hit / (hit + miss).",
+    ["cache", "result"],
+)
+
+CACHE_SAVED_SECONDS = Counter(
+    "cache_saved_seconds_total",
+    "Upstream latency avoided by cache hits, per cache.",
+    ["cache"],
+)
+
+SESSION_GC_RECLAIMED = Counter(
+    "session_gc_reclaimed_total",
+    "Resources released by session garbage collection: sessions, vector_chunks, files, bytes, history_rows.",
+    ["resource"],
+)
+
+SESSION_GC_SWEEP = Histogram(
+    "session_gc_sweep_duration_seconds",
+    "Duration of a background session garbage collection sweep.",
+    buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900),
+)
+
+ADMISSION_WAIT = Histogram(
+    "llm_admission_wait_seconds",
+    "Time Azure OpenAI calls spent queued in the admission controller.",
+    ["deployment", "priority"],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120),
+)
+
+ADMISSION_REJECTED = Counter(
+    "llm_admission_rejected_total",
+    "Calls that reached their queue deadline without being admitted.",
+    ["deployment", "priority"],
+)
+
+ADMISSION_THROTTLED = Counter(
+    "llm_admission_throttled_total",
+    "429 responses received from Azure OpenAI per deployment.",
+    ["deployment"],
+)
+
+ADMISSION_CONCURRENCY = Gauge(
+    "llm_admission_concurrency_limit",
+    "Current adaptive (AIMD) concurrency limit per deployment.",
+    ["deployment"],
+    multiprocess_mode="livemax",
+)
+
+STARTUP_SECONDS = Gauge(
+    "app_startup_phase_seconds",
+    "Duration of each startup phase and of each lazily initialised client.",
+    ["phase"],
+    multiprocess_mode="max",
+)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    """Count a lookup against one of the application caches."""
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+# ── Instrumentation helpers ──────────────────────────────────────────
+def timed(metric, fn):
+    """Wrap any callable (including bound methods) so each call is observed on `metric`."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with metric.time():
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def instrument_node(name: str, node):
+    """Wrap a LangGraph node function so its execution time is recorded."""
+
+    @functools.wraps(node)
+    def wrapper(state):
+        with NODE_LATENCY.labels(node=name).time():
+            return node(state)
+
+    return wrapper
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """LangChain callback recording latency and token usage of chat model calls for a role."""
+
+    def __init__(self, role: str):
+        self.role = role
+        self._starts: Dict[UUID, float] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID):
+        with self._lock:
+            self._starts[run_id] = time.perf_counter()
+
+    def _elapsed(self, run_id: UUID):
+        with self._lock:
+            start = self._starts.pop(run_id, None)
+        return None if start is None else time.perf_counter() - start
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        elapsed = self._elapsed(run_id)
+        if elapsed is not None:
+            LLM_LATENCY.labels(role=self.role).observe(elapsed)
+
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        if prompt_tokens is None:
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt_tokens = (prompt_tokens or 0) + metadata.get("input_tokens", 0)
+                    completion_tokens = (completion_tokens or 0) + metadata.get("output_tokens", 0)
+                    cached_tokens = (cached_tokens or 0) + (metadata.get("input_token_details") or {}).get("cache_read", 0)
+        if prompt_tokens:
+            LLM_TOKENS.labels(role=self.role, kind="prompt").inc(prompt_tokens)
+        if completion_tokens:
+            LLM_TOKENS.labels(role=self.role, kind="completion").inc(completion_tokens)
+        if cached_tokens:
+            LLM_TOKENS.labels(role=self.role, kind="cached_prompt").inc(cached_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        elapsed = self._elapsed(run_id)
+        if elapsed is not None:
+            LLM_LATENCY.labels(role=self.role).observe(elapsed)
+        LLM_ERRORS.labels(role=self.role).inc()
+
+
+# ── FastAPI integration ──────────────────────────────────────────────
+async def metrics_middleware(request: Request, call_next):
+    """Record request latency labelled with the matched route template, not the raw path."""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status),
+        ).observe(time.perf_counter() - start)
+
+
+def metrics_response() -> Response:
+    """Render all metrics in the Prometheus text format (multiprocess-aware for uvicorn workers)."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
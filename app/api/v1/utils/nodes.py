@@ -1,35 +1,28 @@
 from typing import Literal
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from app.api.v1.utils.shared import AgentState, router_llm, judge_llm, analyst_llm, answer_llm, RouteDecisionModel, RagJudgeModel
-from app.api.v1.utils.tools import web_search_tool, sql_analyst_tool, rag_search_tool
-from app.api.v1.utils.vector_db_manager import VectorDBManager
+from langchain_core.messages import HumanMessage, AIMessage
+from app.api.v1.utils.shared import AgentState, get_router_llm, get_judge_llm, get_answer_llm, RouteDecisionModel, RagJudgeModel
+from app.api.v1.utils.tools import web_search_tool, sql_analyst_tool, search_knowledge_base
 from app.api.v1.utils.config import Config
+from app.api.v1.utils.context_packing import build_answer_context, trim_history
+from app.api.v1.utils.tokens import count_message_tokens
+from app.api.v1.utils.prompts import get_prompt
+from app.api.v1.utils.metrics import ANSWER_PROMPT_TOKENS, RAG_SUFFICIENCY, RAG_TOP_SCORE, record_cache_lookup
+from app.api.v1.utils.single_flight import normalize_key
+import logging
+import time
 
 
 # Node 1: decision/router
 def router_node(state: AgentState) -> AgentState:
-    # Use full message history with a system prompt
-    system_prompt = (
-        "You are a smart routing controller that decides which node should handle a user's query.\n"
-        "Classify each query into one of the following categories and return both the 'route' and an optional 'reply' when required.\n\n"
-        "Routing rules:\n"
-        "- Use 'end' if the message is:\n"
-        "  • A greeting, farewell, or small talk (e.g., 'hi', 'hello', 'how are you', 'thanks').\n"
-        "  • A repeated question already answered in the recent chat history. Include a short friendly reply.\n\n"
-        "- Use 'analyst' if the question relates to:\n"
-        "  • Sales data, sales metrics, revenue, stores, products, customers, or any business data analysis.\n"
-        "  • Mentions words like 'sales_data', 'revenue', 'profit', 'region performance', 'trend analysis', or 'KPIs'.\n"
-        "  • Analytical or explanatory requests (e.g., 'explain', 'analyze', 'summarize', 'compare', 'show insights').\n\n"
-        "- Use 'rag' if the query needs factual or domain-specific information that is not directly about sales data\n"
-        "  and not already answered — meaning a knowledge base lookup or document search is needed.\n\n"
-        "- Use 'answer' if you can confidently respond directly using general knowledge, reasoning, or context,\n"
-        "  without needing external data or retrieval.\n\n"
-    )
-
-
-
-    messages = [SystemMessage(content= system_prompt)] + state["messages"]
-    result: RouteDecisionModel = router_llm.invoke(messages)
+    preset = state.get("preset_route")
+    if preset:
+        # Already decided together with the stand-alone question (AGENT_COMBINED_ROUTING).
+        result = RouteDecisionModel(**preset)
+    else:
+        # Static routing rules first, then the history, with the latest question last
+        *history, latest = state["messages"]
+        messages = get_prompt("router").render(chat_history=history, question=latest.content)
+        result: RouteDecisionModel = get_router_llm().invoke(messages)
 
     out = {"messages": state["messages"], "route": result.route}
 
@@ -43,25 +36,57 @@ def rag_node(state: AgentState) -> AgentState:
     query = next((m.content for m in reversed(state["messages"])
                     if isinstance(m, HumanMessage)), "")
 
-    chunks = rag_search_tool.invoke({"user_query": query, "session_id": state["session_id"]})
-
-    # Use structured output to judge if RAG results are sufficient
-    judge_messages = [
-        ("system", (
-            "You are a judge evaluating if the retrieved information is sufficient "
-            "to answer the user's question. Consider both relevance and completeness."
-        )),
-        ("user", f"Question: {query}\n\nRetrieved info: {chunks}\n\nIs this sufficient to answer the question?")
-    ]
-
-    verdict: RagJudgeModel = judge_llm.invoke(judge_messages)
+    # Same question as an earlier turn of the session: reuse its chunks and verdict.
+    previous = _reusable(state, "rag", query)
+    if previous:
+        return {**state, "rag": previous["chunks"], "route": "answer" if previous["sufficient"] else "web"}
+
+    scored = search_knowledge_base(query, state["session_id"])
+    chunks = [text for text, _ in scored]
+    scores = [score for _, score in scored if score is not None]
+    top_score = max(scores) if scores else None
+
+    # Clear-cut retrievals are decided on their relevance score; the judge gets the rest.
+    sufficient, reason = _score_gate(chunks, top_score)
+    decider = "score"
+    if sufficient is None:
+        # Use structured output to judge if RAG results are sufficient
+        judge_messages = get_prompt("rag_judge").render(question=query, retrieved="\n\n".join(chunks))
+        verdict: RagJudgeModel = get_judge_llm().invoke(judge_messages)
+        sufficient, decider = verdict.sufficient, "judge"
+
+    outcome = "answer" if sufficient else "web"
+    RAG_SUFFICIENCY.labels(decider=decider, outcome=outcome).inc()
+    if top_score is not None:
+        RAG_TOP_SCORE.labels(decider=decider, outcome=outcome).observe(top_score)
+    logging.info(f"Session ID: {state.get('session_id')}, RAG sufficiency: {outcome} by {decider} "
+                 f"({reason}, top score: {top_score if top_score is None else round(top_score, 4)}, "
+                 f"chunks: {len(chunks)})")
 
     return {
         **state,
         "rag": chunks,
-        "route": "answer" if verdict.sufficient else "web"
+        "route": outcome,
+        "reuse": _remember(state, "rag", query, chunks=chunks, sufficient=sufficient),
     }
 
+
+def _score_gate(chunks, top_score):
+    """(sufficient, reason) from retrieval alone; sufficient is None when the judge must decide."""
+    conf = Config()
+    if not conf.rag_gate_enabled:
+        return None, "gate disabled"
+    if not chunks:
+        return False, "no hits"
+    if top_score is None:
+        # Lexical-only matches (the lexical fast path) have no comparable score.
+        return None, "no vector score"
+    if top_score >= conf.rag_gate_answer_score:
+        return True, "high score"
+    if top_score < conf.rag_gate_web_score:
+        return False, "low score"
+    return None, "ambiguous score"
+
 # Node 3: Web search
 def web_node(state: AgentState) -> AgentState:
     query = next((m.content for m in reversed(state["messages"])
@@ -75,8 +100,29 @@ def analyst_node(state: AgentState) -> AgentState:
     query = next((m.content for m in reversed(state["messages"])
                   if isinstance(m, HumanMessage)), "")
 
+    previous = _reusable(state, "analyst", query)
+    if previous:
+        return {**state, "analyst": previous["output"], "route": "answer"}
+
     output = sql_analyst_tool.invoke({"user_question": query})
-    return {**state, "analyst": output, "route": "answer"}
+    reuse = state.get("reuse") or {}
+    # Failed runs are not worth reusing.
+    if output != "Failed":
+        reuse = _remember(state, "analyst", query, output=output)
+    return {**state, "analyst": output, "route": "answer", "reuse": reuse}
+
+
+def _reusable(state: AgentState, node: str, query: str):
+    """The node's checkpointed result when it was produced for the same question within the reuse TTL."""
+    entry = (state.get("reuse") or {}).get(node)
+    hit = bool(entry) and entry["query"] == normalize_key(query) \
+        and time.time() - entry["at"] < Config().agent_context_reuse_ttl
+    record_cache_lookup(f"checkpoint_{node}", hit)
+    return entry if hit else None
+
+
+def _remember(state: AgentState, node: str, query: str, **result):
+    return {**(state.get("reuse") or {}), node: {"query": normalize_key(query), "at": time.time(), **result}}
 
 
 # Node 5: Final answer
@@ -84,36 +130,48 @@ def answer_node(state: AgentState) -> AgentState:
     user_q = next((m.content for m in reversed(state["messages"])
                    if isinstance(m, HumanMessage)), "")
     
-    ctx_parts = []
-
-    if state.get("rag"):
-        ctx_parts.append("Knowledge Base Information:\n" + state["rag"])
-    if state.get("web"):
-        ctx_parts.append("Web Search Results:\n" + state["web"])
+    conf = Config()
+    # Compact typed table for SQL results, deduplicated chunks trimmed to a token budget.
+    context = build_answer_context(state, conf.answer_context_token_budget, conf.answer_max_table_rows)
 
-    context = "\n\n".join(ctx_parts) if ctx_parts else "No external context available."
-
-    if state.get("analyst"):
-        context = "Analyst Results:\n" + str(state["analyst"])
-
-    prompt = f"""Please answer the user's question using the provided context.
-
-                Question: {user_q}
-
-                Context:
-                {context}
-
-                Provide a helpful, accurate, and concise response based on the available information."""
-    
-    messages = state["messages"] + [HumanMessage(content=prompt)]
-    ans = answer_llm.invoke(messages).content
+    history = trim_history(_previous_turns(state["messages"]), conf.answer_history_token_budget)
+    messages = get_prompt("answer").render(chat_history=history, context=context, question=user_q)
+    _report_prompt_tokens(state, user_q, messages)
+    ans = get_answer_llm().invoke(messages).content
 
     return {
         **state,
         "messages": state["messages"] + [AIMessage(content=ans)]
     }
-    
 
-    
+
+def _previous_turns(messages):
+    """History before the latest question, which the answer prompt carries itself."""
+    if messages and isinstance(messages[-1], HumanMessage):
+        return messages[:-1]
+    return messages
 
 
+def _report_prompt_tokens(state: AgentState, user_q: str, messages) -> None:
+    """Log and export the packed prompt size next to what the unpacked prompt would have cost."""
+    packed = count_message_tokens(messages)
+
+    rag = state.get("rag") or []
+    unpacked_parts = []
+    if rag:
+        unpacked_parts.append("Knowledge Base Information:\n" + "\n\n".join(rag if isinstance(rag, list) else [rag]))
+    if state.get("web"):
+        unpacked_parts.append("Web Search Results:\n" + state["web"])
+    unpacked_context = "\n\n".join(unpacked_parts)
+    analyst = state.get("analyst")
+    if analyst:
+        # Previously the raw repr of the result tuples was sent.
+        unpacked_context = "Analyst Results:\n" + str(analyst.get("rows") if isinstance(analyst, dict) else analyst)
+    unpacked = count_message_tokens(get_prompt("answer").template.format_messages(
+        chat_history=_previous_turns(state["messages"]), context=unpacked_context, question=user_q))
+
+    ANSWER_PROMPT_TOKENS.labels(variant="packed").observe(packed)
+    ANSWER_PROMPT_TOKENS.labels(variant="unpacked").observe(unpacked)
+    saved = 100 * (1 - packed / unpacked) if unpacked else 0
+    logging.info(f"Session ID: {state.get('session_id')}, answer prompt tokens: "
+                 f"packed={packed} unpacked={unpacked} saved={saved:.0f}%")
@@ -1,6 +1,8 @@
+import uuid
 import psycopg2
 from psycopg2 import sql
 from app.api.v1.utils.config import Config
+from app.api.v1.utils.metrics import SQL_LATENCY
 
 
 class PostgresDBManager:
@@ -38,12 +40,92 @@ class PostgresDBManager:
             self.connect()
         cursor = self.connection.cursor()
         try:
-            cursor.execute(query, params or [])
-            rows = cursor.fetchall()
+            with SQL_LATENCY.labels(database="postgres", operation="read").time():
+                cursor.execute(query, params or [])
+                rows = cursor.fetchall()
             return rows
         finally:
             cursor.close()
 
+    def read_data_with_columns(self, query, params=None, max_rows=None):
+        """
+        Execute SELECT query and return a dict with the column names and rows.
+        With `max_rows`, at most that many rows are fetched from a server-side cursor and
+        `truncated` tells whether the result had more.
+        """
+        if max_rows is not None:
+            batches = self.stream_query(query, params, batch_size=max_rows + 1)
+            try:
+                columns, rows = next(batches)
+            finally:
+                batches.close()
+            return {"columns": [name for name, _ in columns], "rows": rows[:max_rows],
+                    "truncated": len(rows) > max_rows}
+
+        if not self.connection:
+            self.connect()
+        cursor = self.connection.cursor()
+        try:
+            with SQL_LATENCY.labels(database="postgres", operation="read").time():
+                cursor.execute(query, params or [])
+                rows = cursor.fetchall()
+            columns = [column.name for column in cursor.description]
+            return {"columns": columns, "rows": rows}
+        except Exception as e:
+            self.connection.rollback()
+            raise Exception(f"Query execution failed: {e}")
+        finally:
+            cursor.close()
+
+    # ---------- Stream ----------
+    def stream_query(self, query, params=None, batch_size=None):
+        """
+        Execute a SELECT on a named (server-side) cursor and yield `(columns, rows)` batches of
+        at most `batch_size` rows, so the full result is never held in memory. `columns` is a
+        list of (name, type oid). The first batch is always yielded, even when empty.
+        """
+        if not self.connection:
+            self.connect()
+        batch_size = batch_size or self.conf.sql_stream_batch_size
+        cursor = self.connection.cursor(name=f"stream_{uuid.uuid4().hex}")
+        cursor.itersize = batch_size
+        try:
+            with SQL_LATENCY.labels(database="postgres", operation="stream_open").time():
+                cursor.execute(query, params or [])
+                rows = cursor.fetchmany(batch_size)
+            columns = [(column.name, column.type_code) for column in cursor.description]
+            yield columns, rows
+            while len(rows) == batch_size:
+                rows = cursor.fetchmany(batch_size)
+                if rows:
+                    yield columns, rows
+        except psycopg2.Error as e:
+            raise Exception(f"Query execution failed: {e}")
+        finally:
+            try:
+                cursor.close()
+            except psycopg2.Error:
+                pass
+            # Ends the read transaction that holds the cursor open (also after errors).
+            self.connection.rollback()
+
+    def stream_batches(self, query, params=None, batch_size=None, output="rows"):
+        """
+        `stream_query` with columnar batches: `output="numpy"` yields {column: ndarray} dicts,
+        `output="arrow"` yields pyarrow RecordBatches (requires pyarrow).
+        """
+        from app.api.v1.utils.columnar import arrow_schema, rows_to_arrow, rows_to_numpy
+
+        schema = None
+        for columns, rows in self.stream_query(query, params, batch_size):
+            if output == "numpy":
+                yield rows_to_numpy(columns, rows)
+            elif output == "arrow":
+                schema = schema or arrow_schema(columns)
+                yield rows_to_arrow(columns, rows, schema)
+            else:
+                yield columns, rows
+
     # ---------- Internal Execute ----------
     def _execute_query(self, query, params=None):
         """
@@ -55,15 +137,16 @@ class PostgresDBManager:
 
         cursor = self.connection.cursor()
         try:
-            cursor.execute(query, params or [])
+            with SQL_LATENCY.labels(database="postgres", operation="execute").time():
+                cursor.execute(query, params or [])
 
-            # If query starts with SELECT, fetch results
-            if cursor.description is not None:  
-                rows = cursor.fetchall()
-                return rows
-            else:
-                self.connection.commit()
-                return None
+                # If query starts with SELECT, fetch results
+                if cursor.description is not None:  
+                    rows = cursor.fetchall()
+                    return rows
+                else:
+                    self.connection.commit()
+                    return None
         except Exception as e:
             self.connection.rollback()
             raise Exception(f"Query execution failed: {e}")
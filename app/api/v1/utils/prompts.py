@@ -0,0 +1,203 @@
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.prompt_values import PromptValue
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from app.api.v1.utils.config import Config
+from app.api.v1.utils.metrics import PROMPT_TOKENS
+from app.api.v1.utils.tokens import count_message_tokens, count_tokens
+
+
+class Prompt:
+    """
+    A precompiled chat prompt laid out for provider prefix caching: the static `system` text
+    goes first and is sent verbatim (never templated, so it may contain braces), then the
+    optional chat history, and the variable `human` template last. Requests sharing a prompt
+    therefore share the longest possible identical prefix.
+    """
+
+    def __init__(self, name: str, system: str, human: str, history: bool = False):
+        self.name = name
+        self.system = system
+        self.human = human
+        self.history = history
+        messages = [SystemMessage(content=system)]
+        if history:
+            messages.append(MessagesPlaceholder(variable_name="chat_history"))
+        messages.append(("human", human))
+        self.template = ChatPromptTemplate.from_messages(messages)
+        # Counted on first use, so importing the registry does not load the tokenizer.
+        self._static_tokens = None
+
+    @property
+    def static_tokens(self) -> int:
+        if self._static_tokens is None:
+            self._static_tokens = count_tokens(self.system)
+        return self._static_tokens
+
+    def render(self, chat_history: Optional[Sequence[BaseMessage]] = None, **values) -> List[BaseMessage]:
+        if self.history:
+            values["chat_history"] = list(chat_history or [])
+        messages = self.template.format_messages(**values)
+        self.observe_messages(messages)
+        return messages
+
+    def observe_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """Record the static, history and variable token counts of a rendered prompt."""
+        PROMPT_TOKENS.labels(prompt=self.name, part="static").observe(self.static_tokens)
+        if self.history:
+            PROMPT_TOKENS.labels(prompt=self.name, part="history").observe(count_message_tokens(messages[1:-1]))
+        PROMPT_TOKENS.labels(prompt=self.name, part="variable").observe(count_message_tokens(messages[-1:]))
+
+    def observe(self, prompt_value: PromptValue) -> PromptValue:
+        """Pass-through step for LCEL chains (`template | observe | llm`)."""
+        self.observe_messages(prompt_value.to_messages())
+        return prompt_value
+
+
+PROMPTS: Dict[str, Prompt] = {}
+
+
+def register(prompt: Prompt) -> Prompt:
+    PROMPTS[prompt.name] = prompt
+    return prompt
+
+
+def get_prompt(name: str) -> Prompt:
+    return PROMPTS[name]
+
+
+# ── Contextualise ────────────────────────────────────────────────────
+register(Prompt(
+    "contextualise",
+    system=(
+        "Given a chat history and the latest user question "
+        "which might reference context in the chat history, "
+        "formulate a standalone question which can be understood "
+        "without the chat history. Do NOT answer the question, "
+        "just reformulate it if needed and otherwise return it as is. "
+        "⟹ Return **only** the reformulated question (no explanations, no answers)."
+    ),
+    human="{input}",
+    history=True,
+))
+
+# ── Router ───────────────────────────────────────────────────────────
+ROUTING_RULES = (
+    "Routing rules:\n"
+    "- Use 'end' if the message is:\n"
+    "  • A greeting, farewell, or small talk (e.g., 'hi', 'hello', 'how are you', 'thanks').\n"
+    "  • A repeated question already answered in the recent chat history. Include a short friendly reply.\n\n"
+    "- Use 'analyst' if the question relates to:\n"
+    "  • Sales data, sales metrics, revenue, stores, products, customers, or any business data analysis.\n"
+    "  • Mentions words like 'sales_data', 'revenue', 'profit', 'region performance', 'trend analysis', or 'KPIs'.\n"
+    "  • Analytical or explanatory requests (e.g., 'explain', 'analyze', 'summarize', 'compare', 'show insights').\n\n"
+    "- Use 'rag' if the query needs factual or domain-specific information that is not directly about sales data\n"
+    "  and not already answered — meaning a knowledge base lookup or document search is needed.\n\n"
+    "- Use 'answer' if you can confidently respond directly using general knowledge, reasoning, or context,\n"
+    "  without needing external data or retrieval.\n\n"
+)
+
+register(Prompt(
+    "router",
+    system=(
+        "You are a smart routing controller that decides which node should handle a user's query.\n"
+        "Classify each query into one of the following categories and return both the 'route' and an optional 'reply' when required.\n\n"
+        + ROUTING_RULES
+    ),
+    human="{question}",
+    history=True,
+))
+
+# ── Contextualise and route in one call (AGENT_COMBINED_ROUTING) ─────
+register(Prompt(
+    "contextualise_route",
+    system=(
+        "You prepare the latest user message of a chat for an assistant, in two steps.\n\n"
+        "1. 'standalone_question': the latest message might reference context in the chat history; "
+        "rewrite it as a standalone question which can be understood without the chat history. "
+        "Do NOT answer it, just reformulate it if needed and otherwise return it as is.\n\n"
+        "2. 'route': decide which node should handle the standalone question, and fill 'reply' "
+        "only when the route is 'end'.\n\n"
+        + ROUTING_RULES
+    ),
+    human="{input}",
+    history=True,
+))
+
+# ── RAG judge ────────────────────────────────────────────────────────
+register(Prompt(
+    "rag_judge",
+    system=(
+        "You are a judge evaluating if the retrieved information is sufficient "
+        "to answer the user's question. Consider both relevance and completeness."
+    ),
+    human="Retrieved info: {retrieved}\n\nQuestion: {question}\n\nIs this sufficient to answer the question?",
+))
+
+# ── Answer ───────────────────────────────────────────────────────────
+register(Prompt(
+    "answer",
+    system=(
+        "You are a helpful assistant. Answer the user's latest question using the context provided "
+        "with it and the conversation so far. Provide a helpful, accurate, and concise response based "
+        "on the available information."
+    ),
+    human="Context:\n{context}\n\nQuestion: {question}",
+    history=True,
+))
+
+# ── Document QA (/chatbot-rag) ───────────────────────────────────────
+register(Prompt(
+    "document_qa",
+    system="You are given context from the user's documents. Using this context, answer the user's question.",
+    human="Context from the document:\n{context}\n\nQuestion: \"{question}\"\n\nAnswer:",
+))
+
+# ── SQL analyst ──────────────────────────────────────────────────────
+ANALYST_SYSTEM = """You are a SQL assistant. Context:
+- DB: Postgres. Read-only access.
+- Allowed statements: SELECT only.
+- Schema (schema -> table -> columns):
+    Schema: bronze
+    Table: sales_data
+        - date (DATE): Transaction date of the sale
+        - store_id (INTEGER): Unique store identifier
+        - store_region (VARCHAR(50)): Region where the store is located (e.g., North, South)
+        - sku_id (INTEGER): Unique product SKU identifier
+        - category (VARCHAR(50)): Product category (e.g., Beverages, Snacks)
+        - units_sold (INTEGER): Number of units sold on that date
+        - revenue (NUMERIC): Total sales amount generated
+        - promo_flag (BOOLEAN): Whether the sale occurred under a promotion
+        - promo_type (VARCHAR(50), nullable): Type of promotion (e.g., Discount, BOGO)
+        - price (NUMERIC): Unit price of the product during the sale
+        - inventory_level (INTEGER): Closing inventory level at the end of the day
+        - store_size (VARCHAR(20)): Store size category (e.g., Small, Medium, Large)
+        - holiday_flag (BOOLEAN): Indicates if the date was a holiday (1 = Yes, 0 = No)
+
+Constraints:
+- Use only existing columns above.
+- Use **PostgreSQL parameter placeholders** in the form `%s`, etc.
+- Ensure syntactically correct, efficient, and readable SQL.
+- Return JSON with keys: {"sql": "<SELECT ...>", "explanation": "...", "params": ["value1", "value2", ...]}
+- {row_limit}
+
+Produce the simplest, efficient SQL that answers the question."""
+
+# The row-limit rule differs between the answer path and full exports; it comes after the
+# schema, so both variants still share the long cached prefix. The answer path's limit is the
+# number of rows the analyst tool fetches.
+ANALYST_ROW_LIMIT = Config().analyst_max_result_rows
+register(Prompt(
+    "analyst",
+    system=ANALYST_SYSTEM.replace("{row_limit}", f"Max rows: {ANALYST_ROW_LIMIT}. "
+                                                 f"Add LIMIT {ANALYST_ROW_LIMIT} if necessary."),
+    human="User question:\n\"{question}\"{feedback}",
+))
+register(Prompt(
+    "analyst_export",
+    system=ANALYST_SYSTEM.replace("{row_limit}", "No row limit: the full result is exported to a file. "
+                                                 "Do not add a LIMIT unless the question asks for a specific number of rows."),
+    human="User question:\n\"{question}\"{feedback}",
+))
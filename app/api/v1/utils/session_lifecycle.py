@@ -0,0 +1,178 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.api.v1.utils.azure_sql_manager import AzureSQLManager
+from app.api.v1.utils.checkpointer import delete_checkpoints
+from app.api.v1.utils.config import Config
+from app.api.v1.utils.metrics import SESSION_GC_RECLAIMED, SESSION_GC_SWEEP
+from app.api.v1.utils.startup import lazy_client
+from app.api.v1.utils.vector_db_manager import get_vector_db_manager
+
+RESOURCES = ("sessions", "vector_chunks", "files", "bytes", "history_rows")
+# Application lock electing the one worker that sweeps at a time.
+SWEEP_LOCK = "session gc sweep"
+
+
+def _tree_size(path: str):
+    """(files, bytes) below a directory."""
+    files, size = 0, 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+                files += 1
+            except OSError:
+                pass
+    return files, size
+
+
+class SessionLifecycleManager:
+    """
+    Releases everything a chat session leaves behind: its chunks in the shared search index
+    (and its BM25 index), its uploaded files, its agent checkpoints, and its SQL rows, whose
+    chat history is archived first unless the session is deleted outright.
+
+    The SQL rows go last, so a session whose chunks or files could not be removed is still
+    found as expired, and retried, by the next sweep.
+    """
+
+    def __init__(self, conf: Config):
+        self.conf = conf
+        self.last_sweep: Dict[str, float] = {}
+
+    def _remove_files(self, session_id: str):
+        # Session ids come from clients; never let one address a path outside the upload dir.
+        if not session_id or os.path.basename(session_id) != session_id or session_id in (".", ".."):
+            return 0, 0
+        path = os.path.join(self.conf.upload_dir, session_id)
+        if not os.path.isdir(path):
+            return 0, 0
+        files, size = _tree_size(path)
+        shutil.rmtree(path, ignore_errors=True)
+        return files, size
+
+    def release_session_data(self, session_id: str) -> Dict[str, int]:
+        """Delete a session's vector chunks, uploaded files and checkpoints (not its SQL rows)."""
+        chunks = get_vector_db_manager().delete_session_chunks(session_id)
+        files, size = self._remove_files(session_id)
+        delete_checkpoints(session_id)
+        return {"vector_chunks": chunks, "files": files, "bytes": size}
+
+    def purge(self, session_ids: List[str], archive: bool, azure_db: Optional[AzureSQLManager] = None) -> Dict[str, int]:
+        """Release and then remove the given sessions; returns what was reclaimed."""
+        stats = dict.fromkeys(RESOURCES, 0)
+        released = []
+        for session_id in session_ids:
+            try:
+                for resource, amount in self.release_session_data(session_id).items():
+                    stats[resource] += amount
+                released.append(session_id)
+            except Exception as e:
+                logging.error(f"Releasing data of session {session_id} failed: {str(e)}")
+
+        owns_db = azure_db is None
+        azure_db = azure_db or AzureSQLManager(self.conf)
+        try:
+            stats["history_rows"] = azure_db.purge_sessions(released, archive=archive)
+        finally:
+            if owns_db:
+                azure_db.disconnect()
+        stats["sessions"] = len(released)
+        for resource, amount in stats.items():
+            SESSION_GC_RECLAIMED.labels(resource=resource).inc(amount)
+        return stats
+
+    def sweep(self) -> Dict[str, float]:
+        """
+        Purge sessions idle for longer than the TTL, in batches, and return the totals. Only one
+        worker sweeps at a time: the others find the sweep lock taken and skip their turn. Nothing
+        is swept before the session schema migration has created the tables it relies on.
+        """
+        start = time.perf_counter()
+        totals = dict.fromkeys(RESOURCES, 0)
+        azure_db = AzureSQLManager(self.conf)
+        locked = False
+        try:
+            if not azure_db.session_schema_applied():
+                logging.warning("Session GC skipped: the session schema migration has not been applied.")
+                return self._skipped("schema not applied")
+            locked = azure_db.try_app_lock(SWEEP_LOCK)
+            if not locked:
+                logging.info("Session GC skipped: another worker is sweeping.")
+                return self._skipped("another worker is sweeping")
+            seen = set()
+            while True:
+                expired = azure_db.get_expired_sessions(self.conf.session_ttl_seconds, self.conf.session_gc_batch_size)
+                if not expired or seen.intersection(expired):
+                    break
+                seen.update(expired)
+                stats = self.purge(expired, self.conf.session_archive_history, azure_db)
+                for resource, amount in stats.items():
+                    totals[resource] += amount
+                # Sessions that could not be released stay expired; leave them to the next sweep.
+                if stats["sessions"] < len(expired):
+                    break
+        finally:
+            try:
+                if locked:
+                    azure_db.release_app_lock(SWEEP_LOCK)
+            finally:
+                azure_db.disconnect()
+            seconds = time.perf_counter() - start
+            SESSION_GC_SWEEP.observe(seconds)
+        self.last_sweep = {**totals, "seconds": round(seconds, 3), "finished_at": time.time()}
+        logging.info(f"Session GC sweep: {self.last_sweep}")
+        return self.last_sweep
+
+    def _skipped(self, reason: str) -> Dict[str, float]:
+        self.last_sweep = {"skipped": reason, "finished_at": time.time()}
+        return self.last_sweep
+
+
+class SessionSweeper:
+    """Runs `SessionLifecycleManager.sweep` every `interval` seconds on a daemon thread."""
+
+    def __init__(self, manager: SessionLifecycleManager, interval: float):
+        self.manager = manager
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="session-gc", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        # Every worker wakes up; the sweep lock lets one of them sweep at a time.
+        while not self._stop.wait(self.interval):
+            try:
+                self.manager.sweep()
+            except Exception as e:
+                logging.error(f"Session GC sweep failed: {str(e)}")
+
+
+@lazy_client("session_lifecycle")
+def get_session_lifecycle() -> SessionLifecycleManager:
+    return SessionLifecycleManager(Config())
+
+
+def start_session_sweeper() -> Optional[SessionSweeper]:
+    """Start the background sweeper unless SESSION_TTL_SECONDS or SESSION_GC_INTERVAL is 0."""
+    conf = Config()
+    if conf.session_ttl_seconds <= 0 or conf.session_gc_interval <= 0:
+        return None
+    sweeper = SessionSweeper(get_session_lifecycle(), conf.session_gc_interval)
+    sweeper.start()
+    return sweeper
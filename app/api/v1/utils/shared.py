@@ -1,5 +1,6 @@
 from app.api.v1.utils.llm_manager import LLMManager
 from app.api.v1.utils.config import Config
+from app.api.v1.utils.startup import lazy_client
 from typing import TypedDict, List, Literal, Dict, Any
 from pydantic import BaseModel, Field
 from langchain_core.messages import BaseMessage
@@ -10,6 +11,11 @@ class RouteDecisionModel(BaseModel):
     route: Literal["rag", "answer", "analyst" ,"end"]
     reply: str | None = Field(None, description="Filled only when route == 'end'")
 
+class ContextualRouteModel(BaseModel):
+    standalone_question: str = Field(description="The latest question rewritten to stand on its own")
+    route: Literal["rag", "answer", "analyst", "end"]
+    reply: str | None = Field(None, description="Filled only when route == 'end'")
+
 class RagJudgeModel(BaseModel):
     sufficient: bool
 
@@ -26,24 +32,37 @@ class AnalystModel(BaseModel):
 class AgentState(TypedDict, total=False):
     messages: List[BaseMessage]
     route:    Literal["rag", "answer", "analyst", "end"]
-    rag:      str
+    rag:      List[str]
     web:      str
-    analyst:  str
+    analyst:  Dict[str, Any] | str
     session_id: str
+    # Checkpointed tool results by node ({"query", "at", ...}) that later turns may reuse.
+    reuse:    Dict[str, Dict[str, Any]]
+    # {"route", "reply"} decided together with the stand-alone question; router_node skips its LLM call.
+    preset_route: Dict[str, Any] | None
 
 # ── LLM instances with structured output where needed ───────────────
-router_llm = LLMManager(Config(), temperature=0)\
+# Built on first use so importing the app needs neither credentials nor network access.
+@lazy_client("router_llm")
+def get_router_llm():
+    return LLMManager(Config(), temperature=0, role="router")\
                 .connect()\
                 .with_structured_output(RouteDecisionModel)
 
-judge_llm  = LLMManager(Config(), temperature=0)\
+@lazy_client("judge_llm")
+def get_judge_llm():
+    return LLMManager(Config(), temperature=0, role="judge")\
                 .connect()\
                 .with_structured_output(RagJudgeModel)
 
-answer_llm = LLMManager(Config(), temperature=0.7)\
+@lazy_client("answer_llm")
+def get_answer_llm():
+    return LLMManager(Config(), temperature=0.7, role="answer")\
                 .connect()
 
-analyst_llm = LLMManager(Config(), temperature=0)\
+@lazy_client("analyst_llm")
+def get_analyst_llm():
+    return LLMManager(Config(), temperature=0, role="analyst")\
                 .connect()\
                 .with_structured_output(AnalystModel, method="function_calling")
 
@@ -0,0 +1,69 @@
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from app.api.v1.utils.metrics import SINGLE_FLIGHT_COALESCED
+
+
+def normalize_key(text: str) -> str:
+    """Case- and whitespace-insensitive form of a tool input, used as the coalescing key."""
+    return " ".join(str(text).lower().split())
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller executes the function,
+    callers arriving while it is in flight wait and receive the same result (or exception).
+    Nothing is cached once the call completes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            SINGLE_FLIGHT_COALESCED.labels(group=self.name).inc()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def wrap(self, fn: Callable, key_fn: Callable[..., Hashable]) -> Callable:
+        """Return `fn` guarded by this group, with the key computed from the call arguments."""
+
+        def wrapper(*args, **kwargs):
+            return self.do(key_fn(*args, **kwargs), fn, *args, **kwargs)
+
+        return wrapper
+
+
+analyst_flight = SingleFlight("sql_analyst")
+retrieval_flight = SingleFlight("rag_search")
+web_flight = SingleFlight("web_search")
+embedding_flight = SingleFlight("embedding")
@@ -0,0 +1,329 @@
+import difflib
+import json
+import logging
+import math
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.api.v1.utils.lexical_index import STOPWORDS, file_lock, write_json_atomic
+
+# Words that may differ between two phrasings of the same question without changing its SQL.
+FILLER_WORDS = STOPWORDS | frozenset(
+    "all any could display each find get give has have list need per please see show total "
+    "want would ? . , ! : ;".split()
+)
+
+WORD_RE = re.compile(r"\w+(?:[-'./]\w+)*|[^\w\s]")
+SQL_STRING_RE = re.compile(r"'((?:[^']|'')*)'")
+
+
+def words(text: str) -> List[str]:
+    return WORD_RE.findall(text)
+
+
+def _find(tokens: List[str], value: List[str]) -> int:
+    """Start of the first case-insensitive occurrence of `value` in `tokens`, or -1."""
+    lowered = [t.lower() for t in tokens]
+    needle = [v.lower() for v in value]
+    for start in range(len(lowered) - len(needle) + 1):
+        if lowered[start:start + len(needle)] == needle:
+            return start
+    return -1
+
+
+def _text(value: Any) -> str:
+    """A parameter value as it is written in a question."""
+    return str(value).lower() if isinstance(value, bool) else str(value)
+
+
+def _slot(index: int) -> str:
+    return f"<slot{index}>"
+
+
+def _casing(example: str, text: str) -> str:
+    """Apply the letter case of the learned parameter value to a newly extracted one."""
+    if example.isupper():
+        return text.upper()
+    if example.islower():
+        return text.lower()
+    if example.istitle():
+        return text.title()
+    return text
+
+
+def _coerce(example: Any, text: str) -> Any:
+    """Cast extracted text to the type of the learned parameter value; raises ValueError."""
+    if isinstance(example, bool):
+        lowered = text.lower()
+        if lowered not in ("true", "false"):
+            raise ValueError(text)
+        return lowered == "true"
+    if isinstance(example, int):
+        return int(text)
+    if isinstance(example, float):
+        return float(text)
+    return _casing(example, text)
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SqlTemplate:
+    """
+    A parameterised analyst query learned from executed (question, sql, params) triples.
+    `slots[i]` is the slot of the question that fills `params[i]`; every example question is
+    stored with its slot values masked out, together with its embedding.
+    """
+
+    def __init__(self, prompt: str, sql: str, params: List[Any], slots: List[int], explanation: str,
+                 examples: Optional[List[Dict[str, Any]]] = None, support: int = 0,
+                 hits: int = 0, failures: int = 0):
+        self.prompt = prompt
+        self.sql = sql
+        self.params = params
+        self.slots = slots
+        self.explanation = explanation
+        self.examples = examples or []
+        self.support = support
+        self.hits = hits
+        self.failures = failures
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return self.prompt, " ".join(self.sql.split()).lower()
+
+    def extract(self, masked: List[str], question: List[str]) -> Optional[List[Any]]:
+        """
+        Align the question with one masked example and read the slot values off the replaced
+        spans. Returns the query parameters, or None when the question differs from the example
+        in anything but slot values and filler words (so "this month" never matches "last month").
+
+        A slot value must have as many words as the learned value, so the span cannot swallow
+        neighbouring words ("North in 2023") or several values ("North and South").
+        """
+        lengths = {slot: len(words(_text(example))) for example, slot in zip(self.params, self.slots)}
+        values: Dict[int, str] = {}
+        matcher = difflib.SequenceMatcher(a=[t.lower() for t in masked], b=[t.lower() for t in question],
+                                          autojunk=False)
+        for op, a1, a2, b1, b2 in matcher.get_opcodes():
+            if op == "equal":
+                continue
+            span = masked[a1:a2]
+            slot_tokens = [t for t in span if t.startswith("<slot") and t.endswith(">")]
+            if slot_tokens:
+                if op != "replace" or len(span) != 1:
+                    return None
+                slot = int(span[0][5:-1])
+                # Filler words next to the value fall into the same span ("2020 please").
+                while b2 - b1 > lengths.get(slot, 0) and question[b1].lower() in FILLER_WORDS:
+                    b1 += 1
+                while b2 - b1 > lengths.get(slot, 0) and question[b2 - 1].lower() in FILLER_WORDS:
+                    b2 -= 1
+                if b2 - b1 != lengths.get(slot):
+                    return None
+                value = " ".join(question[b1:b2])
+                if values.setdefault(slot, value) != value:
+                    return None
+                continue
+            changed = span + question[b1:b2]
+            if any(t.lower() not in FILLER_WORDS for t in changed):
+                return None
+        if len(values) != len(set(self.slots)):
+            return None
+        try:
+            return [_coerce(example, values[slot]) for example, slot in zip(self.params, self.slots)]
+        except (KeyError, ValueError):
+            return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"prompt": self.prompt, "sql": self.sql, "params": self.params, "slots": self.slots,
+                "explanation": self.explanation, "examples": self.examples, "support": self.support,
+                "hits": self.hits, "failures": self.failures}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SqlTemplate":
+        return cls(**data)
+
+
+class SqlTemplateLibrary:
+    """
+    Recurring analyst question shapes and the SQL that answered them, persisted as JSON.
+
+    Every query the analyst LLM writes and that executes successfully is offered to `learn`.
+    It becomes a template only when each parameter value occurs verbatim in the question (so it
+    can be re-extracted) and no other literal of the question was inlined into the SQL. A
+    template is used once the LLM produced the same SQL `min_support` times, and retired
+    after `max_failures` failed executions. `match` finds candidates by embedding similarity
+    and extracts the slot values by aligning the question with the candidates' examples.
+
+    Every worker process keeps its own copy. Changes are applied to the persisted file under
+    an exclusive lock on `<path>.lock` (read, merge, write to a unique temporary file, rename),
+    so workers never overwrite each other's templates, and `match` reloads the file once
+    another worker rewrote it.
+    """
+
+    MAX_EXAMPLES = 5
+
+    def __init__(self, path: str, embed: Callable[[str], List[float]], min_similarity: float = 0.85,
+                 min_support: int = 2, max_failures: int = 3):
+        self.path = path
+        self.embed = embed
+        self.min_similarity = min_similarity
+        self.min_support = min_support
+        self.max_failures = max_failures
+        self._lock = threading.RLock()
+        self.templates: Dict[Tuple[str, str], SqlTemplate] = {}
+        self._version = (0, 0, 0)
+        self._refresh()
+
+    def _file_version(self) -> Tuple[int, int, int]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return 0, 0, 0
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _read(self) -> Tuple[Dict[Tuple[str, str], SqlTemplate], Tuple[int, int, int]]:
+        """The persisted templates and the version of the file they were read from."""
+        templates = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stat = os.fstat(f.fileno())
+                version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                for data in json.load(f):
+                    template = SqlTemplate.from_dict(data)
+                    templates[template.key] = template
+        except FileNotFoundError:
+            return {}, (0, 0, 0)
+        except (OSError, ValueError, TypeError) as e:
+            logging.warning(f"Ignoring unreadable SQL template library {self.path}: {str(e)}")
+            return {}, self._file_version()
+        return templates, version
+
+    def _adopt(self, templates: Dict[Tuple[str, str], SqlTemplate], version: Tuple[int, int, int]):
+        # Hits are counted in memory and only persisted along with other changes.
+        for key, template in templates.items():
+            if key in self.templates:
+                template.hits = max(template.hits, self.templates[key].hits)
+        self.templates = templates
+        self._version = version
+
+    def _refresh(self):
+        """Reload the templates when another worker rewrote the file since it was last read."""
+        if not self.path or self._file_version() == self._version:
+            return
+        with self._lock:
+            self._adopt(*self._read())
+
+    def _modify(self, change: Callable[[], Any]) -> Any:
+        """Apply `change()` to the latest persisted templates and write them back; returns its result."""
+        with self._lock:
+            if not self.path:
+                return change()
+            with file_lock(self.path + ".lock"):
+                self._adopt(*self._read())
+                result = change()
+                write_json_atomic(self.path, [t.to_dict() for t in self.templates.values()])
+                self._version = self._file_version()
+            return result
+
+    def _usable(self, prompt: str) -> List[SqlTemplate]:
+        return [t for t in self.templates.values()
+                if t.prompt == prompt and t.support >= self.min_support and t.failures < self.max_failures]
+
+    def match(self, prompt: str, question: str) -> Optional[Tuple[SqlTemplate, List[Any]]]:
+        """(template, params) for the question, or None. No embedding is computed while no
+        template is usable yet."""
+        self._refresh()
+        with self._lock:
+            usable = self._usable(prompt)
+        if not usable:
+            return None
+        vector = self.embed(question)
+        tokens = words(question)
+        candidates = []
+        for template in usable:
+            for example in template.examples:
+                similarity = _cosine(vector, example["vector"])
+                if similarity >= self.min_similarity:
+                    candidates.append((similarity, template, example))
+        for _, template, example in sorted(candidates, key=lambda c: c[0], reverse=True):
+            params = template.extract(example["masked"], tokens)
+            if params is not None:
+                return template, params
+        return None
+
+    @staticmethod
+    def mask(question: str, sql: str, params: List[Any]) -> Optional[Tuple[List[str], List[int]]]:
+        """(masked question tokens, slot per parameter), or None when the query is not reusable."""
+        tokens = words(question)
+        slots, slot_values = [], []
+        for value in params:
+            if value is None or isinstance(value, (list, dict)):
+                return None
+            text = _text(value)
+            if text in slot_values:
+                slots.append(slot_values.index(text))
+                continue
+            value_tokens = words(text)
+            start = _find(tokens, value_tokens) if value_tokens else -1
+            if start < 0:
+                return None
+            slot = len(slot_values)
+            slot_values.append(text)
+            tokens[start:start + len(value_tokens)] = [_slot(slot)]
+            slots.append(slot)
+        # A number or string from the question that was written into the SQL instead of being
+        # passed as a parameter would be replayed unchanged for every other question.
+        if any(any(c.isdigit() for c in t) for t in tokens if not t.startswith("<slot")):
+            return None
+        for literal in SQL_STRING_RE.findall(sql):
+            literal_tokens = words(literal.replace("''", "'"))
+            if literal_tokens and _find(tokens, literal_tokens) >= 0:
+                return None
+        return tokens, slots
+
+    def learn(self, prompt: str, question: str, sql: str, params: Optional[List[Any]], explanation: str) -> bool:
+        """Record a successfully executed query; returns True when it was added to a template."""
+        params = list(params or [])
+        masked = self.mask(question, sql, params)
+        if masked is None:
+            return False
+        tokens, slots = masked
+        key = SqlTemplate(prompt, sql, params, slots, explanation).key
+        with self._lock:
+            existing = self.templates.get(key)
+            if existing is not None and existing.slots != slots:
+                return False
+            known = existing is not None and any(e["masked"] == tokens for e in existing.examples)
+        # Another phrasing of the shape is kept as an extra example to match against.
+        vector = None if known else self.embed(question)
+
+        def add() -> bool:
+            template = self.templates.setdefault(key, SqlTemplate(prompt, sql, params, slots, explanation))
+            if template.slots != slots:
+                return False
+            if vector is not None and not any(e["masked"] == tokens for e in template.examples):
+                template.examples = (template.examples + [{"masked": tokens, "vector": vector}])[-self.MAX_EXAMPLES:]
+            template.support += 1
+            return True
+
+        return self._modify(add)
+
+    def record(self, template: SqlTemplate, success: bool):
+        if success:
+            with self._lock:
+                self.templates.get(template.key, template).hits += 1
+            return
+
+        def fail():
+            current = self.templates.get(template.key)
+            if current is not None:
+                current.failures += 1
+
+        self._modify(fail)
@@ -0,0 +1,72 @@
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+
+class StartupTimer:
+    """Collects how long each startup phase and each lazily built client took."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        # Imported lazily so this module stays cheap enough to be the first thing main.py loads.
+        from app.api.v1.utils.metrics import STARTUP_SECONDS
+
+        with self._lock:
+            self.phases[name] = seconds
+        STARTUP_SECONDS.labels(phase=name).set(seconds)
+
+    def report(self) -> Dict[str, float]:
+        """Log and return the phase timings plus the total time since the timer was created."""
+        total = time.perf_counter() - self.started
+        self.record("ready", total)
+        with self._lock:
+            phases = dict(self.phases)
+        details = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in phases.items())
+        logging.info(f"Startup report: {details}")
+        return phases
+
+
+startup_timer = StartupTimer()
+
+
+def lazy_client(name: str):
+    """
+    Decorator turning a zero-argument factory into a thread-safe getter that builds the
+    client on first use, caches it, and records the construction time in the startup report.
+    """
+
+    def decorator(factory):
+        lock = threading.Lock()
+        instance = []
+
+        @functools.wraps(factory)
+        def getter():
+            if not instance:
+                with lock:
+                    if not instance:
+                        start = time.perf_counter()
+                        instance.append(factory())
+                        seconds = time.perf_counter() - start
+                        startup_timer.record(f"lazy:{name}", seconds)
+                        logging.info(f"Initialised {name} on first use in {seconds * 1000:.0f}ms")
+            return instance[0]
+
+        getter.cache_clear = instance.clear
+        return getter
+
+    return decorator
@@ -0,0 +1,69 @@
+import logging
+import os
+import threading
+from typing import Iterable
+
+from langchain_core.messages import BaseMessage
+
+_encoding = None
+_encoding_loaded = False
+_lock = threading.Lock()
+
+# Per-message framing overhead used by OpenAI chat models.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def _get_encoding():
+    """
+    Load the tiktoken encoding once. tiktoken downloads its BPE file on first use, so when
+    that is not possible (offline workers) we fall back to a ~4 characters per token estimate.
+    """
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(os.getenv("TOKENIZER_ENCODING", "o200k_base"))
+                except Exception as e:
+                    logging.warning(f"tiktoken unavailable, estimating token counts: {e}")
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: Iterable[BaseMessage]) -> int:
+    return sum(count_tokens(str(m.content)) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+TRUNCATION_MARKER = " …"
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` so it fits in `max_tokens` (marker included), preferring a whitespace boundary."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    # Leave room for the marker, so packed context never exceeds its budget.
+    limit = max_tokens - count_tokens(TRUNCATION_MARKER)
+    if limit <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        cut = text[: limit * 4]
+    else:
+        cut = encoding.decode(encoding.encode(text, disallowed_special=())[:limit])
+    space = cut.rfind(" ")
+    if space > len(cut) * 0.8:
+        cut = cut[:space]
+    return cut.rstrip() + TRUNCATION_MARKER
@@ -1,12 +1,18 @@
-from langchain.chat_models import init_chat_model
-from langchain.schema import SystemMessage, HumanMessage
 from app.api.v1.utils.postgres_sql_manager import PostgresDBManager
-from app.api.v1.utils.vector_db_manager import VectorDBManager
+from app.api.v1.utils.vector_db_manager import get_vector_db_manager
 from app.api.v1.utils.config import Config
-from app.api.v1.utils.shared import analyst_llm
+from app.api.v1.utils.shared import get_analyst_llm, AnalystModel
+from app.api.v1.utils.metrics import SQL_ANALYST_RETRIES, SQL_ANALYST_OUTCOMES, record_cache_lookup
+from app.api.v1.utils.startup import lazy_client
+from app.api.v1.utils.single_flight import analyst_flight, retrieval_flight, web_flight, normalize_key
+from app.api.v1.utils.cache import TTLCache, DiskCache, record_saved_latency
+from app.api.v1.utils.prompts import get_prompt
+from app.api.v1.utils.sql_templates import SqlTemplateLibrary
 from langchain_core.tools import tool
-from langchain_tavily import TavilySearch
 import json
+import logging
+import time
+import traceback
 
 
 @tool
@@ -19,73 +25,114 @@ def sql_analyst_tool(user_question: str):
         This tool uses an LLM to translate user intent into SQL for a predefined Postgres schema.
         It helps users query structured data without needing SQL knowledge.
     """
+    # Concurrent identical questions share one LLM + SQL cycle.
+    return analyst_flight.do(normalize_key(user_question), _run_sql_analyst, user_question)
 
-    BASE_PROMPT = """
-    You are a SQL assistant. Context:
-    - DB: Postgres. Read-only access.
-    - Allowed statements: SELECT only. Max rows: {max_rows}.
-    - Schema (schema -> table -> columns):
-        Schema: bronze
-        Table: sales_data
-            - date (DATE): Transaction date of the sale
-            - store_id (INTEGER): Unique store identifier
-            - store_region (VARCHAR(50)): Region where the store is located (e.g., North, South)
-            - sku_id (INTEGER): Unique product SKU identifier
-            - category (VARCHAR(50)): Product category (e.g., Beverages, Snacks)
-            - units_sold (INTEGER): Number of units sold on that date
-            - revenue (NUMERIC): Total sales amount generated
-            - promo_flag (BOOLEAN): Whether the sale occurred under a promotion
-            - promo_type (VARCHAR(50), nullable): Type of promotion (e.g., Discount, BOGO)
-            - price (NUMERIC): Unit price of the product during the sale
-            - inventory_level (INTEGER): Closing inventory level at the end of the day
-            - store_size (VARCHAR(20)): Store size category (e.g., Small, Medium, Large)
-            - holiday_flag (BOOLEAN): Indicates if the date was a holiday (1 = Yes, 0 = No)
-
-    User question:
-    "{user_question}"
-
-    Constraints:
-    - Use only existing columns above.
-    - Use **PostgreSQL parameter placeholders** in the form `%s`, etc.
-    - Ensure syntactically correct, efficient, and readable SQL.
-    - Add LIMIT {max_rows} if necessary.
-    - Return JSON with keys: {{"sql": "<SELECT ...>", "explanation": "...", "params": ["value1", "value2", ...]}}
-
-    Produce the simplest, efficient SQL that answers the question."""
 
-    db_manager = PostgresDBManager(Config())
-    max_retries = 5
+def _check_select(sql: str):
+    statement = sql.strip().rstrip(";").strip()
+    if not statement.lower().startswith(("select", "with")) or ";" in statement:
+        raise ValueError("Only a single SELECT statement is allowed.")
+
+
+@lazy_client("sql_templates")
+def get_sql_templates():
+    conf = Config()
+    return SqlTemplateLibrary(
+        conf.sql_template_path,
+        # Resolved per call: query embeddings share the vector manager's client and cache.
+        embed=lambda text: get_vector_db_manager().embedding_function(text),
+        min_similarity=conf.sql_template_min_similarity,
+        min_support=conf.sql_template_min_support,
+        max_failures=conf.sql_template_max_failures,
+    )
+
+
+def _run_sql_template(user_question: str, execute, prompt: str, is_empty):
+    """`(execute result, AnalystModel)` from a learned template, or None to generate SQL instead."""
+    if not Config().sql_templates_enabled:
+        return None
+    library = get_sql_templates()
+    try:
+        matched = library.match(prompt, user_question)
+    except Exception as e:
+        logging.warning(f"SQL template lookup failed: {str(e)}")
+        return None
+    if matched is None:
+        record_cache_lookup("sql_template", False)
+        return None
+    template, params = matched
+    try:
+        output = execute(template.sql, params)
+    except Exception as e:
+        logging.warning(f"SQL template failed, generating SQL instead: {str(e)}")
+        library.record(template, success=False)
+        record_cache_lookup("sql_template", False)
+        return None
+    # An empty result may come from a mis-extracted value; let the LLM answer instead.
+    if is_empty(output):
+        logging.info(f"SQL template returned no rows for params {params}, generating SQL instead")
+        record_cache_lookup("sql_template", False)
+        return None
+    record_cache_lookup("sql_template", True)
+    library.record(template, success=True)
+    SQL_ANALYST_OUTCOMES.labels(outcome="template").inc()
+    return output, AnalystModel(sql=template.sql, explanation=template.explanation, params=params)
+
+
+def _learn_sql_template(user_question: str, response, prompt: str):
+    conf = Config()
+    if not (conf.sql_templates_enabled and conf.sql_templates_learn):
+        return
+    try:
+        get_sql_templates().learn(prompt, user_question, response.sql, response.params, response.explanation)
+    except Exception as e:
+        logging.warning(f"Recording SQL template failed: {str(e)}")
+
+
+def run_analyst_with_retries(user_question: str, execute, prompt: str = "analyst", max_retries: int = 5,
+                             is_empty=lambda output: False):
+    """
+    Generate SQL with the analyst LLM and pass it to `execute(sql, params)`, retrying with the
+    error as feedback. `prompt` is the registry prompt: "analyst" (capped rows, for the answer)
+    or "analyst_export". Returns `(execute result, AnalystModel)`; raises the last error when
+    every attempt failed.
+
+    A learned template for a recurring question shape runs first and skips the LLM unless
+    `is_empty(result)` says it found nothing; queries the LLM writes successfully are offered
+    to the template library.
+    """
+    templated = _run_sql_template(user_question, execute, prompt, is_empty)
+    if templated is not None:
+        return templated
+
     last_error = None
-    query_details = None
-    sql = None
-    explanation = None
-    params = None
 
     for attempt in range(1, max_retries + 1):
         try:
-            # Build prompt (if retry, include error context)
+            # Build prompt (if retry, include error context after the question)
+            feedback = ""
             if last_error:
-                prompt = (
-                    BASE_PROMPT
-                    + f"\nThe previous SQL failed with error:\n{last_error}\n"
-                      "Please fix the SQL and regenerate a valid one."
+                feedback = (
+                    f"\n\nThe previous SQL failed with error:\n{last_error}\n"
+                    "Please fix the SQL and regenerate a valid one."
                 )
-            else:
-                prompt = BASE_PROMPT
+            messages = get_prompt(prompt).render(question=user_question, feedback=feedback)
 
             # Get LLM response
-            response = analyst_llm.invoke(prompt.format(max_rows=100, user_question=user_question))
+            response = get_analyst_llm().invoke(messages)
             # Parse LLM response safely
             try:
                 sql = response.sql
-                explanation = response.explanation
                 params = response.params
             except Exception:
                 raise ValueError(f"Invalid LLM output format: {response}")
 
-            # Try executing query
-            output = db_manager._execute_query(sql, params)
-            return output
+            _check_select(sql)
+            output = execute(sql, params)
+            SQL_ANALYST_OUTCOMES.labels(outcome="success").inc()
+            _learn_sql_template(user_question, response, prompt)
+            return output, response
 
         except Exception as e:
             last_error = str(e) or traceback.format_exc()
@@ -93,33 +140,143 @@ def sql_analyst_tool(user_question: str):
 
             # Retry with error feedback
             if attempt == max_retries:
-                return "Failed"
+                SQL_ANALYST_OUTCOMES.labels(outcome="failed").inc()
+                raise
+            SQL_ANALYST_RETRIES.inc()
+
+
+def _run_sql_analyst(user_question: str):
+    """Generate SQL with the analyst LLM and execute it, retrying with the error as feedback."""
+    conf = Config()
+    db_manager = PostgresDBManager(conf)
+    try:
+        # Column names let answer_node render a typed table; the fetch is capped so a
+        # runaway query cannot flood memory or the prompt.
+        output, _ = run_analyst_with_retries(
+            user_question,
+            lambda sql, params: db_manager.read_data_with_columns(sql, params, max_rows=conf.analyst_max_result_rows),
+            is_empty=lambda output: not output["rows"],
+        )
+        return output
+    except Exception:
+        return "Failed"
+    finally:
+        db_manager.disconnect()
+
+
+def open_analyst_export(user_question: str):
+    """
+    Generate SQL for a full export and open it on a server-side cursor. Returns
+    `(AnalystModel, batches)` where `batches` streams `(columns, rows)` and disconnects when
+    exhausted or closed. Raises when no attempt produced an executable query.
+    """
+    db_manager = PostgresDBManager(Config())
+
+    def execute(sql, params):
+        batches = db_manager.stream_query(sql, params)
+        # Pull the first batch here so SQL errors are fed back into the retry loop.
+        return next(batches), batches
+
+    def is_empty(output):
+        (_, rows), rest = output
+        if rows:
+            return False
+        # The template's cursor is abandoned; close it before the LLM path reuses the connection.
+        rest.close()
+        return True
+
+    try:
+        (first, rest), response = run_analyst_with_retries(user_question, execute, prompt="analyst_export",
+                                                           is_empty=is_empty)
+    except Exception:
+        db_manager.disconnect()
+        raise
+
+    def batches():
+        try:
+            yield first
+            yield from rest
+        finally:
+            rest.close()
+            db_manager.disconnect()
+
+    return response, batches()
 
 @tool
 def rag_search_tool(user_question: str, session_id: str):
-    """Top-3 chunks from Knowledge Base (empty string if none)"""
+    """Top-5 chunks from Knowledge Base (empty list if none)"""
+    return [text for text, _ in search_knowledge_base(user_question, session_id)]
+
+
+def search_knowledge_base(user_question: str, session_id: str):
+    """
+    Top-5 (chunk text, relevance score or None) pairs in rank order; the scores let rag_node
+    decide clear-cut cases without the judge LLM.
+    """
+    return retrieval_flight.do((session_id, normalize_key(user_question)),
+                               _search_knowledge_base, user_question, session_id)
+
+
+def _search_knowledge_base(user_question: str, session_id: str):
+    """Returns the retrieved chunks in rank order; answer_node packs them to a token budget."""
     try:
-        vector_db = VectorDBManager(Config())
+        vector_db = get_vector_db_manager()
 
-        similar_docs = vector_db.vector_store.similarity_search(
-            query = user_question,
-            k=5,
-            filters=f"session_id eq '{session_id}'"
-        )
+        similar_docs = vector_db.search_chunks(user_question, session_id, k=5)
 
-        return "\n\n".join([doc.page_content for doc in similar_docs])
+        return [(doc.page_content, doc.metadata.get("score")) for doc in similar_docs]
     except Exception as e:
-        return f"RAG_SEARCH_TOOL Error::{e}"
+        logging.error(f"RAG_SEARCH_TOOL Error::{e}")
+        return []
     
 
-# Initialize Tavily search
-tavily = TavilySearch(max_results=3, topic="general")
+# Initialize Tavily search on first use
+@lazy_client("tavily")
+def get_tavily():
+    from langchain_tavily import TavilySearch
+    conf = Config()
+    return TavilySearch(max_results=conf.tavily_max_results, topic=conf.tavily_topic)
+
+
+@lazy_client("web_cache")
+def get_web_cache():
+    """(memory tier, disk tier or None) for formatted Tavily results."""
+    conf = Config()
+    memory = TTLCache("web_search", maxsize=conf.web_cache_size, ttl=conf.web_cache_ttl)
+    disk = DiskCache("web_search_disk", conf.web_cache_dir, ttl=conf.web_cache_ttl) if conf.web_cache_dir else None
+    return memory, disk
+
 
 @tool
 def web_search_tool(query: str) -> str:
     """Up-to-date web info via Tavily"""
+    conf = Config()
+    # Results depend on the search parameters as well as the query.
+    key = (normalize_key(query), conf.tavily_max_results, conf.tavily_topic)
+    cached = _cached_web_result(key)
+    if cached is not None:
+        return cached
+    return web_flight.do(key, _search_web, query, key)
+
+
+def _cached_web_result(key):
+    memory, disk = get_web_cache()
+    entry = memory.get(key)
+    if entry is None and disk is not None:
+        entry = disk.get(list(key))
+        if entry is not None:
+            memory.set(key, entry)
+    if entry is None:
+        return None
+    record_saved_latency("web_search", entry["seconds"])
+    return entry["result"]
+
+
+def _search_web(query: str, key) -> str:
+    start = time.perf_counter()
+    ttl = None
     try:
-        result = tavily.invoke({"query": query})
+        result = get_tavily().invoke({"query": query})
 
         # Extract and format the results from Tavily response
         if isinstance(result, dict) and 'results' in result:
@@ -130,8 +287,17 @@ def web_search_tool(query: str) -> str:
                 url = item.get('url', '')
                 formatted_results.append(f"Title: {title}\nContent: {content}\nURL: {url}")
 
-            return "\n\n".join(formatted_results) if formatted_results else "No results found"
+            output = "\n\n".join(formatted_results) if formatted_results else "No results found"
         else:
-            return str(result)
+            output = str(result)
     except Exception as e:
-        return f"WEB_SEARCH_TOOL::{e}"
+        output = f"WEB_SEARCH_TOOL::{e}"
+        # Failures are cached briefly (memory only) so an outage or rate limit is not hit by every turn.
+        ttl = Config().web_cache_error_ttl
+
+    entry = {"result": output, "seconds": time.perf_counter() - start}
+    memory, disk = get_web_cache()
+    memory.set(key, entry, ttl=ttl)
+    if disk is not None and ttl is None:
+        disk.set(list(key), entry)
+    return output
@@ -1,5 +1,10 @@
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
 from typing import List, Dict, Optional, Tuple
+import base64
+import json
+import re
+
+SQL_TIMESTAMP_RE = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d{1,7})?")
 
 def history_to_lc_messages(history: List[Tuple]) -> List[BaseMessage]:
     """Convert chat history from DB to LangChain message objects."""
@@ -11,4 +16,29 @@ def history_to_lc_messages(history: List[Tuple]) -> List[BaseMessage]:
 
 def append_message(history: List[BaseMessage], message: BaseMessage) -> List[BaseMessage]:
     """Return a new list with the message appended."""
-    return history + [message] 
\ No newline at end of file
+    return history + [message] 
+
+def encode_cursor(key: Tuple) -> str:
+    """Opaque, URL-safe pagination cursor for a keyset position."""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str], types: Tuple[type, ...]) -> Optional[List]:
+    """
+    Inverse of `encode_cursor` for a key whose elements have `types`; raises ValueError for a
+    malformed cursor, so a forged one never reaches the database as a wrongly typed parameter.
+    """
+    if not cursor:
+        return None
+    padded = cursor + "=" * (-len(cursor) % 4)
+    key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    if not isinstance(key, list) or len(key) != len(types):
+        raise ValueError("Malformed cursor")
+    for value, expected in zip(key, types):
+        # bool is an int subclass, but never part of a key.
+        if not isinstance(value, expected) or isinstance(value, bool):
+            raise ValueError("Malformed cursor")
+    return key
+
+def is_sql_timestamp(value: str) -> bool:
+    """True for the text of a DATETIME2 key as produced by CONVERT(VARCHAR(33), <column>, 126)."""
+    return SQL_TIMESTAMP_RE.fullmatch(value) is not None
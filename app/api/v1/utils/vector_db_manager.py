@@ -1,28 +1,66 @@
 import hashlib
+import logging
+import os
+from typing import Dict, List
 from app.api.v1.utils.config import Config
 from app.api.v1.utils.llm_manager import LLMManager
-from langchain_community.vectorstores.azuresearch import AzureSearch
-from langchain_openai import AzureOpenAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from azure.search.documents.indexes.models import (
-    SearchableField,
-    SearchFieldDataType,
-    SearchField,
-    SimpleField,
-    TextWeights,
-)
+from app.api.v1.utils.metrics import EMBEDDING_LATENCY, SEARCH_LATENCY, RETRIEVAL_PATHS, timed
+from app.api.v1.utils.http_client import get_http_client, get_http_async_client, role_timeout
+from app.api.v1.utils.startup import lazy_client
+from app.api.v1.utils.single_flight import embedding_flight, normalize_key
+from app.api.v1.utils.lexical_index import LexicalIndexRegistry, reciprocal_rank_fusion
+from app.api.v1.utils.cache import TTLCache
+from app.api.v1.utils.chunking import content_defined_chunks
+from app.api.v1.utils.prompts import get_prompt
+from langchain_core.documents import Document
 
 class VectorDBManager:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, vector_store=None, embeddings=None, lexical_indexes=None):
+        """
+        Builds the Azure OpenAI embeddings client and Azure Search store unless a `vector_store`
+        (and its `embeddings`) is passed in, as the offline benchmarks do.
+        """
         self.conf = config
+        self.lexical_indexes = lexical_indexes or LexicalIndexRegistry(self.conf.lexical_index_dir)
+        self.query_embeddings = TTLCache("query_embedding", maxsize=self.conf.embedding_cache_size,
+                                         ttl=self.conf.embedding_cache_ttl)
+        # (session, index version, normalised query, k) -> [(chunk id, text, relevance score)]
+        self.retrievals = TTLCache("retrieval", maxsize=self.conf.retrieval_cache_size,
+                                   ttl=self.conf.retrieval_cache_ttl)
+        if vector_store is not None:
+            self.embeddings = embeddings
+            self.embedding_function = embeddings.embed_query if embeddings else None
+            self.vector_store = vector_store
+        else:
+            self._connect_azure_search()
+
+    def _connect_azure_search(self):
+        # Heavy SDK imports are deferred until a manager is actually needed.
+        from langchain_community.vectorstores.azuresearch import AzureSearch
+        from langchain_openai import AzureOpenAIEmbeddings
+        from azure.search.documents.indexes.models import (
+            SearchableField,
+            SearchFieldDataType,
+            SearchField,
+            SimpleField,
+        )
 
         self.embeddings: AzureOpenAIEmbeddings = AzureOpenAIEmbeddings(
                     azure_deployment= self.conf.embedding_deployment_name,
                     openai_api_version= self.conf.embedding_api_version,
                     azure_endpoint= self.conf.ai_endpoint,
                     api_key= self.conf.ai_api_key,
+                    timeout= role_timeout(self.conf, "embedding"),
+                    http_client= get_http_client(),
+                    http_async_client= get_http_async_client(),
                 )
-        self.embedding_function = self.embeddings.embed_query
+        # Identical texts embedded concurrently share one request; the key is the exact text.
+        self._embed_query = embedding_flight.wrap(
+            timed(EMBEDDING_LATENCY.labels(operation="embed_query"), self.embeddings.embed_query),
+            key_fn=lambda text: text,
+        )
+        self.embedding_function = self._cached_embed_query
+        dimensions = self.conf.embedding_dimensions or len(self.embedding_function("Text"))
         self.vector_store: AzureSearch = AzureSearch(
                 azure_search_endpoint= self.conf.ai_search_endpoint,
                 azure_search_key= self.conf.ai_search_key,
@@ -40,80 +78,218 @@ class VectorDBManager:
                             name="content_vector",
                             type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
                             searchable=True,
-                            vector_search_dimensions=len(self.embedding_function("Text")),
+                            vector_search_dimensions=dimensions,
                             vector_search_profile_name="myHnswProfile",
                         ),
                         SearchableField(name="metadata",type="Edm.String",searchable=True,),
                         # Additional field for filtering on document source
                         SimpleField(name="document_hash",type="Edm.String",filterable=True,),
                         SimpleField(name="session_id",type="Edm.String",filterable=True,),
-                    ]
+                        # Chunk-level identity for incremental re-indexing.
+                        SimpleField(name="document_id",type="Edm.String",filterable=True,),
+                        SimpleField(name="chunk_hash",type="Edm.String",filterable=True,),
+                    ],
+                vector_search_dimensions=dimensions,
             )
 
+    def _cached_embed_query(self, text: str) -> List[float]:
+        vector = self.query_embeddings.get(text)
+        if vector is None:
+            vector = self._embed_query(text)
+            self.query_embeddings.set(text, vector)
+        return vector
+
+    def prime_query_embeddings(self, texts: List[str]) -> int:
+        """
+        Embed the given query texts in one batched request and cache them, so the searches that
+        follow (e.g. from /agentic/chat-batch) skip their per-query embedding call.
+        Returns the number of texts embedded.
+        """
+        if self.embeddings is None:
+            return 0
+        missing = list(dict.fromkeys(t for t in texts if t and t not in self.query_embeddings))
+        if not missing:
+            return 0
+        with EMBEDDING_LATENCY.labels(operation="embed_batch").time():
+            vectors = self.embeddings.embed_documents(missing)
+        for text, vector in zip(missing, vectors):
+            self.query_embeddings.set(text, vector)
+        return len(missing)
 
     def get_document_hash(self, text):
         return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
-    def check_doc_exists_in_vector_store(self, doc_hash):
-        similar_docs = self.vector_store.similarity_search(query=doc_hash, k=1)
+    @staticmethod
+    def get_document_id(session_id: str, source: str) -> str:
+        """Stable id of a file within a session, so a re-upload replaces its earlier version."""
+        return hashlib.sha256(f"{session_id}:{os.path.basename(source)}".encode("utf-8")).hexdigest()[:32]
 
-        for doc in similar_docs:
-            if doc.metadata.get("document_hash") == doc_hash:
-                return True
-        return False
+    @staticmethod
+    def _chunk_key(document_id: str, chunk_hash: str) -> str:
+        # Azure Search keys allow letters, digits, "_", "-" and "=".
+        return f"{document_id}-{chunk_hash[:40]}"
 
-    def split_document(self, document, chunk_size=1000, chunk_overlap=100):
-        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        chunks = splitter.split_documents(document)
-        return chunks
+    def _indexed_chunk_ids(self, document_id: str) -> List[str]:
+        with SEARCH_LATENCY.labels(operation="document_lookup").time():
+            results = self.vector_store.client.search(
+                search_text="*", filter=f"document_id eq '{document_id}'", select=["id"],
+            )
+            return [result["id"] for result in results]
 
-    def add_document_if_not_exist(self, doc, session_id):
-        doc_content = doc[0].page_content
-        doc_hash = self.get_document_hash(doc_content)
-        if not self.check_doc_exists_in_vector_store(doc_hash):
-            print("Got new document, adding to vector store...")
+    def delete_session_chunks(self, session_id: str, batch_size: int = 1000) -> int:
+        """Delete every indexed chunk and the BM25 index of a session; returns the chunks deleted."""
+        with SEARCH_LATENCY.labels(operation="session_lookup").time():
+            ids = [result["id"] for result in self.vector_store.client.search(
+                search_text="*", filter=f"session_id eq '{session_id}'", select=["id"],
+            )]
+        for start in range(0, len(ids), batch_size):
+            self.vector_store.delete(ids=ids[start:start + batch_size])
+        self.lexical_indexes.drop(session_id)
+        return len(ids)
 
-            chunks = self.split_document(doc)
-            docs_array, meta_array = [], []
-            for chunk in chunks:
-                docs_array.append(chunk.page_content)
-                meta_array.append({'document_hash' : doc_hash, 'session_id': session_id})
+    def add_document_if_not_exist(self, doc, session_id) -> Dict[str, int]:
+        """
+        Incrementally index a document. It is split with content-defined boundaries and every
+        chunk is keyed by (document id, chunk hash); only chunks not already in the index are
+        embedded and uploaded, and chunks of the previous version that no longer occur are
+        deleted, so re-ingest cost follows the size of the edit. The session's BM25 index is
+        updated with the same delta.
 
-            self.vector_store.add_texts(texts = docs_array, metadatas = meta_array)
-        else:
-            print("Document already exists, skipping")
-    
-    def retrive_chunks(self, user_question, session_id):
+        Duplicates are recognised per (session, file name) only. There is no index-wide
+        `document_hash` check: it skipped a session's upload whenever another session held the
+        same file, leaving it unsearchable under the session filter, and unchanged chunks keep
+        the hash of the version that first uploaded them.
+        """
+        text = "\n".join(page.page_content for page in doc)
+        source = doc[0].metadata.get("source", "") if doc else ""
+        return self.index_text(text, source, session_id)
 
-        similar_docs = self.vector_store.similarity_search(
-            query = user_question,
-            k=5,
-            filters=f"session_id eq '{session_id}'"
-        )
+    def index_text(self, text: str, source: str, session_id: str) -> Dict[str, int]:
+        """`add_document_if_not_exist` for already extracted text; `source` names the file."""
+        document_id = self.get_document_id(session_id, source)
+        doc_hash = self.get_document_hash(text)
 
-        return "\n\n".join([doc.page_content for doc in similar_docs])
+        chunks = {}
+        for chunk_text, chunk_hash in content_defined_chunks(
+            text,
+            min_chars=self.conf.chunk_min_chars,
+            max_chars=self.conf.chunk_max_chars,
+            mask_bits=self.conf.chunk_mask_bits,
+            overlap_chars=self.conf.chunk_overlap_chars,
+        ):
+            chunks.setdefault(self._chunk_key(document_id, chunk_hash), (chunk_text, chunk_hash))
 
-    def query_with_document(self, user_question, session_id):
+        indexed = set(self._indexed_chunk_ids(document_id))
+        new_keys = [key for key in chunks if key not in indexed]
+        stale_keys = [key for key in indexed if key not in chunks]
 
-        context_from_docs = retrive_chunks(user_question, session_id)
-        
-        prompt_template = """
-        You are given the following context from the document:
-        {context}
+        if new_keys:
+            texts = [chunks[key][0] for key in new_keys]
+            with EMBEDDING_LATENCY.labels(operation="embed_documents").time():
+                vectors = self.embeddings.embed_documents(texts)
+            metadatas = [{"document_hash": doc_hash, "session_id": session_id,
+                          "document_id": document_id, "chunk_hash": chunks[key][1]} for key in new_keys]
+            self.vector_store.add_embeddings(zip(texts, vectors), metadatas=metadatas, keys=new_keys)
+        if stale_keys:
+            self.vector_store.delete(ids=stale_keys)
+        if new_keys or stale_keys:
+            self.lexical_indexes.update(session_id, {key: chunks[key][0] for key in new_keys}, stale_keys)
+
+        stats = {"added": len(new_keys), "removed": len(stale_keys), "unchanged": len(chunks) - len(new_keys)}
+        print(f"Indexed {os.path.basename(source) or document_id}: {stats}")
+        return stats
 
-        Using this context, answer the following question:
-        "{user_question}"
+    def _lexical_is_decisive(self, lexical):
+        if not lexical or lexical[0][1] < self.conf.lexical_fast_path_min_score:
+            return False
+        return len(lexical) == 1 or lexical[0][1] >= self.conf.lexical_fast_path_ratio * lexical[1][1]
 
-        Answer:
+    @staticmethod
+    def _cosine_similarity(search_score: float) -> float:
+        """
+        Azure AI Search reports a cosine vector match as @search.score = 1 / (1 + (1 - cosine)),
+        and AzureSearch passes that through as the relevance score; undo it so the gate
+        thresholds are plain cosine similarities.
         """
+        return 2 - 1 / search_score if search_score > 0 else -1.0
 
-        enriched_prompt = prompt_template.format(
-            context=context_from_docs,
-            user_question=user_question
+    @staticmethod
+    def _chunk_id(doc: Document) -> str:
+        return doc.metadata.get("id") or hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+    def search_chunks(self, user_question, session_id, k=5) -> List[Document]:
+        """
+        Hybrid retrieval for a session, cached per session. The cache key includes the version
+        of the session's chunk index, which changes exactly when an upload adds, changes or
+        removes chunks of the session, so repeated questions between uploads cost no network I/O.
+        It is the version of the very index the search runs on, so a result computed from an
+        index another worker has since replaced is never cached under the newer version.
+
+        Chunks found by the vector search carry the cosine similarity of their vector to the
+        question's in `metadata["score"]`, on every path (a hybrid result keeps the vector score
+        of its chunks, never the fused rank score). Chunks found only lexically, including every
+        chunk of the lexical fast path, have none, so the RAG gate leaves them to the judge.
+        """
+        index, version = self.lexical_indexes.snapshot(session_id)
+        key = (session_id, version, normalize_key(user_question), k)
+        cached = self.retrievals.get(key)
+        if cached is not None:
+            return [Document(page_content=text, metadata={"id": doc_id, "session_id": session_id, "score": score})
+                    for doc_id, text, score in cached]
+        docs = self._search_chunks(user_question, session_id, k, index)
+        self.retrievals.set(key, [(self._chunk_id(doc), doc.page_content, doc.metadata.get("score"))
+                                  for doc in docs])
+        return docs
+
+    def _search_chunks(self, user_question, session_id, k=5, index=None) -> List[Document]:
+        """
+        BM25 over the session's chunks (`index`, or None when none were indexed) fused with the
+        vector search by reciprocal rank fusion. When the lexical ranking is decisive (e.g. an
+        exact SKU id or clause number) the vector search, and with it the embedding call, is skipped.
+        """
+        lexical = index.search(user_question, k=k) if index else []
+
+        if self._lexical_is_decisive(lexical):
+            RETRIEVAL_PATHS.labels(path="lexical").inc()
+            return [Document(page_content=index.texts[doc_id], metadata={"id": doc_id, "session_id": session_id})
+                    for doc_id, _ in lexical]
+
+        with SEARCH_LATENCY.labels(operation="similarity_search").time():
+            scored = self.vector_store.similarity_search_with_relevance_scores(
+                query = user_question,
+                k=k,
+                filters=f"session_id eq '{session_id}'"
+            )
+        vector_docs = []
+        for doc, score in scored:
+            doc.metadata["score"] = self._cosine_similarity(score)
+            vector_docs.append(doc)
+        if not lexical:
+            RETRIEVAL_PATHS.labels(path="vector").inc()
+            return vector_docs
+
+        RETRIEVAL_PATHS.labels(path="hybrid").inc()
+        by_id = {self._chunk_id(doc): doc for doc in vector_docs}
+        for doc_id, _ in lexical:
+            by_id.setdefault(doc_id, Document(page_content=index.texts[doc_id],
+                                              metadata={"id": doc_id, "session_id": session_id}))
+        fused = reciprocal_rank_fusion(
+            [[self._chunk_id(doc) for doc in vector_docs], [doc_id for doc_id, _ in lexical]],
+            k=self.conf.rrf_k,
         )
-        llm_manager = LLMManager(self.conf)
-        llm = llm_manager.connect()
-        response = llm.invoke([{"role" : "user", "content": enriched_prompt}])
+        return [by_id[doc_id] for doc_id, _ in fused[:k]]
+
+    def retrive_chunks(self, user_question, session_id):
+        similar_docs = self.search_chunks(user_question, session_id)
+        return "\n\n".join([doc.page_content for doc in similar_docs])
+
+    def query_with_document(self, user_question, session_id):
+
+        context_from_docs = self.retrive_chunks(user_question, session_id)
+        
+        messages = get_prompt("document_qa").render(context=context_from_docs, question=user_question)
+        llm = get_document_qa_llm()
+        response = llm.invoke(messages)
         answer = response.content
 
         return answer.strip()
@@ -121,3 +297,52 @@ class VectorDBManager:
 
 
 
+
+
+
+# Fields added to the index after it was first created; an index created now has them already.
+MIGRATED_INDEX_FIELDS = ("document_id", "chunk_hash")
+
+
+def apply_search_index_schema(conf: Config = None) -> List[str]:
+    """
+    Add the filterable string fields in MIGRATED_INDEX_FIELDS to an Azure Search index created
+    before they were introduced, and return the ones added. Run this module once per deployment,
+    before starting the API: `python -m app.api.v1.utils.vector_db_manager`.
+    SEARCH_INDEX_SCHEMA_ON_STARTUP=true runs it in every worker at startup instead.
+    """
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents.indexes import SearchIndexClient
+    from azure.search.documents.indexes.models import SimpleField
+
+    conf = conf or Config()
+    client = SearchIndexClient(conf.ai_search_endpoint, AzureKeyCredential(conf.ai_search_key))
+    index = client.get_index(conf.ai_consumer_sales_index_name)
+    existing = {field.name for field in index.fields}
+    missing = [name for name in MIGRATED_INDEX_FIELDS if name not in existing]
+    if missing:
+        index.fields.extend(SimpleField(name=name, type="Edm.String", filterable=True) for name in missing)
+        client.create_or_update_index(index)
+        logging.info(f"Added fields {missing} to index {conf.ai_consumer_sales_index_name}")
+    else:
+        logging.info(f"Index {conf.ai_consumer_sales_index_name} is up to date.")
+    return missing
+
+
+@lazy_client("vector_db_manager")
+def get_vector_db_manager() -> VectorDBManager:
+    """Shared manager, so the embedding client, search client and dimension probe are set up once per process."""
+    return VectorDBManager(Config())
+
+
+@lazy_client("document_qa_llm")
+def get_document_qa_llm():
+    return LLMManager(Config(), role="document_qa").connect()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    apply_search_index_schema()
@@ -0,0 +1,312 @@
+"""
+Per-node latency micro-benchmark for the agentic graph.
+
+Runs the compiled `agent` graph and the `/agentic/chat` endpoint through every route with
+local fake chat models, embeddings, search store, SQL database and web tool, so no Azure
+OpenAI, Azure Search, Postgres or Tavily access is needed.
+
+For each node it reports wall time, the latency injected by the fakes, and the overhead
+(wall time minus injected latency). Framework overhead is the graph wall time not spent
+inside any node; allocations are measured with `tracemalloc`.
+
+With `--combined-routing` the endpoint runs with AGENT_COMBINED_ROUTING, so the router node
+takes its route from the combined contextualise-and-route call instead of a second LLM call.
+
+Usage:
+    python -m benchmarks.agent_latency --iterations 50 --latency-ms 5 --json bench.json
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Dict, List
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+from langchain_core.output_parsers import StrOutputParser
+
+from benchmarks.fakes import (
+    SCENARIOS,
+    FakeAzureSQLManager,
+    FakeChatModel,
+    FakeEmbeddings,
+    FakePostgresDBManager,
+    FakeSearchStore,
+    FakeTavily,
+    LatencyLedger,
+)
+from app.api.v1.utils.shared import RouteDecisionModel, RagJudgeModel, AnalystModel, ContextualRouteModel
+from app.api.v1.utils.vector_db_manager import VectorDBManager
+from app.api.v1.utils.lexical_index import LexicalIndexRegistry
+from app.api.v1.utils.config import Config
+from app.api.v1.utils.checkpointer import delete_checkpoints
+from app.api.v1.utils.prompts import get_prompt
+
+SESSION_ID = "benchmark-session"
+GRAPH_NODES = ["router", "rag_lookup", "web_search", "analyst", "answer"]
+CONTEXT_CHAINS = ["contextualise_chain", "contextualise_route_chain"]
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Collects wall time of every LangGraph node run and of the contextualise chains."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._starts: Dict[UUID, tuple] = {}
+        self.timings: Dict[str, float] = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None,
+                       metadata=None, **kwargs):
+        name = kwargs.get("name")
+        is_node = name in GRAPH_NODES and (metadata or {}).get("langgraph_node") == name
+        if is_node or name in CONTEXT_CHAINS:
+            with self._lock:
+                self._starts[run_id] = (name, time.perf_counter())
+
+    def _finish(self, run_id):
+        with self._lock:
+            started = self._starts.pop(run_id, None)
+            if started:
+                name, start = started
+                self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def reset(self):
+        with self._lock:
+            self._starts = {}
+            self.timings = {}
+
+
+class FakeBackend:
+    """Builds the fakes and patches them into the modules the graph and APIs use."""
+
+    def __init__(self, latency: float):
+        # Checkpoints stay in memory, and every iteration runs the full route instead of
+        # reusing the previous iteration's checkpointed or cached tool results.
+        os.environ["AGENT_CHECKPOINTER"] = "memory"
+        os.environ["AGENT_CONTEXT_REUSE_TTL"] = "0"
+        os.environ["WEB_CACHE_TTL"] = "0"
+        os.environ["WEB_CACHE_DIR"] = ""
+        os.environ["RETRIEVAL_CACHE_TTL"] = "0"
+        # Hash embeddings give meaningless relevance scores; the judge decides every RAG scenario.
+        os.environ["RAG_GATE_ENABLED"] = "false"
+
+        self.ledger = LatencyLedger()
+        self.scenario = SCENARIOS[0]
+        self.embeddings = FakeEmbeddings(self.ledger, latency)
+        self.store = FakeSearchStore(self.embeddings, self.ledger, latency)
+        self.vector_db = VectorDBManager(
+            Config(), vector_store=self.store, embeddings=self.embeddings,
+            lexical_indexes=LexicalIndexRegistry(tempfile.mkdtemp(prefix="bench-lexical-")),
+        )
+        texts = [f"Policy clause {i}: returns for SKU {100 + i} are accepted within {i + 7} days."
+                 for i in range(20)]
+        ids = self.store.add_texts(
+            texts, metadatas=[{"session_id": SESSION_ID, "document_hash": "benchmark"}] * 20,
+        )
+        self.vector_db.lexical_indexes.update(SESSION_ID, dict(zip(ids, texts)))
+        self.db = FakePostgresDBManager(self.ledger, latency)
+        self.web = FakeTavily(self.ledger, latency)
+        self.latency = latency
+
+    def _model(self, label: str, role: str):
+        return FakeChatModel(label=label, latency=self.latency, ledger=self.ledger,
+                             script=lambda messages: getattr(self.scenario, role)(messages))
+
+    def install(self):
+        from app.api.v1.utils import nodes, tools, langchain_utils
+        from app.api.v1.ai.agentic import apis
+
+        router_llm = self._model("router", "router").with_structured_output(RouteDecisionModel)
+        judge_llm = self._model("judge", "judge").with_structured_output(RagJudgeModel)
+        answer_llm = self._model("answer", "answer")
+        analyst_llm = self._model("analyst", "analyst").with_structured_output(AnalystModel)
+        self.contextualise_chain = (
+            langchain_utils.CONTEXT_PROMPT
+            | self._model("contextualise_chain", "contextualise")
+            | StrOutputParser()
+        ).with_config(run_name="contextualise_chain")
+        self.contextualise_route_chain = (
+            get_prompt("contextualise_route").template
+            | self._model("contextualise_route_chain", "contextualise_route").with_structured_output(ContextualRouteModel)
+        ).with_config(run_name="contextualise_route_chain")
+
+        nodes.get_router_llm = lambda: router_llm
+        nodes.get_judge_llm = lambda: judge_llm
+        nodes.get_answer_llm = lambda: answer_llm
+        tools.get_analyst_llm = lambda: analyst_llm
+        tools.PostgresDBManager = self.db
+        tools.get_vector_db_manager = lambda: self.vector_db
+        tools.get_tavily = lambda: self.web
+        apis.AzureSQLManager = FakeAzureSQLManager
+        apis.get_vector_db_manager = lambda: self.vector_db
+        apis.get_contextualise_chain = lambda: self.contextualise_chain
+        apis.get_contextualise_route_chain = lambda: self.contextualise_route_chain
+
+
+def _summarise(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": statistics.median(ordered) * 1000,
+        "p95_ms": p95 * 1000,
+    }
+
+
+def _measure(run, backend: FakeBackend, timer: NodeTimer, iterations: int, warmup: int):
+    for _ in range(warmup):
+        run()
+
+    # Timing pass; tracemalloc is kept off here because it slows every allocation down.
+    totals, nodes, injected = [], {}, {}
+    for _ in range(iterations):
+        backend.ledger.reset()
+        timer.reset()
+        start = time.perf_counter()
+        run()
+        totals.append(time.perf_counter() - start)
+        for name, seconds in timer.timings.items():
+            nodes.setdefault(name, []).append(seconds)
+        for name, seconds in backend.ledger.snapshot().items():
+            injected.setdefault(name, []).append(seconds)
+
+    report = {"total": _summarise(totals), "nodes": {}}
+    for name, samples in nodes.items():
+        fake = injected.get(name, [])
+        overhead = [wall - (fake[i] if i < len(fake) else 0.0) for i, wall in enumerate(samples)]
+        report["nodes"][name] = {
+            "wall": _summarise(samples),
+            "injected_ms": statistics.fmean(fake) * 1000 if fake else 0.0,
+            "overhead": _summarise(overhead),
+        }
+    in_nodes = [sum(samples[i] for samples in nodes.values() if i < len(samples))
+                for i in range(iterations)]
+    report["framework_overhead"] = _summarise([t - n for t, n in zip(totals, in_nodes)])
+
+    # Allocation pass.
+    alloc_runs = max(1, min(iterations, 10))
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    allocated = 0
+    for _ in range(alloc_runs):
+        snapshot_before = tracemalloc.take_snapshot()
+        run()
+        diff = tracemalloc.take_snapshot().compare_to(snapshot_before, "filename")
+        allocated += sum(stat.size_diff for stat in diff if stat.size_diff > 0)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    report["allocations"] = {
+        "peak_kib": (peak - base) / 1024,
+        "retained_per_run_kib": allocated / alloc_runs / 1024,
+    }
+    return report
+
+
+def run_benchmark(iterations: int, warmup: int, latency: float, endpoint: bool = True,
+                  combined_routing: bool = False) -> Dict:
+    os.environ["AGENT_COMBINED_ROUTING"] = "true" if combined_routing else "false"
+    backend = FakeBackend(latency)
+    backend.install()
+    timer = NodeTimer()
+
+    from app.api.v1.utils.langgraph_agent import agent
+    from app.api.v1.ai.agentic import apis
+
+    results = {"config": {"iterations": iterations, "warmup": warmup,
+                          "injected_latency_ms": latency * 1000, "combined_routing": combined_routing},
+               "graph": {}, "endpoint": {}}
+
+    for scenario in SCENARIOS:
+        backend.scenario = scenario
+
+        def run_graph():
+            agent.invoke(
+                {"messages": [HumanMessage(content=scenario.question)],
+                 "session_id": SESSION_ID},
+                config={"callbacks": [timer]},
+            )
+
+        results["graph"][scenario.name] = _measure(run_graph, backend, timer, iterations, warmup)
+
+    if endpoint:
+        from fastapi.testclient import TestClient
+        from main import app
+
+        from app.api.v1.utils.langgraph_agent import get_session_agent
+        session_agent = get_session_agent()
+        apis.get_session_agent = lambda: session_agent.with_config(callbacks=[timer])
+        timed_chain = backend.contextualise_chain.with_config(callbacks=[timer])
+        apis.get_contextualise_chain = lambda: timed_chain
+        timed_route_chain = backend.contextualise_route_chain.with_config(callbacks=[timer])
+        apis.get_contextualise_route_chain = lambda: timed_route_chain
+        client = TestClient(app)
+        for scenario in SCENARIOS:
+            backend.scenario = scenario
+            FakeAzureSQLManager.history = {}
+            delete_checkpoints(SESSION_ID)
+
+            def run_endpoint():
+                response = client.post("/agentic/chat", json={
+                    "session_id": SESSION_ID,
+                    "user_id": "benchmark-user",
+                    "question": scenario.question,
+                })
+                response.raise_for_status()
+
+            results["endpoint"][scenario.name] = _measure(run_endpoint, backend, timer,
+                                                          iterations, warmup)
+        apis.get_session_agent = get_session_agent
+
+    return results
+
+
+def print_report(results: Dict):
+    for target in ("graph", "endpoint"):
+        for scenario, report in results[target].items():
+            total = report["total"]
+            print(f"\n[{target}] route={scenario}  total mean={total['mean_ms']:.2f}ms "
+                  f"p95={total['p95_ms']:.2f}ms  framework overhead mean="
+                  f"{report['framework_overhead']['mean_ms']:.2f}ms  "
+                  f"retained/run={report['allocations']['retained_per_run_kib']:.1f}KiB "
+                  f"peak={report['allocations']['peak_kib']:.1f}KiB")
+            print(f"  {'node':<22}{'wall mean':>12}{'injected':>12}{'overhead':>12}{'ovh p95':>12}")
+            for name, node in report["nodes"].items():
+                print(f"  {name:<22}{node['wall']['mean_ms']:>10.2f}ms{node['injected_ms']:>10.2f}ms"
+                      f"{node['overhead']['mean_ms']:>10.2f}ms{node['overhead']['p95_ms']:>10.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-node latency benchmark with fake backends.")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="Latency injected into every fake LLM, embedding, search, SQL and web call.")
+    parser.add_argument("--skip-endpoint", action="store_true",
+                        help="Only benchmark the compiled graph, not the /agentic/chat endpoint.")
+    parser.add_argument("--combined-routing", action="store_true",
+                        help="Run the endpoint with the single contextualise-and-route LLM call.")
+    parser.add_argument("--json", dest="json_path", help="Write machine-readable results to this path.")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.iterations, args.warmup, args.latency_ms / 1000,
+                            endpoint=not args.skip_endpoint, combined_routing=args.combined_routing)
+    print_report(results)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import datetime
+import hashlib
+import json
+import math
+import threading
+import time
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables.config import var_child_runnable_config
+
+
+class LatencyLedger:
+    """Thread-safe record of the latency injected by the fakes, grouped by graph node."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.entries: Dict[str, float] = {}
+
+    def record(self, seconds: float, fallback: str):
+        config = var_child_runnable_config.get() or {}
+        node = (config.get("metadata") or {}).get("langgraph_node", fallback)
+        with self._lock:
+            self.entries[node] = self.entries.get(node, 0.0) + seconds
+
+    def reset(self):
+        with self._lock:
+            self.entries = {}
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self.entries)
+
+
+def _sleep(ledger: LatencyLedger, latency: float, label: str):
+    start = time.perf_counter()
+    if latency > 0:
+        time.sleep(latency)
+    ledger.record(time.perf_counter() - start, label)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model returning scripted content after an injected delay.
+
+    `script` receives the prompt messages and returns the reply text. When the model is
+    wrapped with `with_structured_output`, the reply text must be JSON for the schema.
+    """
+
+    label: str
+    script: Callable[[List[BaseMessage]], str]
+    latency: float = 0.0
+    ledger: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        _sleep(self.ledger, self.latency, self.label)
+        content = self.script(messages)
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        completion_tokens = len(content) // 4
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        )
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": {"prompt_tokens": prompt_tokens,
+                                        "completion_tokens": completion_tokens,
+                                        "total_tokens": prompt_tokens + completion_tokens}},
+        )
+
+    def with_structured_output(self, schema, **kwargs):
+        return self | RunnableLambda(lambda message: schema.model_validate_json(message.content))
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic hash-based embeddings with an injected delay per call."""
+
+    def __init__(self, ledger: LatencyLedger, latency: float = 0.0, size: int = 64):
+        self.ledger = ledger
+        self.latency = latency
+        self.size = size
+
+    def _vector(self, text: str) -> List[float]:
+        digest = hashlib.sha256(text.lower().encode("utf-8")).digest()
+        values = [(digest[i % len(digest)] - 128) / 128.0 for i in range(self.size)]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        _sleep(self.ledger, self.latency, "embedding")
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        _sleep(self.ledger, self.latency, "embedding")
+        return self._vector(text)
+
+
+class FakeSearchStore:
+    """In-memory stand-in for the Azure Search vector store, honouring the session filter."""
+
+    def __init__(self, embeddings: FakeEmbeddings, ledger: LatencyLedger, latency: float = 0.0):
+        self.embeddings = embeddings
+        self.ledger = ledger
+        self.latency = latency
+        self.rows: List[Tuple[Document, List[float]]] = []
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        texts = list(texts)
+        return self.add_embeddings(zip(texts, self.embeddings.embed_documents(texts)), metadatas, **kwargs)
+
+    def add_embeddings(self, text_embeddings, metadatas=None, keys=None):
+        ids = []
+        for i, (text, vector) in enumerate(text_embeddings):
+            metadata = dict(metadatas[i]) if metadatas else {}
+            metadata["id"] = keys[i] if keys else hashlib.sha1(text.encode("utf-8")).hexdigest()
+            self.rows = [row for row in self.rows if row[0].metadata["id"] != metadata["id"]]
+            self.rows.append((Document(page_content=text, metadata=metadata), vector))
+            ids.append(metadata["id"])
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        ids = set(ids or ())
+        self.rows = [row for row in self.rows if row[0].metadata["id"] not in ids]
+        return bool(ids)
+
+    @property
+    def client(self):
+        return self
+
+    def search(self, search_text="*", filter=None, select=None, **kwargs):
+        """Minimal `SearchClient.search` supporting a single `field eq 'value'` filter."""
+        field, value = None, None
+        if filter:
+            field, value = filter.split(" eq ")[0].strip(), filter.split("'")[1]
+        return [{"id": doc.metadata["id"], **doc.metadata} for doc, _ in self.rows
+                if field is None or doc.metadata.get(field) == value]
+
+    def _search(self, query: str, k: int, filters: Optional[str]):
+        session_id = None
+        if filters and "session_id eq" in filters:
+            session_id = filters.split("'")[1]
+        vector = self.embeddings.embed_query(query)
+        _sleep(self.ledger, self.latency, "search")
+        scored = []
+        for doc, doc_vector in self.rows:
+            if session_id and doc.metadata.get("session_id") != session_id:
+                continue
+            cosine = sum(a * b for a, b in zip(vector, doc_vector))
+            # Azure AI Search's @search.score for a cosine match.
+            scored.append((doc, 1 / (2 - cosine)))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:k]
+
+    def similarity_search(self, query: str, k: int = 4, filters: Optional[str] = None, **kwargs):
+        return [doc for doc, _ in self._search(query, k, filters)]
+
+    def similarity_search_with_relevance_scores(self, query: str, k: int = 4,
+                                                filters: Optional[str] = None, **kwargs):
+        return self._search(query, k, filters)
+
+
+class FakeTavily:
+    """Stand-in for `TavilySearch` returning scripted results."""
+
+    def __init__(self, ledger: LatencyLedger, latency: float = 0.0, max_results: int = 3):
+        self.ledger = ledger
+        self.latency = latency
+        self.max_results = max_results
+
+    def invoke(self, payload: Dict[str, Any]):
+        _sleep(self.ledger, self.latency, "web")
+        query = payload["query"]
+        return {
+            "query": query,
+            "results": [
+                {
+                    "title": f"Result {i} for {query}",
+                    "content": f"Scripted web content number {i} about {query}. " * 4,
+                    "url": f"https://example.com/{i}",
+                }
+                for i in range(self.max_results)
+            ],
+        }
+
+
+class FakePostgresDBManager:
+    """Stand-in for `PostgresDBManager` returning typed rows like psycopg2 would."""
+
+    columns = ["store_region", "category", "date", "units_sold", "revenue"]
+
+    def __init__(self, ledger: LatencyLedger, latency: float = 0.0, num_rows: int = 100):
+        self.ledger = ledger
+        self.latency = latency
+        self.num_rows = num_rows
+
+    def __call__(self, config=None):
+        return self
+
+    def rows(self):
+        regions = ["North", "South", "East"]
+        categories = ["Beverages", "Snacks", "Dairy", "Household", "Personal Care"]
+        start = datetime.date(2022, 1, 1)
+        return [
+            (
+                regions[i % 3],
+                categories[i % 5],
+                start + datetime.timedelta(days=i),
+                10 + i % 20,
+                Decimal(f"{(10 + i % 20) * (2 + i % 8)}.00"),
+            )
+            for i in range(self.num_rows)
+        ]
+
+    def _execute_query(self, query, params=None):
+        _sleep(self.ledger, self.latency, "sql")
+        return self.rows()
+
+    def read_data(self, query, params=None):
+        return self._execute_query(query, params)
+
+    def read_data_with_columns(self, query, params=None, max_rows=None):
+        rows = self._execute_query(query, params)
+        if max_rows is None:
+            return {"columns": list(self.columns), "rows": rows}
+        return {"columns": list(self.columns), "rows": rows[:max_rows], "truncated": len(rows) > max_rows}
+
+    def disconnect(self):
+        pass
+
+
+class FakeAzureSQLManager:
+    """In-memory chat history store with the `AzureSQLManager` interface used by the APIs."""
+
+    history: Dict[str, List[Tuple[str, str]]] = {}
+
+    def __init__(self, config=None):
+        pass
+
+    def get_chat_history(self, params):
+        session_id = params[0] if isinstance(params, (list, tuple)) else params
+        return list(self.history.get(session_id, []))
+
+    def insert_chat_history(self, params):
+        session_id, _, question, answer, _ = params
+        self.history.setdefault(session_id, []).append((question, answer))
+        return True
+
+    def get_chat_histories(self, session_ids):
+        return {sid: self.get_chat_history(sid) for sid in session_ids}
+
+    def insert_chat_history_bulk(self, rows):
+        for row in rows:
+            self.insert_chat_history(row)
+        return True
+
+    def disconnect(self):
+        pass
+
+
+class Scenario:
+    """Scripted decisions shared by the fake LLM roles for one benchmark route."""
+
+    def __init__(self, name: str, route: str, sufficient: bool = True, question: Optional[str] = None):
+        self.name = name
+        self.route = route
+        self.sufficient = sufficient
+        self.question = question or f"Benchmark question for the {name} route"
+
+    def router(self, messages) -> str:
+        reply = "Hello! How can I help you today?" if self.route == "end" else None
+        return json.dumps({"route": self.route, "reply": reply})
+
+    def judge(self, messages) -> str:
+        return json.dumps({"sufficient": self.sufficient})
+
+    def analyst(self, messages) -> str:
+        return json.dumps({
+            "sql": "SELECT store_region, category, date, units_sold, revenue "
+                   "FROM bronze.sales_data WHERE store_region = %s LIMIT 100",
+            "explanation": "Filters sales by region.",
+            "params": ["North"],
+        })
+
+    @staticmethod
+    def answer(messages) -> str:
+        return "Scripted answer summarising the provided context in a few sentences."
+
+    @staticmethod
+    def contextualise(messages) -> str:
+        return str(messages[-1].content)
+
+    def contextualise_route(self, messages) -> str:
+        decision = json.loads(self.router(messages))
+        return json.dumps({"standalone_question": str(messages[-1].content), **decision})
+
+
+SCENARIOS = [
+    Scenario("end", "end"),
+    Scenario("answer", "answer"),
+    Scenario("analyst", "analyst"),
+    Scenario("rag", "rag", sufficient=True),
+    Scenario("rag_web", "rag", sufficient=False),
+    # Exact identifier lookup that takes the lexical fast path and skips the embedding call.
+    Scenario("rag_lexical", "rag", question="What is the return window for SKU 105?"),
+]
@@ -0,0 +1,330 @@
+"""
+Ingestion throughput benchmark for the bronze sales pipeline.
+
+Loads synthetic sales rows into a scratch table of a local Postgres for every combination of
+row count, partition count and load mode, and reports generation time, load time, rows/sec
+and peak memory. Modes:
+
+    jdbc          generate_pyspark_data + write_table with Spark's JDBC defaults
+    jdbc_batched  same, with larger JDBC batches rewritten into multi-row INSERTs
+    copy          generate_pyspark_data + copy_table (COPY FROM STDIN per partition)
+    numpy         NumpySalesDataGenerator + COPY, no Spark (partition count does not apply)
+
+SparkSession start-up is measured separately: `cold` starts the JVM, `warm` recreates the
+session in the running JVM. Every run truncates the table first and checks the loaded row
+count afterwards.
+
+Connection settings come from the same environment as the API (POSTGRE_*, JDBC_URL and
+SPARK_JARS for the Postgres JDBC driver jar).
+
+Usage:
+    python -m benchmarks.ingest_throughput --rows 10000,100000 --partitions 1,4 \
+        --modes jdbc,jdbc_batched,copy,numpy --repeats 2 --json ingest.json
+"""
+import argparse
+import json
+import os
+import platform
+import threading
+import time
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from app.api.v1.spark.services import (
+    BRONZE_SALES_DDL,
+    SALES_COLUMNS,
+    NumpySalesDataGenerator,
+    PostgresSparkHelper,
+    dataframe_to_csv_buffer,
+    prefetch,
+)
+from db.connect import PostgreSQLDatabase
+
+MODES = ("jdbc", "jdbc_batched", "copy", "numpy")
+SPARK_MODES = ("jdbc", "jdbc_batched", "copy")
+
+
+class MemorySampler:
+    """
+    Samples the resident set size of this process and of its descendants (the Spark JVM and
+    Python workers) every `interval` seconds and keeps the peaks. Linux only; elsewhere the
+    peaks are None.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_self = None
+        self.peak_tree = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._supported = os.path.exists("/proc/self/status")
+
+    @staticmethod
+    def _rss_kib(pid: int) -> int:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    @staticmethod
+    def _children(pid: int) -> List[int]:
+        children = []
+        try:
+            for task in os.listdir(f"/proc/{pid}/task"):
+                with open(f"/proc/{pid}/task/{task}/children") as f:
+                    children.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+        return children
+
+    def _sample(self):
+        own = self._rss_kib(os.getpid())
+        total, pending = own, self._children(os.getpid())
+        while pending:
+            pid = pending.pop()
+            total += self._rss_kib(pid)
+            pending.extend(self._children(pid))
+        self.peak_self = max(self.peak_self or 0, own)
+        self.peak_tree = max(self.peak_tree or 0, total)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        if self._supported:
+            self._sample()
+            self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+
+    def report(self) -> Dict[str, Optional[float]]:
+        return {"peak_rss_mib": _mib(self.peak_self), "peak_rss_with_children_mib": _mib(self.peak_tree)}
+
+
+def _mib(kib: Optional[int]) -> Optional[float]:
+    return round(kib / 1024, 1) if kib is not None else None
+
+
+class IngestBenchmark:
+    def __init__(self, table: str, batch_size: int, chunk_size: int, master: str, seed: int):
+        load_dotenv()
+        self.table = table
+        self.schema_name, self.table_name = table.split(".", 1)
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.master = master
+        self.seed = seed
+        self.jdbc_url = os.getenv("JDBC_URL")
+        self.user = os.getenv("POSTGRE_USERNAME")
+        self.password = os.getenv("POSTGRE_PASSWORD")
+        self.db = PostgreSQLDatabase(
+            db_name=os.getenv("POSTGRE_DATABASE"),
+            user=self.user,
+            password=self.password,
+            host=os.getenv("POSTGRE_HOST_NAME"),
+            port=os.getenv("POSTGRE_PORT"),
+        )
+        self.spark = None
+
+    # ── Database helpers ─────────────────────────────────────────────
+    def setup(self):
+        self.db.connect()
+        if self.db.connection is None:
+            raise RuntimeError("Could not connect to Postgres; check the POSTGRE_* settings.")
+        script = f"CREATE SCHEMA IF NOT EXISTS {self.schema_name};\n{BRONZE_SALES_DDL.format(table=self.table)}"
+        if not self.db.execute_ddl_script(script):
+            raise RuntimeError(f"Could not create {self.table}.")
+
+    def _scalar(self, query: str):
+        with self.db.connection.cursor() as cursor:
+            cursor.execute(query)
+            value = cursor.fetchone()[0]
+        self.db.connection.commit()
+        return value
+
+    def truncate(self):
+        if not self.db.execute_ddl_script(f"TRUNCATE TABLE {self.table}"):
+            raise RuntimeError(f"Could not truncate {self.table}.")
+
+    def environment(self) -> Dict:
+        import pyspark
+
+        return {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "pyspark": pyspark.__version__,
+            "postgres": self._scalar("SHOW server_version"),
+            "spark_master": self.master,
+        }
+
+    # ── SparkSession ─────────────────────────────────────────────────
+    def _start_spark(self) -> float:
+        start = time.perf_counter()
+        self.spark = PostgresSparkHelper(app_name="IngestThroughputBenchmark", jdbc_url=self.jdbc_url,
+                                         user=self.user, password=self.password, master=self.master)
+        return time.perf_counter() - start
+
+    def measure_session_start(self) -> Dict[str, float]:
+        """Cold start (JVM launch + session) and warm start (new session in the running JVM)."""
+        cold = self._start_spark()
+        self.spark.stop_spark()
+        warm = self._start_spark()
+        return {"cold_s": round(cold, 3), "warm_s": round(warm, 3)}
+
+    # ── Load modes ───────────────────────────────────────────────────
+    def _run_spark(self, mode: str, rows: int, partitions: int) -> Dict[str, float]:
+        # Generation is materialised first so the load time covers only the write.
+        start = time.perf_counter()
+        df = self.spark.generate_pyspark_data(num_rows=rows).repartition(partitions).persist()
+        df.count()
+        generated = time.perf_counter()
+        try:
+            if mode == "copy":
+                self.spark.copy_table(df, self.schema_name, self.table_name)
+            elif mode == "jdbc_batched":
+                self.spark.write_table(df, self.schema_name, self.table_name, batch_size=self.batch_size,
+                                       num_partitions=partitions, rewrite_batched_inserts=True)
+            else:
+                self.spark.write_table(df, self.schema_name, self.table_name)
+        finally:
+            written = time.perf_counter()
+            df.unpersist()
+        return {"generate_s": generated - start, "write_s": written - generated}
+
+    def _run_numpy(self, rows: int) -> Dict[str, float]:
+        # Generation alone, then the pipelined generate + COPY load that the API runs.
+        start = time.perf_counter()
+        for df in NumpySalesDataGenerator(seed=self.seed).generate_chunks(rows, self.chunk_size):
+            dataframe_to_csv_buffer(df)
+        generated = time.perf_counter()
+        chunks = prefetch(dataframe_to_csv_buffer(df) for df in
+                          NumpySalesDataGenerator(seed=self.seed).generate_chunks(rows, self.chunk_size))
+        if self.db.copy_csv_chunks(self.table, SALES_COLUMNS, chunks) < 0:
+            raise RuntimeError(f"COPY into {self.table} failed")
+        loaded = time.perf_counter()
+        # COPY overlaps with generation; the write time is the part of the load not spent generating.
+        return {"generate_s": generated - start, "write_s": max(0.0, (loaded - generated) - (generated - start))}
+
+    def run(self, mode: str, rows: int, partitions: Optional[int], repeat: int) -> Dict:
+        self.truncate()
+        with MemorySampler() as memory:
+            start = time.perf_counter()
+            if mode == "numpy":
+                timings = self._run_numpy(rows)
+                load = time.perf_counter() - start - timings["generate_s"]
+            else:
+                timings = self._run_spark(mode, rows, partitions)
+                load = time.perf_counter() - start
+        loaded_rows = self._scalar(f"SELECT count(*) FROM {self.table}")
+        return {
+            "mode": mode,
+            "rows": rows,
+            "partitions": partitions,
+            "repeat": repeat,
+            "generate_s": round(timings["generate_s"], 3),
+            "write_s": round(timings["write_s"], 3),
+            "load_s": round(load, 3),
+            "rows_per_s": round(rows / load, 1) if load else None,
+            "loaded_rows": loaded_rows,
+            "verified": loaded_rows == rows,
+            **memory.report(),
+        }
+
+    def close(self):
+        if self.spark is not None:
+            self.spark.stop_spark()
+        self.db.close_connection()
+
+
+def run_benchmark(rows: List[int], partitions: List[int], modes: List[str], repeats: int, table: str,
+                  batch_size: int, chunk_size: int, master: str, seed: int) -> Dict:
+    bench = IngestBenchmark(table, batch_size, chunk_size, master, seed)
+    bench.setup()
+    results = {
+        "config": {"rows": rows, "partitions": partitions, "modes": modes, "repeats": repeats, "table": table,
+                   "jdbc_batch_size": batch_size, "numpy_chunk_size": chunk_size, "seed": seed},
+        "spark_session": None,
+        "runs": [],
+    }
+    try:
+        results["environment"] = bench.environment()
+        if any(mode in SPARK_MODES for mode in modes):
+            results["spark_session"] = bench.measure_session_start()
+        for num_rows in rows:
+            for mode in modes:
+                for num_partitions in (partitions if mode in SPARK_MODES else [None]):
+                    # The first repeat of each combination is the cold one (JIT, caches).
+                    for repeat in range(repeats):
+                        run = bench.run(mode, num_rows, num_partitions, repeat)
+                        results["runs"].append(run)
+                        print(f"{mode:<13} rows={num_rows:<9} partitions={str(num_partitions):<5} "
+                              f"repeat={repeat}  load={run['load_s']:.2f}s  {run['rows_per_s'] or 0:,.0f} rows/s"
+                              f"  verified={run['verified']}")
+    finally:
+        bench.close()
+    return results
+
+
+def print_report(results: Dict):
+    session = results.get("spark_session")
+    if session:
+        print(f"\nSparkSession start: cold={session['cold_s']:.2f}s warm={session['warm_s']:.2f}s")
+    print(f"\n{'mode':<13}{'rows':>10}{'parts':>7}{'rep':>5}{'gen s':>9}{'write s':>9}{'load s':>9}"
+          f"{'rows/s':>12}{'rss MiB':>10}{'+child MiB':>12}")
+    for run in results["runs"]:
+        print(f"{run['mode']:<13}{run['rows']:>10}{str(run['partitions'] or '-'):>7}{run['repeat']:>5}"
+              f"{run['generate_s']:>9.2f}{run['write_s']:>9.2f}{run['load_s']:>9.2f}"
+              f"{run['rows_per_s'] or 0:>12,.0f}{run['peak_rss_mib'] or 0:>10.1f}"
+              f"{run['peak_rss_with_children_mib'] or 0:>12.1f}")
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bronze ingestion throughput benchmark against a local Postgres.")
+    parser.add_argument("--rows", type=_int_list, default=[10_000, 100_000],
+                        help="Comma-separated row counts.")
+    parser.add_argument("--partitions", type=_int_list, default=[1, 4],
+                        help="Comma-separated Spark partition counts (Spark modes only).")
+    parser.add_argument("--modes", default=",".join(MODES),
+                        help=f"Comma-separated subset of {', '.join(MODES)}.")
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--table", default="bench.sales_data",
+                        help="Scratch table (schema.table); it is created if needed and truncated before each run.")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="JDBC batch size for jdbc_batched.")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="Rows per NumPy chunk.")
+    parser.add_argument("--master", default="local[*]", help="Spark master for the Spark modes.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the NumPy generator.")
+    parser.add_argument("--json", dest="json_path", help="Write machine-readable results to this path.")
+    args = parser.parse_args()
+
+    modes = [mode for mode in args.modes.split(",") if mode]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+
+    results = run_benchmark(args.rows, args.partitions, modes, args.repeats, args.table,
+                            args.batch_size, args.chunk_size, args.master, args.seed)
+    print_report(results)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
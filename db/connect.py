@@ -69,6 +69,42 @@ class PostgreSQLDatabase:
             self.connection.rollback()
             return False
     
+    def copy_csv_chunks(self, table, columns, chunks, truncate=False):
+        """
+        Streams CSV chunks into a table with COPY FROM STDIN, all in one transaction.
+
+        Parameters:
+        - table (str): Schema-qualified target table.
+        - columns (list): Target column names, in the order of the CSV fields.
+        - chunks (iterable): File-like CSV payloads (no header), loaded one at a time.
+        - truncate (bool): Empty the table first, in the same transaction, so readers keep
+          seeing the previous rows until the load commits and a failed load leaves them in place.
+
+        Returns:
+        - rows (int): Number of rows copied, or -1 if the load failed and was rolled back.
+        """
+
+        if not self.connection:
+            self.logger.warning("Database connection is not established. Call the `connect()` method first.")
+            return -1
+
+        copy_statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        rows = 0
+        try:
+            with self.connection.cursor() as cursor:
+                if truncate:
+                    cursor.execute(f"TRUNCATE TABLE {table}")
+                for chunk in chunks:
+                    cursor.copy_expert(copy_statement, chunk)
+                    rows += cursor.rowcount
+            self.connection.commit()
+            self.logger.info(f"Copied {rows} rows into {table}.")
+            return rows
+        except Exception as e:
+            self.logger.error(f"Error copying into {table}: {e}")
+            self.connection.rollback()
+            return -1
+
     def close_connection(self):
         """
         Closes the database connection.
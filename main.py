@@ -1,12 +1,52 @@
-from fastapi import FastAPI
-from app.api.v1.spark.apis import spark_router
-from app.api.v1.ai.chatbot_rag.apis import rag_router
-from app.api.v1.ai.agentic.apis import agentic_router
-from dotenv import load_dotenv
-        
+import logging
+from contextlib import asynccontextmanager
+from app.api.v1.utils.startup import startup_timer
+
+with startup_timer.phase("import_routers"):
+    from fastapi import FastAPI
+    from app.api.v1.spark.apis import spark_router
+    from app.api.v1.ai.chatbot_rag.apis import rag_router
+    from app.api.v1.ai.agentic.apis import agentic_router
+    from app.api.v1.utils.metrics import metrics_middleware, metrics_response
+    from app.api.v1.utils.session_lifecycle import get_session_lifecycle, start_session_sweeper
+    from app.api.v1.utils.document_parser import get_document_parser
+    from app.api.v1.utils.azure_sql_manager import apply_session_schema
+    from app.api.v1.utils.vector_db_manager import apply_search_index_schema
+    from app.api.v1.utils.config import Config
+    from fastapi.concurrency import run_in_threadpool
+    from dotenv import load_dotenv
+
 load_dotenv()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # LLM, Tavily and Spark clients are built on first use; log how long startup took.
+    if Config().session_schema_on_startup:
+        # Opt-in: normally a migration. Workers take turns through the schema's application lock.
+        try:
+            with startup_timer.phase("session_schema"):
+                await run_in_threadpool(apply_session_schema)
+        except Exception as e:
+            logging.error(f"Applying the session schema failed: {str(e)}")
+    if Config().search_index_schema_on_startup:
+        # Opt-in as well; adding fields that another worker has just added is a no-op.
+        try:
+            with startup_timer.phase("search_index_schema"):
+                await run_in_threadpool(apply_search_index_schema)
+        except Exception as e:
+            logging.error(f"Applying the search index schema failed: {str(e)}")
+    startup_timer.report()
+    sweeper = start_session_sweeper()
+    yield
+    if sweeper is not None:
+        sweeper.stop()
+    # Stops the parser worker processes; the pool is only started by the first upload.
+    get_document_parser().shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+app.middleware("http")(metrics_middleware)
 
 app.include_router(spark_router, tags=["spark"])
 app.include_router(rag_router, tags=["chatbot-rag"])
@@ -15,4 +55,20 @@ app.include_router(agentic_router, tags=["agentic-bot"])
 
 @app.get("/")
 def root():
-    return {"Hello": "World"}
\ No newline at end of file
+    return {"Hello": "World"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
+
+
+@app.get("/startup-report", include_in_schema=False)
+def startup_report():
+    return {name: round(seconds * 1000, 1) for name, seconds in startup_timer.phases.items()}
+
+
+@app.get("/session-gc-report", include_in_schema=False)
+def session_gc_report():
+    """Totals reclaimed by this worker's latest session GC sweep, or why it skipped it (empty before the first one)."""
+    return get_session_lifecycle().last_sweep
@@ -0,0 +1,162 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from app.api.v1.utils.admission import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    AdmissionController,
+    AdmissionTimeout,
+    AsyncAdmissionTransport,
+    AdmissionTransport,
+    DeploymentLimiter,
+    TokenBucket,
+    _retry_after,
+)
+from app.api.v1.utils.config import Config
+
+URL = "https://example.openai.azure.com/openai/deployments/gpt-4o/chat/completions"
+
+
+def make_limiter(**kwargs):
+    options = dict(rpm=0, tpm=0, initial=2, minimum=1, maximum=8, latency_target=10.0)
+    options.update(kwargs)
+    return DeploymentLimiter("test", **options)
+
+
+def test_token_bucket_refills_per_minute():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+    assert bucket.wait_time(60, now) == 0
+    bucket.consume(60)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 1.0) == 0
+    # A call larger than the budget waits for a full bucket instead of forever.
+    assert bucket.wait_time(500, now + 1.0) == pytest.approx(59.0)
+    assert TokenBucket(0).wait_time(10 ** 6, now) == 0
+
+
+def test_aimd_grows_additively_and_cuts_multiplicatively():
+    limiter = make_limiter(initial=4)
+    for _ in range(4):
+        limiter.acquire(1, PRIORITY_INTERACTIVE, timeout=1)
+        limiter.release(1, latency=0.1, throttled=False)
+    assert 4.9 < limiter.limit < 5.0
+
+    limiter.acquire(1, PRIORITY_INTERACTIVE, timeout=1)
+    limiter.release(1, latency=0.1, throttled=True)
+    assert limiter.limit == pytest.approx(4.9 * 0.7, rel=0.02)
+    # A burst of 429s from calls admitted together cuts the limit only once.
+    limit = limiter.limit
+    limiter.acquire(1, PRIORITY_INTERACTIVE, timeout=1)
+    limiter.release(1, latency=0.1, throttled=True, retry_after=0.05)
+    assert limiter.limit == limit
+    assert limiter.paused_until > time.monotonic()
+
+
+def test_full_limiter_times_out():
+    limiter = make_limiter(initial=1)
+    limiter.acquire(1, PRIORITY_INTERACTIVE, timeout=1)
+    with pytest.raises(AdmissionTimeout):
+        limiter.acquire(1, PRIORITY_INTERACTIVE, timeout=0.05)
+    limiter.release(1, latency=0.1, throttled=False)
+    limiter.acquire(1, PRIORITY_INTERACTIVE, timeout=0.05)
+
+
+def test_interactive_calls_are_admitted_before_queued_background_calls():
+    limiter = make_limiter(initial=1, maximum=1)
+    limiter.acquire(1, PRIORITY_INTERACTIVE, timeout=1)
+    order = []
+
+    def call(priority, label):
+        limiter.acquire(1, priority, timeout=5)
+        order.append(label)
+        limiter.release(1, latency=0.01, throttled=False)
+
+    background = threading.Thread(target=call, args=(PRIORITY_BACKGROUND, "background"))
+    background.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=call, args=(PRIORITY_INTERACTIVE, "interactive"))
+    interactive.start()
+    time.sleep(0.05)
+    limiter.release(1, latency=0.01, throttled=False)
+    background.join()
+    interactive.join()
+    assert order == ["interactive", "background"]
+
+
+def test_retry_after_headers():
+    request = httpx.Request("POST", "https://example.test/openai/deployments/gpt/chat/completions")
+    assert _retry_after(httpx.Response(429, headers={"retry-after-ms": "1500"}, request=request)) == 1.5
+    assert _retry_after(httpx.Response(429, headers={"retry-after": "3"}, request=request)) == 3.0
+    assert _retry_after(httpx.Response(429, request=request)) is None
+
+
+class EventStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    def __iter__(self):
+        yield b"data: [DONE]\n\n"
+
+    async def __aiter__(self):
+        yield b"data: [DONE]\n\n"
+
+
+def stream_response(request):
+    return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=EventStream())
+
+
+def test_streamed_response_holds_its_slot_until_closed():
+    controller = AdmissionController(Config())
+    client = httpx.Client(transport=AdmissionTransport(httpx.MockTransport(stream_response), controller))
+    limiter = controller.limiter("gpt-4o")
+    with client.stream("POST", URL, json={"stream": True}) as response:
+        assert limiter.in_flight == 1
+        # Reading to the end closes the stream.
+        assert list(response.iter_lines()) == ["data: [DONE]", ""]
+        assert limiter.in_flight == 0
+    with client.stream("POST", URL, json={"stream": True}) as response:
+        assert limiter.in_flight == 1
+    assert limiter.in_flight == 0
+
+
+def test_async_streamed_response_holds_its_slot_until_closed():
+    controller = AdmissionController(Config())
+    limiter = controller.limiter("gpt-4o")
+
+    async def call():
+        transport = AsyncAdmissionTransport(httpx.MockTransport(stream_response), controller)
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with client.stream("POST", URL, json={"stream": True}) as response:
+                assert limiter.in_flight == 1
+                await response.aread()
+            assert limiter.in_flight == 0
+
+    asyncio.run(call())
+
+
+def test_cancelled_async_call_gives_back_the_slot_it_was_queued_for(monkeypatch):
+    monkeypatch.setenv("LLM_CONCURRENCY_INITIAL", "1")
+    controller = AdmissionController(Config())
+    limiter = controller.limiter("gpt-4o")
+    limiter.acquire(1, PRIORITY_INTERACTIVE, timeout=1)
+
+    async def call():
+        transport = AsyncAdmissionTransport(httpx.MockTransport(stream_response), controller)
+        async with httpx.AsyncClient(transport=transport) as client:
+            task = asyncio.create_task(client.post(URL, json={}))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        # The queued worker thread is admitted once the slot frees up, and hands it straight back.
+        limiter.release(1, latency=0.01, throttled=False)
+        for _ in range(200):
+            if not (limiter.in_flight or limiter._queue):
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(call())
+    assert limiter.in_flight == 0
+    limiter.acquire(1, PRIORITY_INTERACTIVE, timeout=0.1)
@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from langchain_core.messages import HumanMessage
+from pydantic import BaseModel
+
+from benchmarks.fakes import SCENARIOS, FakeChatModel, FakeEmbeddings, FakeSearchStore, LatencyLedger
+
+
+class Verdict(BaseModel):
+    sufficient: bool
+
+
+def test_fake_chat_model_scripts_replies_and_records_latency():
+    ledger = LatencyLedger()
+    model = FakeChatModel(label="judge", script=lambda messages: '{"sufficient": true}', latency=0.01, ledger=ledger)
+    assert model.with_structured_output(Verdict).invoke([HumanMessage(content="enough?")]) == Verdict(sufficient=True)
+    assert ledger.snapshot()["judge"] >= 0.01
+    ledger.reset()
+    assert ledger.snapshot() == {}
+
+
+def test_fake_search_store_is_deterministic_and_honours_the_session_filter():
+    ledger = LatencyLedger()
+    embeddings = FakeEmbeddings(ledger)
+    assert embeddings.embed_query("Revenue") == embeddings.embed_query("revenue")
+    store = FakeSearchStore(embeddings, ledger)
+    store.add_texts(["revenue by region", "return policy"], metadatas=[{"session_id": "a"}, {"session_id": "b"}])
+    results = store.similarity_search_with_relevance_scores("revenue by region", k=5, filters="session_id eq 'a'")
+    assert [doc.page_content for doc, _ in results] == ["revenue by region"]
+    assert results[0][1] == 1.0
+
+
+def test_benchmark_runs_every_route(tmp_path):
+    pytest.importorskip("pyodbc", reason="pyodbc needs the ODBC driver manager (libodbc)", exc_type=ImportError)
+    # A separate process: the benchmark installs its fakes into the application modules.
+    path = tmp_path / "bench.json"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    subprocess.run([sys.executable, "-m", "benchmarks.agent_latency", "--iterations", "1", "--warmup", "0",
+                    "--skip-endpoint", "--json", str(path)], check=True, env=env, capture_output=True, timeout=300)
+    graph = json.loads(path.read_text())["graph"]
+    assert set(graph) == {scenario.name for scenario in SCENARIOS}
+    assert list(graph["end"]["nodes"]) == ["router"]
+    assert "analyst" in graph["analyst"]["nodes"]
+    assert "web_search" in graph["rag_web"]["nodes"]
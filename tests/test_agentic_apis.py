@@ -0,0 +1,82 @@
+import pytest
+
+pytest.importorskip("pyodbc", reason="pyodbc needs the ODBC driver manager (libodbc)", exc_type=ImportError)
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.ai.agentic import apis
+from app.api.v1.utils.utils import encode_cursor
+
+# (user_query, bot_response, created_at text, id), oldest first; two turns share a timestamp.
+HISTORY = [(f"q{i}", f"a{i}", f"2024-05-01T10:00:0{min(i, 3)}.1234567", i) for i in range(1, 6)]
+# (session_id, first_question, turn_count, last_activity text) of user u1.
+SESSIONS = [(f"s{i}", f"first {i}", i, f"2024-05-0{i}T09:00:00") for i in range(1, 6)]
+
+
+class FakeAzureSQLManager:
+    def __init__(self, config):
+        pass
+
+    def get_chat_history_page(self, session_id, limit, cursor=None):
+        rows = sorted(HISTORY, key=lambda r: (r[2], r[3]), reverse=True)
+        if cursor:
+            rows = [r for r in rows if (r[2], r[3]) < tuple(cursor)]
+        return rows[:limit]
+
+    def get_sessions_page(self, user_id, limit, cursor=None):
+        rows = sorted(SESSIONS, key=lambda r: (r[3], r[0]), reverse=True)
+        if cursor:
+            rows = [r for r in rows if (r[3], r[0]) < tuple(cursor)]
+        return rows[:limit]
+
+    def disconnect(self):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(apis, "AzureSQLManager", FakeAzureSQLManager)
+    app = FastAPI()
+    app.include_router(apis.agentic_router)
+    return TestClient(app)
+
+
+def test_chat_history_pages_follow_the_cursor(client):
+    pages, cursor = [], None
+    while True:
+        params = {"session_id": "s1", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/agentic/get-chat-history", params=params).json()
+        pages.append([m["human"] for m in body["messages"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    # Each page is chronological; pages go back in time without gaps or repeats.
+    assert pages == [["q4", "q5"], ["q2", "q3"], ["q1"]]
+
+
+def test_session_listing_returns_the_cursor_in_a_header(client):
+    first = client.get("/agentic/all-session-ids", params={"user_id": "u1", "limit": 3})
+    assert [s["session_id"] for s in first.json()] == ["s5", "s4", "s3"]
+    second = client.get("/agentic/all-session-ids",
+                        params={"user_id": "u1", "limit": 3, "cursor": first.headers["X-Next-Cursor"]})
+    assert [s["session_id"] for s in second.json()] == ["s2", "s1"]
+    assert "X-Next-Cursor" not in second.headers
+
+
+HISTORY_PAGE = ("/agentic/get-chat-history", {"session_id": "s1"})
+SESSIONS_PAGE = ("/agentic/all-session-ids", {"user_id": "u1"})
+
+
+@pytest.mark.parametrize("page, cursor", [
+    (HISTORY_PAGE, "not-a-cursor"),
+    (HISTORY_PAGE, encode_cursor(("2024-05-01T10:00:00", "7; DROP TABLE x"))),
+    (HISTORY_PAGE, encode_cursor(("yesterday", 3))),
+    (HISTORY_PAGE, encode_cursor(("2024-05-01T10:00:00", True))),
+    (SESSIONS_PAGE, encode_cursor(("2024-05-01T10:00:00", 5))),
+    (SESSIONS_PAGE, encode_cursor(("2024-05-01T10:00:00", "s1", "extra"))),
+    (SESSIONS_PAGE, encode_cursor([["2024-05-01T10:00:00"], "s1"])),
+])
+def test_forged_cursors_are_rejected(client, page, cursor):
+    path, params = page
+    assert client.get(path, params={**params, "cursor": cursor}).status_code == 400
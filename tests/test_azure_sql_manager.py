@@ -0,0 +1,113 @@
+import pytest
+
+pytest.importorskip("pyodbc", reason="pyodbc needs the ODBC driver manager (libodbc)", exc_type=ImportError)
+
+from app.api.v1.utils.azure_sql_manager import SESSION_SCHEMA, AzureSQLManager, apply_session_schema
+from app.api.v1.utils.config import Config
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        self.connection.executed.append((" ".join(query.split()), list(params or [])))
+        self.rowcount = 2 if "DELETE FROM dbo.chat_history " in query else 1
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.executed = []
+        self.committed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_connect(monkeypatch):
+    connections = []
+
+    def connect(self):
+        self.connection = FakeConnection()
+        connections.append(self.connection)
+
+    monkeypatch.setattr(AzureSQLManager, "connect", connect)
+    return connections
+
+
+def test_purge_sessions_connects_on_a_fresh_manager(fake_connect):
+    removed = AzureSQLManager(Config()).purge_sessions(["s1", "s2"], archive=True)
+
+    assert removed == 2
+    (connection,) = fake_connect
+    assert connection.committed
+    statements = [query for query, _ in connection.executed]
+    assert statements[0].startswith("INSERT INTO dbo.chat_history_archive")
+    assert [q.split(" WHERE")[0] for q in statements[1:]] == [
+        "DELETE FROM dbo.chat_history",
+        "IF OBJECT_ID('dbo.sessions', 'U') IS NOT NULL DELETE FROM dbo.sessions",
+        "DELETE FROM dbo.file_metadata",
+    ]
+    assert all(params == ["s1", "s2"] for _, params in connection.executed)
+
+
+def test_purge_sessions_without_archive_only_deletes(fake_connect):
+    AzureSQLManager(Config()).purge_sessions(["s1"], archive=False)
+
+    assert not any("archive" in query for query, _ in fake_connect[0].executed)
+
+
+def test_session_schema_is_applied_once_and_not_by_requests(fake_connect):
+    apply_session_schema()
+    (connection,) = fake_connect
+    assert len(connection.executed) == len(SESSION_SCHEMA)
+    assert connection.committed
+
+    manager = AzureSQLManager(Config())
+    manager.get_sessions_page("u1", 10)
+    manager.purge_sessions(["s1"], archive=False)
+    assert not any(word in query for c in fake_connect[1:] for query, _ in c.executed
+                   for word in ("CREATE ", "ALTER ", "sp_getapplock"))
+
+
+def test_session_schema_runs_under_an_application_lock(fake_connect):
+    apply_session_schema()
+    first = fake_connect[0].executed[0][0]
+    assert "sp_getapplock" in first and "@LockOwner = 'Transaction'" in first
+
+
+def test_chat_turn_is_stored_before_the_sessions_table_exists(fake_connect):
+    assert AzureSQLManager(Config()).insert_chat_history(("s1", "u1", "hi", "hello", "u1"))
+    query, params = fake_connect[0].executed[0]
+    assert query.index("INSERT INTO dbo.chat_history") < query.index("IF OBJECT_ID('dbo.sessions', 'U') IS NOT NULL MERGE")
+    assert params == ["s1", "u1", "hi", "hello", "u1", "s1", "u1", "hi", 1]
+
+
+def test_sweep_lock_is_taken_without_waiting_and_released(fake_connect, monkeypatch):
+    manager = AzureSQLManager(Config())
+    monkeypatch.setattr(FakeCursor, "fetchall", lambda self: [(0,)])
+    assert manager.try_app_lock("session gc sweep")
+    manager.release_app_lock("session gc sweep")
+    (take, _), (release, params) = fake_connect[0].executed
+    assert "@LockOwner = 'Session'" in take and "@LockTimeout = 0" in take
+    assert release.startswith("EXEC sp_releaseapplock") and params == ["session gc sweep"]
+
+    monkeypatch.setattr(FakeCursor, "fetchall", lambda self: [(-1,)])
+    assert not manager.try_app_lock("session gc sweep")
@@ -0,0 +1,44 @@
+from app.api.v1.utils import cache
+from app.api.v1.utils.cache import DiskCache, TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    store = TTLCache("test", maxsize=10, ttl=5)
+    store.set("a", 1)
+    store.set("b", 2, ttl=60)
+    clock.now += 6
+    assert store.get("a") is None
+    assert "a" not in store
+    assert store.get("b") == 2
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    store = TTLCache("test", maxsize=2)
+    store.set("a", 1)
+    store.set("b", 2)
+    assert store.get("a") == 1
+    store.set("c", 3)
+    assert len(store) == 2
+    assert store.get("b", "missing") == "missing"
+    assert (store.get("a"), store.get("c")) == (1, 3)
+    assert store.pop("a") == 1
+    assert "a" not in store
+
+
+def test_disk_cache_is_shared_between_instances(tmp_path):
+    DiskCache("test", str(tmp_path)).set(("q", 1), {"answer": 42})
+    other = DiskCache("test", str(tmp_path))
+    assert other.get(("q", 1)) == {"answer": 42}
+    other.set("old", "x", ttl=-1)
+    assert other.get("old") is None
+    assert other.purge_expired() == 0
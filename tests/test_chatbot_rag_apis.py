@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("pyodbc", reason="pyodbc needs the ODBC driver manager (libodbc)", exc_type=ImportError)
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.ai.chatbot_rag import apis
+from app.api.v1.ai.chatbot_rag.apis import _save_upload
+from app.api.v1.utils.document_parser import DocumentParseError
+
+
+class FakeUpload:
+    def __init__(self, data: bytes, chunk: int = 4):
+        self.data = data
+        self.chunk = chunk
+
+    async def read(self, size: int) -> bytes:
+        chunk, self.data = self.data[:self.chunk], self.data[self.chunk:]
+        return chunk
+
+
+def test_save_upload_writes_the_file(tmp_path):
+    path = tmp_path / "notes.txt"
+    asyncio.run(_save_upload(FakeUpload(b"hello world"), str(path), max_bytes=100))
+    assert path.read_bytes() == b"hello world"
+
+
+def test_oversized_upload_leaves_no_partial_file(tmp_path):
+    path = tmp_path / "big.txt"
+    with pytest.raises(DocumentParseError):
+        asyncio.run(_save_upload(FakeUpload(b"x" * 20), str(path), max_bytes=10))
+    assert not path.exists()
+
+
+class FailingParser:
+    async def parse(self, path):
+        raise DocumentParseError("No text could be extracted.")
+
+
+def test_file_that_fails_to_parse_is_removed(tmp_path, monkeypatch):
+    monkeypatch.setenv("UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(apis, "get_document_parser", FailingParser)
+    app = FastAPI()
+    app.include_router(apis.rag_router)
+
+    response = TestClient(app).post("/chatbot-rag/file-upload", params={"session_id": "s1", "user_id": "u1"},
+                                    files={"files": ("empty.txt", b"   ")})
+    assert response.json()["failed_files"] == [{"file": "empty.txt", "error": "No text could be extracted."}]
+    assert list((tmp_path / "s1").iterdir()) == []
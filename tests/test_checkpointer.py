@@ -0,0 +1,109 @@
+import operator
+from typing import Annotated, List, TypedDict
+
+import pytest
+from langgraph.graph import END, START, StateGraph
+
+from app.api.v1.utils import checkpointer
+from app.api.v1.utils.checkpointer import delete_checkpoints, latest_state, prune_checkpoints, thread_config
+
+
+class State(TypedDict):
+    turns: Annotated[List[str], operator.add]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def agent(request, monkeypatch, tmp_path):
+    monkeypatch.setenv("AGENT_CHECKPOINTER", request.param)
+    monkeypatch.setenv("AGENT_CHECKPOINT_PATH", str(tmp_path / "checkpoints.sqlite"))
+    checkpointer.get_checkpointer.cache_clear()
+    graph = StateGraph(State)
+    graph.add_node("turn", lambda state: {})
+    graph.add_edge(START, "turn")
+    graph.add_edge("turn", END)
+    yield graph.compile(checkpointer=checkpointer.get_checkpointer())
+    checkpointer.get_checkpointer.cache_clear()
+
+
+def checkpoint_count(agent, session_id):
+    return len(list(agent.get_state_history(thread_config(session_id))))
+
+
+def test_turns_resume_from_the_latest_checkpoint(agent):
+    assert latest_state(agent, "s1") is None
+    agent.invoke({"turns": ["first"]}, thread_config("s1"))
+    agent.invoke({"turns": ["second"]}, thread_config("s1"))
+    assert latest_state(agent, "s1") == {"turns": ["first", "second"]}
+    assert latest_state(agent, "s2") is None
+
+
+def test_prune_keeps_the_latest_state_and_delete_removes_it(agent):
+    for turn in ("first", "second", "third"):
+        agent.invoke({"turns": [turn]}, thread_config("s1"))
+    assert checkpoint_count(agent, "s1") > 1
+
+    prune_checkpoints("s1", keep=1)
+    assert checkpoint_count(agent, "s1") == 1
+    assert latest_state(agent, "s1") == {"turns": ["first", "second", "third"]}
+
+    delete_checkpoints("s1")
+    assert latest_state(agent, "s1") is None
+
+
+def test_checkpointing_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("AGENT_CHECKPOINTER", "none")
+    checkpointer.get_checkpointer.cache_clear()
+    try:
+        assert checkpointer.get_checkpointer() is None
+        prune_checkpoints("s1", keep=1)
+        delete_checkpoints("s1")
+    finally:
+        checkpointer.get_checkpointer.cache_clear()
+
+
+class PublicSaver:
+    """Exposes only the public checkpointer API, like a backend whose storage is opaque."""
+
+    def __init__(self, saver):
+        self._saver = saver
+        self.deleted = 0
+
+    def __getattr__(self, name):
+        if name not in ("list", "get_tuple", "put", "put_writes", "get_next_version", "serde", "config_specs"):
+            raise AttributeError(name)
+        return getattr(self._saver, name)
+
+    def delete_thread(self, thread_id):
+        self.deleted += 1
+        self._saver.delete_thread(thread_id)
+
+
+def test_prune_uses_only_the_public_saver_api(monkeypatch):
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    saver = PublicSaver(InMemorySaver())
+    monkeypatch.setattr(checkpointer, "get_checkpointer", lambda: saver)
+    graph = StateGraph(State)
+    graph.add_node("turn", lambda state: {})
+    graph.add_edge(START, "turn")
+    graph.add_edge("turn", END)
+    agent = graph.compile(checkpointer=saver)
+    for turn in ("first", "second", "third"):
+        agent.invoke({"turns": [turn]}, thread_config("s1"))
+    agent.invoke({"turns": ["other"]}, thread_config("s2"))
+    history = list(agent.get_state_history(thread_config("s1")))
+    latest = saver.get_tuple(thread_config("s1"))
+    saver.put_writes(latest.config, [("turns", ["pending"])], "task-1")
+
+    prune_checkpoints("s1", keep=2)
+    kept = list(agent.get_state_history(thread_config("s1")))
+    ids = [snapshot.config["configurable"]["checkpoint_id"] for snapshot in kept]
+    assert ids == [snapshot.config["configurable"]["checkpoint_id"] for snapshot in history[:2]]
+    assert kept[0].parent_config["configurable"]["checkpoint_id"] == ids[1]
+    assert kept[0].values == {"turns": ["first", "second", "third"]}
+    assert saver.get_tuple(thread_config("s1")).pending_writes == [("task-1", "turns", ["pending"])]
+    assert latest_state(agent, "s2") == {"turns": ["other"]}
+
+    # Nothing to prune: the thread is left alone.
+    prune_checkpoints("s1", keep=2)
+    assert saver.deleted == 1
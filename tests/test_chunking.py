@@ -0,0 +1,38 @@
+import random
+
+from app.api.v1.utils.chunking import chunk_hash, content_defined_chunks
+
+
+def make_text(seed: int, words: int = 3000) -> str:
+    rng = random.Random(seed)
+    vocabulary = ["revenue", "region", "quarter", "contract", "clause", "payment", "supplier", "delivery",
+                  "warranty", "invoice", "north", "south", "total", "margin", "forecast", "report"]
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+
+def test_chunks_respect_size_bounds_and_hash_their_text():
+    chunks = content_defined_chunks(make_text(1), min_chars=500, max_chars=1500, overlap_chars=0)
+    assert len(chunks) > 5
+    for text, digest in chunks[:-1]:
+        assert 500 <= len(text) <= 1500
+        assert digest == chunk_hash(text)
+    assert " ".join(text for text, _ in chunks) == make_text(1)
+
+
+def test_an_edit_only_changes_the_chunks_around_it():
+    text = make_text(2)
+    middle = len(text) // 2
+    edited = text[:middle] + " an inserted sentence about a late supplier payment " + text[middle:]
+    before = {digest for _, digest in content_defined_chunks(text)}
+    after = [digest for _, digest in content_defined_chunks(edited)]
+    changed = [digest for digest in after if digest not in before]
+    assert 1 <= len(changed) <= 3
+    assert len(after) - len(changed) >= len(before) - 3
+
+
+def test_overlap_prefixes_the_tail_of_the_previous_chunk():
+    first, second = content_defined_chunks(make_text(3, words=400), min_chars=500, max_chars=1500,
+                                           overlap_chars=50)[:2]
+    tail = first[0][-50:]
+    assert second[0].startswith(tail[tail.find(" ") + 1:] + " ")
+    assert content_defined_chunks("short text") == [("short text", chunk_hash("short text"))]
@@ -0,0 +1,38 @@
+import datetime
+import io
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from app.api.v1.utils.columnar import csv_chunks, parquet_chunks, rows_to_numpy
+
+COLUMNS = [("region", 25), ("orders", 20), ("revenue", 1700), ("day", 1082)]
+BATCHES = [
+    (COLUMNS, [("North", 3, Decimal("10.5"), datetime.date(2024, 1, 1)), ("South", None, None, None)]),
+    (COLUMNS, [("East", 1, Decimal("2"), datetime.date(2024, 1, 2))]),
+]
+
+
+def test_rows_to_numpy_types_columns_and_handles_nulls():
+    arrays = rows_to_numpy(*BATCHES[0])
+    assert arrays["region"].dtype == object
+    assert arrays["orders"].dtype == np.float64 and np.isnan(arrays["orders"][1])
+    assert arrays["revenue"].tolist()[0] == 10.5
+    assert arrays["day"].dtype == np.dtype("datetime64[D]") and np.isnat(arrays["day"][1])
+    assert rows_to_numpy(*BATCHES[1])["orders"].dtype == np.int64
+
+
+def test_csv_chunks_write_one_header_and_a_chunk_per_batch():
+    chunks = list(csv_chunks(iter(BATCHES)))
+    assert len(chunks) == 2
+    assert b"".join(chunks).decode().splitlines() == [
+        "region,orders,revenue,day", "North,3,10.5,2024-01-01", "South,,,", "East,1,2.0,2024-01-02",
+    ]
+
+
+def test_parquet_chunks_stream_a_readable_file():
+    pq = pytest.importorskip("pyarrow.parquet")
+    table = pq.read_table(io.BytesIO(b"".join(parquet_chunks(iter(BATCHES)))))
+    assert table.column("region").to_pylist() == ["North", "South", "East"]
+    assert table.column("revenue").to_pylist() == [10.5, None, 2.0]
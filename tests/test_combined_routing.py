@@ -0,0 +1,74 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.api.v1.utils import langchain_utils, nodes
+from app.api.v1.utils.shared import ContextualRouteModel, RouteDecisionModel
+from benchmarks.fakes import FakeChatModel, LatencyLedger
+
+
+class FakeLLMManager:
+    seen = []
+
+    def __init__(self, config, temperature=0, role="default"):
+        self.role = role
+
+    def connect(self):
+        def script(messages):
+            FakeLLMManager.seen.append(messages)
+            return '{"standalone_question": "What was revenue in 2023?", "route": "analyst", "reply": null}'
+        return FakeChatModel(label=self.role, script=script, ledger=LatencyLedger())
+
+
+@pytest.fixture
+def route_chain(monkeypatch):
+    monkeypatch.setattr(langchain_utils, "LLMManager", FakeLLMManager)
+    FakeLLMManager.seen = []
+    langchain_utils.get_contextualise_route_chain.cache_clear()
+    yield langchain_utils.get_contextualise_route_chain()
+    langchain_utils.get_contextualise_route_chain.cache_clear()
+
+
+def test_one_call_returns_question_and_route(route_chain):
+    history = [HumanMessage(content="Show revenue for 2022"), AIMessage(content="It was 1.2M.")]
+    result = route_chain.invoke({"chat_history": history, "input": "and for 2023?"})
+    assert result == ContextualRouteModel(standalone_question="What was revenue in 2023?", route="analyst")
+    messages = FakeLLMManager.seen[0]
+    # Routing rules in the system prompt, then the history, then the latest message.
+    assert "route" in messages[0].content
+    assert [m.content for m in messages[1:]] == ["Show revenue for 2022", "It was 1.2M.", "and for 2023?"]
+
+
+def test_router_node_uses_the_preset_route_without_the_router_llm(monkeypatch):
+    def no_router():
+        raise AssertionError("router LLM called")
+
+    monkeypatch.setattr(nodes, "get_router_llm", no_router)
+    messages = [HumanMessage(content="hi")]
+    out = nodes.router_node({"messages": messages, "preset_route": {"route": "end", "reply": "Hello there!"}})
+    assert out["route"] == "end"
+    assert out["messages"][-1].content == "Hello there!"
+
+    assert nodes.router_node({"messages": messages, "preset_route": {"route": "rag", "reply": None}})["route"] == "rag"
+
+
+def test_router_node_calls_the_router_llm_without_a_preset(monkeypatch):
+    calls = []
+
+    class Router:
+        def invoke(self, messages):
+            calls.append(messages)
+            return RouteDecisionModel(route="answer")
+
+    monkeypatch.setattr(nodes, "get_router_llm", lambda: Router())
+    out = nodes.router_node({"messages": [HumanMessage(content="Explain churn")], "preset_route": None})
+    assert out["route"] == "answer"
+    assert len(calls) == 1
+
+
+def test_split_contextualised():
+    pytest.importorskip("pyodbc", reason="pyodbc needs the ODBC driver manager (libodbc)", exc_type=ImportError)
+    from app.api.v1.ai.agentic.apis import split_contextualised
+
+    routed = ContextualRouteModel(standalone_question="Hi?", route="end", reply="Hello!")
+    assert split_contextualised(routed) == ("Hi?", {"route": "end", "reply": "Hello!"})
+    assert split_contextualised("What is churn?") == ("What is churn?", None)
@@ -0,0 +1,55 @@
+import datetime
+from decimal import Decimal
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.api.v1.utils.context_packing import build_answer_context, pack_chunks, render_sql_result, trim_history
+from app.api.v1.utils.tokens import count_tokens, truncate_to_tokens
+
+
+def test_sql_result_is_rendered_as_a_typed_table_with_summaries():
+    result = {
+        "columns": ["region", "revenue", "day"],
+        "rows": [("North", Decimal("1200.50"), datetime.date(2024, 1, 1)),
+                 ("South", Decimal("800"), datetime.date(2024, 1, 3)),
+                 ("East", None, datetime.date(2024, 1, 2))],
+        "truncated": False,
+    }
+    lines = render_sql_result(result, max_rows=2).splitlines()
+    assert lines[0] == "region:text | revenue:num | day:date"
+    assert lines[1] == "North | 1200.5 | 2024-01-01"
+    assert lines[3] == "… 1 more rows omitted (3 total)"
+    assert "revenue: sum=2000.5 mean=1000.25 min=800 max=1200.5" in lines[4]
+    assert "day: 2024-01-01 .. 2024-01-03" in lines[4]
+    assert render_sql_result({"columns": ["a"], "rows": []}) == "Query returned no rows."
+    assert render_sql_result("Failed") == "Failed"
+
+
+def test_pack_chunks_drops_duplicates_and_overlap_and_respects_the_budget():
+    first = "The supplier must deliver within thirty days of the purchase order date."
+    repeated_tail = "within thirty days of the purchase order date. Late deliveries incur a penalty of two percent."
+    chunks, used = pack_chunks([first, "  the SUPPLIER must deliver within thirty days of the purchase order date. ",
+                                "supplier must deliver", repeated_tail], budget_tokens=1000)
+    assert chunks == [first, "Late deliveries incur a penalty of two percent."]
+    assert used == sum(count_tokens(c) for c in chunks)
+
+    long_chunks, used = pack_chunks(["word " * 500, "another chunk"], budget_tokens=50)
+    assert len(long_chunks) == 1 and used <= 50
+    assert long_chunks[0].endswith(" …")
+
+
+def test_trim_history_keeps_the_latest_messages_within_budget():
+    messages = [HumanMessage(content="old question " * 50), AIMessage(content="old answer " * 50),
+                HumanMessage(content="recent question"), AIMessage(content="recent answer")]
+    assert trim_history(messages, budget_tokens=30) == messages[2:]
+    assert trim_history(messages[:1], budget_tokens=1) == messages[:1]
+
+
+def test_answer_context_splits_the_budget_between_documents_and_web():
+    state = {"rag": ["chunk " * 400], "web": "web " * 400}
+    context = build_answer_context(state, context_budget=200, max_table_rows=10)
+    assert context.startswith("Knowledge Base Information:\n")
+    assert "\n\nWeb Search Results:\n" in context
+    assert count_tokens(context) <= 230
+    assert truncate_to_tokens("short", 10) == "short"
+    assert build_answer_context({}, 100, 10) == "No external context available."
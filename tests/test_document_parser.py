@@ -0,0 +1,116 @@
+import asyncio
+import zipfile
+from concurrent.futures import Future
+
+import pytest
+
+from app.api.v1.utils import document_parser
+from app.api.v1.utils.config import Config
+from app.api.v1.utils.document_parser import (
+    DocumentParseError,
+    DocumentParserPool,
+    _decode,
+    parse_file,
+    sniff_format,
+)
+
+LIMITS = {"max_text_chars": 1000, "max_pdf_pages": 10, "max_docx_bytes": 10_000, "max_docx_entries": 5}
+
+DOCUMENT_XML = (
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    "<w:body><w:p><w:r><w:t>{}</w:t></w:r></w:p></w:body></w:document>"
+)
+
+
+def write_docx(path, text, extra_parts=()):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("word/document.xml", DOCUMENT_XML.format(text))
+        for name, data in extra_parts:
+            archive.writestr(name, data)
+    return str(path)
+
+
+def test_sniffs_format_from_content(tmp_path):
+    pdf = tmp_path / "report.txt"
+    pdf.write_bytes(b"%PDF-1.7\n...")
+    assert sniff_format(str(pdf)) == "pdf"
+
+    notes = tmp_path / "notes.md"
+    notes.write_text("# Notes\n")
+    assert sniff_format(str(notes)) == "md"
+
+    data = tmp_path / "export.dat"
+    data.write_text("region;revenue\nNorth;10\nSouth;12\n")
+    assert sniff_format(str(data)) == "csv"
+
+
+def test_rejects_disguised_files(tmp_path):
+    fake_docx = tmp_path / "contract.docx"
+    with zipfile.ZipFile(fake_docx, "w") as archive:
+        archive.writestr("payload.bin", "x")
+    with pytest.raises(DocumentParseError):
+        sniff_format(str(fake_docx))
+
+    binary = tmp_path / "image.txt"
+    binary.write_bytes(b"\x89PNG\r\n\x1a\n\x00\x00")
+    with pytest.raises(DocumentParseError):
+        sniff_format(str(binary))
+
+
+def test_decodes_legacy_encodings():
+    assert _decode("Grüße".encode("utf-8")) == "Grüße"
+    assert _decode("Café crème brûlée, déjà vu".encode("cp1252")) == "Café crème brûlée, déjà vu"
+
+
+def test_parse_enforces_text_limit(tmp_path):
+    path = tmp_path / "long.txt"
+    path.write_text("word " * 400)
+    with pytest.raises(DocumentParseError):
+        parse_file(str(path), LIMITS)
+    path.write_text("short text")
+    assert parse_file(str(path), LIMITS).strip() == "short text"
+
+
+def test_docx_is_parsed_within_its_expansion_limits(tmp_path):
+    assert parse_file(write_docx(tmp_path / "memo.docx", "Quarterly memo"), LIMITS) == "Quarterly memo"
+
+    # Compresses to a few bytes but expands beyond the limit.
+    bomb = write_docx(tmp_path / "bomb.docx", "x", [("word/media/blank.bin", b"\x00" * 20_000)])
+    with pytest.raises(DocumentParseError, match="expands beyond"):
+        parse_file(bomb, LIMITS)
+
+    parts = [(f"word/media/image{i}.png", b"") for i in range(5)]
+    with pytest.raises(DocumentParseError, match="parts"):
+        parse_file(write_docx(tmp_path / "many.docx", "x", parts), LIMITS)
+
+
+class StuckExecutor:
+    """Stands in for a process pool whose worker hangs on the file."""
+
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        self.shutdown_calls = []
+        StuckExecutor.instances.append(self)
+
+    def submit(self, fn, *args):
+        return Future()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shutdown_calls.append((wait, cancel_futures))
+
+
+def test_timed_out_parse_retires_the_pool(tmp_path, monkeypatch):
+    monkeypatch.setenv("PARSER_TIMEOUT", "0.05")
+    monkeypatch.setattr(document_parser, "ProcessPoolExecutor", StuckExecutor)
+    StuckExecutor.instances = []
+    path = tmp_path / "slow.txt"
+    path.write_text("text")
+    pool = DocumentParserPool(Config())
+
+    with pytest.raises(DocumentParseError, match="timed out"):
+        asyncio.run(pool.parse(str(path)))
+    (retired,) = StuckExecutor.instances
+    assert retired.shutdown_calls == [(False, True)]
+    # The next file gets a fresh pool.
+    assert pool._pool() is not retired
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from app.api.v1.utils.hedging import HedgedRunnable, latency_window
+
+
+def deployment(answer, delay=0.0, error=None):
+    def call(_):
+        time.sleep(delay)
+        if error:
+            raise error
+        return answer
+
+    return RunnableLambda(call)
+
+
+@pytest.fixture
+def hedge_env(monkeypatch):
+    monkeypatch.setenv("LLM_HEDGE_ENABLED", "true")
+    monkeypatch.setenv("LLM_HEDGE_MIN_SAMPLES", "3")
+    monkeypatch.setenv("LLM_HEDGE_MIN_DELAY", "0.01")
+
+
+def test_slow_primary_is_hedged_once_latencies_are_known(monkeypatch, hedge_env):
+    monkeypatch.setenv("LLM_HEDGE_ROLES", "hedged")
+    window = latency_window("hedged", 500)
+    for _ in range(3):
+        window.add(0.02)
+    llm = HedgedRunnable(runnable=deployment("primary", delay=0.5), fallbacks=[deployment("hedge")], role="hedged")
+    start = time.perf_counter()
+    assert llm.invoke("question") == "hedge"
+    assert time.perf_counter() - start < 0.4
+
+
+def test_no_hedge_without_latency_history(monkeypatch, hedge_env):
+    monkeypatch.setenv("LLM_HEDGE_ROLES", "cold")
+    llm = HedgedRunnable(runnable=deployment("primary", delay=0.1), fallbacks=[deployment("hedge")], role="cold")
+    assert llm.invoke("question") == "primary"
+    assert latency_window("cold", 500).quantile(0.5, 1) == pytest.approx(0.1, abs=0.05)
+
+
+def test_failed_deployments_fall_back_in_order(monkeypatch, hedge_env):
+    monkeypatch.setenv("LLM_HEDGE_ROLES", "failing")
+    llm = HedgedRunnable(
+        runnable=deployment(None, error=ValueError("primary down")),
+        fallbacks=[deployment(None, error=ValueError("hedge down")), deployment("last")],
+        role="failing",
+    )
+    assert llm.invoke("question") == "last"
+
+    broken = HedgedRunnable(runnable=deployment(None, error=ValueError("down")),
+                            fallbacks=[deployment(None, error=ValueError("also down"))], role="failing")
+    with pytest.raises(ValueError, match="^down$"):
+        broken.invoke("question")
@@ -0,0 +1,46 @@
+import httpx
+
+from app.api.v1.utils.admission import AdmissionController, AdmissionTransport
+from app.api.v1.utils.config import Config
+from app.api.v1.utils.http_client import get_http_client, role_timeout
+
+URL = "https://example.openai.azure.com/openai/deployments/gpt-4o/chat/completions"
+
+
+def test_role_timeouts_can_be_overridden_per_role(monkeypatch):
+    monkeypatch.setenv("LLM_CONNECT_TIMEOUT_ROUTER", "2")
+    monkeypatch.setenv("LLM_READ_TIMEOUT_ROUTER", "7")
+    timeout = role_timeout(Config(), "router")
+    assert (timeout.connect, timeout.read, timeout.write, timeout.pool) == (2.0, 7.0, 7.0, 2.0)
+
+
+def test_one_pooled_client_per_process_behind_admission(monkeypatch):
+    monkeypatch.setenv("LLM_ADMISSION_ENABLED", "true")
+    get_http_client.cache_clear()
+    try:
+        client = get_http_client()
+        assert get_http_client() is client
+        assert isinstance(client._transport, AdmissionTransport)
+    finally:
+        get_http_client.cache_clear()
+        client.close()
+
+
+def test_admission_transport_feeds_throttling_back_to_the_limiter(monkeypatch):
+    monkeypatch.setenv("LLM_TPM_LIMIT_GPT_4O", "100000")
+    responses = iter([
+        httpx.Response(429, headers={"retry-after": "1"}),
+        httpx.Response(200, json={"usage": {"total_tokens": 10}}),
+    ])
+    controller = AdmissionController(Config())
+    client = httpx.Client(transport=AdmissionTransport(httpx.MockTransport(lambda request: next(responses)),
+                                                       controller))
+    limiter = controller.limiter("gpt-4o")
+
+    assert client.post(URL, json={"messages": [], "max_tokens": 100}).status_code == 429
+    assert limiter.paused_until > 0 and limiter.in_flight == 0
+    limiter.paused_until = 0
+    level = limiter.tokens.level
+    assert client.post(URL, json={"messages": [], "max_tokens": 100}).json()["usage"]["total_tokens"] == 10
+    # Only the tokens actually used stay charged; the rest of the estimate is refunded.
+    assert limiter.tokens.level >= level - 10
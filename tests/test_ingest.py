@@ -0,0 +1,167 @@
+import io
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.api.v1.spark.services import (
+    SALES_COLUMNS,
+    NumpySalesDataGenerator,
+    _chained_choice,
+    dataframe_to_csv_buffer,
+    prefetch,
+)
+from benchmarks.ingest_throughput import MemorySampler
+from db.connect import PostgreSQLDatabase
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement):
+        self.connection.statements.append(statement)
+
+    def copy_expert(self, statement, payload):
+        if self.connection.fail_on is not None and len(self.connection.copied) == self.connection.fail_on:
+            raise RuntimeError("connection reset")
+        self.connection.statements.append(statement)
+        self.connection.copied.append(payload.read())
+        self.rowcount = self.connection.copied[-1].count("\n")
+
+
+class FakeConnection:
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.statements, self.copied = [], []
+        self.commits = self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def make_database(connection):
+    db = PostgreSQLDatabase("db", "user", "password")
+    db.connection = connection
+    return db
+
+
+def test_csv_buffer_writes_nulls_two_decimals_and_iso_dates():
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2024-03-01"]),
+        "price": [1.005],
+        "promo_type": [None],
+        "promo_flag": [True],
+    })
+    assert dataframe_to_csv_buffer(df).read() == "2024-03-01,1.00,,True\n"
+
+
+def test_prefetch_keeps_order_and_stays_bounded():
+    produced = []
+
+    def items():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    consumer = prefetch(items(), depth=2)
+    assert next(consumer) == 0
+    # The producer runs at most `depth` items ahead (plus the one it is blocked on).
+    assert len(produced) <= 4
+    assert list(consumer) == list(range(1, 10))
+
+
+def test_prefetch_reraises_producer_errors():
+    def items():
+        yield 1
+        raise ValueError("bad chunk")
+
+    consumer = prefetch(items())
+    assert next(consumer) == 1
+    with pytest.raises(ValueError, match="bad chunk"):
+        next(consumer)
+
+
+def test_prefetch_stops_the_producer_when_the_consumer_quits():
+    before = threading.active_count()
+    consumer = prefetch(iter(range(1_000)), depth=1)
+    next(consumer)
+    consumer.close()
+    assert not [t for t in threading.enumerate() if t.name == "chunk-prefetch"]
+    assert threading.active_count() == before
+
+
+def test_copy_csv_chunks_loads_every_chunk_in_one_transaction():
+    connection = FakeConnection()
+    chunks = [io.StringIO("a,1\nb,2\n"), io.StringIO("c,3\n")]
+    assert make_database(connection).copy_csv_chunks("bronze.sales_data", ["name", "qty"], chunks) == 3
+    assert connection.statements == ["COPY bronze.sales_data (name, qty) FROM STDIN WITH (FORMAT csv)"] * 2
+    assert (connection.commits, connection.rollbacks) == (1, 0)
+
+
+def test_copy_csv_chunks_rolls_back_a_failed_load():
+    connection = FakeConnection(fail_on=1)
+    chunks = [io.StringIO("a,1\n"), io.StringIO("b,2\n")]
+    assert make_database(connection).copy_csv_chunks("bronze.sales_data", ["name", "qty"], chunks, truncate=True) == -1
+    # The TRUNCATE was part of the rolled back transaction.
+    assert connection.statements[0] == "TRUNCATE TABLE bronze.sales_data"
+    assert (connection.commits, connection.rollbacks) == (0, 1)
+    assert make_database(None).copy_csv_chunks("bronze.sales_data", ["name"], chunks) == -1
+
+
+def test_memory_sampler_reports_peaks_in_mib():
+    with MemorySampler(interval=0.01) as memory:
+        pass
+    report = memory.report()
+    if memory._supported:
+        assert 0 < report["peak_rss_mib"] <= report["peak_rss_with_children_mib"]
+    else:
+        assert report == {"peak_rss_mib": None, "peak_rss_with_children_mib": None}
+
+
+def test_chained_choice_draws_every_branch_like_spark():
+    labels = _chained_choice(np.random.default_rng(0), 200_000, (0.33, 0.66), ("North", "South", "East"))
+    shares = {label: np.mean(labels == label) for label in ("North", "South", "East")}
+    # P(South) = (1 - 0.33) * 0.66, not 0.66 - 0.33.
+    assert shares["North"] == pytest.approx(0.33, abs=0.01)
+    assert shares["South"] == pytest.approx(0.67 * 0.66, abs=0.01)
+    assert shares["East"] == pytest.approx(0.67 * 0.34, abs=0.01)
+
+
+def test_numpy_generator_matches_the_bronze_schema():
+    df = NumpySalesDataGenerator(seed=1).generate_chunk(50_000)
+    assert list(df.columns) == SALES_COLUMNS
+    assert df["date"].between("2022-01-01", "2022-12-31").all()
+    assert df["store_id"].between(1, 10).all() and df["sku_id"].between(101, 150).all()
+    assert df["inventory_level"].between(100, 999).all()
+    assert set(df["category"]) == {"Beverages", "Snacks", "Dairy", "Household", "Personal Care"}
+    assert set(df["store_size"]) == {"Small", "Medium", "Large"}
+    assert df["promo_flag"].mean() == pytest.approx(0.2, abs=0.01)
+    # Promotions set a type, discount the price by 20% and sell 20-39 units instead of 10-19.
+    promo = df[df["promo_flag"]]
+    assert promo["promo_type"].notna().all() and df.loc[~df["promo_flag"], "promo_type"].isna().all()
+    assert promo["units_sold"].between(20, 39).all()
+    assert df.loc[~df["promo_flag"], "units_sold"].between(10, 19).all()
+    assert np.allclose(df["revenue"], df["units_sold"] * df["price"], rtol=1e-6)
+    assert df["holiday_flag"].equals(df["date"].dt.dayofweek >= 5)
+
+
+def test_numpy_generator_is_seeded_and_chunked():
+    chunks = list(NumpySalesDataGenerator(seed=3).generate_chunks(2_500, chunk_size=1_000))
+    assert [len(chunk) for chunk in chunks] == [1_000, 1_000, 500]
+    again = NumpySalesDataGenerator(seed=3).generate_chunk(1_000)
+    pd.testing.assert_frame_equal(chunks[0], again)
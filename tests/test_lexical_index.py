@@ -0,0 +1,77 @@
+import os
+
+from app.api.v1.utils.config import Config
+from app.api.v1.utils.lexical_index import BM25Index, LexicalIndexRegistry, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    assert tokenize("What is the price of SKU-105?") == ["price", "sku-105", "sku", "105"]
+
+
+def test_bm25_ranks_rare_exact_terms_first():
+    index = BM25Index()
+    index.add("a", "Quarterly revenue grew in every region.")
+    index.add("b", "Product sku-105 was discontinued in March.")
+    index.add("c", "Revenue by region and product line.")
+    results = index.search("sku-105 revenue", k=3)
+    assert [doc_id for doc_id, _ in results][0] == "b"
+    assert {doc_id for doc_id, _ in results} == {"a", "b", "c"}
+
+    index.remove("b")
+    assert "b" not in [doc_id for doc_id, _ in index.search("sku-105")]
+    assert BM25Index.from_dict(index.to_dict()).search("revenue") == index.search("revenue")
+
+
+def test_reciprocal_rank_fusion_favours_documents_ranked_by_both():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d", "c"]], k=60)
+    assert [doc_id for doc_id, _ in fused] == ["b", "c", "a", "d"]
+    assert dict(fused)["c"] == 2 / 63
+
+
+def test_registry_persists_and_removes(tmp_path):
+    registry = LexicalIndexRegistry(str(tmp_path), max_sessions=1)
+    registry.update("s1", {"1": "alpha beta"})
+    registry.update("s2", {"2": "gamma"})
+    # s1 was evicted from memory and comes back from disk.
+    assert registry.get("s1").search("alpha")[0][0] == "1"
+    registry.update("s1", {"3": "alpha delta"}, removed=["1"])
+    assert [doc_id for doc_id, _ in registry.get("s1").search("alpha")] == ["3"]
+    registry.drop("s1")
+    assert registry.get("s1") is None
+    assert registry.version("s1") == (0, 0, 0)
+    registry.drop("never-indexed")
+    assert not (tmp_path / "never-indexed").exists()
+
+
+def test_registry_sees_updates_of_other_workers(tmp_path):
+    # Two registries on one directory behave like two worker processes.
+    first, second = LexicalIndexRegistry(str(tmp_path)), LexicalIndexRegistry(str(tmp_path))
+    first.update("s", {"1": "alpha"})
+    assert second.get("s").search("alpha")[0][0] == "1"
+
+    second.update("s", {"2": "beta"})
+    index, version = first.snapshot("s")
+    assert version == first.version("s")
+    assert set(index.texts) == {"1", "2"}
+
+    # An update starts from the persisted file, so neither worker's chunks are lost.
+    first.update("s", {"3": "gamma"})
+    assert set(second.get("s").texts) == {"1", "2", "3"}
+
+    second.drop("s")
+    assert first.get("s") is None
+
+
+def test_dropped_session_leaves_nothing_behind(tmp_path):
+    registry = LexicalIndexRegistry(str(tmp_path))
+    registry.update("s", {"1": "alpha"})
+    assert sorted(p.name for p in (tmp_path / "s").iterdir()) == ["lexical_index.json", "lexical_index.json.lock"]
+    registry.drop("s")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_index_is_kept_apart_from_uploads(monkeypatch):
+    monkeypatch.delenv("LEXICAL_INDEX_DIR", raising=False)
+    monkeypatch.delenv("UPLOAD_DIR", raising=False)
+    conf = Config()
+    assert os.path.abspath(conf.lexical_index_dir) != os.path.abspath(conf.upload_dir)
@@ -0,0 +1,53 @@
+import uuid
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from prometheus_client import REGISTRY
+
+from app.api.v1.utils.metrics import LLMMetricsCallback, metrics_middleware, metrics_response, record_cache_lookup
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_requests_are_labelled_with_the_route_template():
+    app = FastAPI()
+    app.middleware("http")(metrics_middleware)
+    app.get("/items/{item_id}")(lambda item_id: {"id": item_id})
+    app.get("/metrics")(metrics_response)
+    labels = {"method": "GET", "route": "/items/{item_id}", "status": "200"}
+    before = sample("http_request_duration_seconds_count", **labels)
+
+    client = TestClient(app)
+    client.get("/items/1")
+    client.get("/items/2")
+
+    assert sample("http_request_duration_seconds_count", **labels) == before + 2
+    assert 'route="/items/{item_id}"' in client.get("/metrics").text
+
+
+def test_llm_callback_records_latency_and_token_usage():
+    callback = LLMMetricsCallback("metrics-test")
+    run_id = uuid.uuid4()
+    callback.on_chat_model_start({}, [[]], run_id=run_id)
+    message = AIMessage(content="ok", usage_metadata={"input_tokens": 120, "output_tokens": 8, "total_tokens": 128,
+                                                      "input_token_details": {"cache_read": 100}})
+    callback.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]), run_id=run_id)
+
+    assert sample("llm_request_duration_seconds_count", role="metrics-test") == 1
+    assert sample("llm_tokens_total", role="metrics-test", kind="prompt") == 120
+    assert sample("llm_tokens_total", role="metrics-test", kind="completion") == 8
+    assert sample("llm_tokens_total", role="metrics-test", kind="cached_prompt") == 100
+
+    callback.on_chat_model_start({}, [[]], run_id=run_id)
+    callback.on_llm_error(RuntimeError("timeout"), run_id=run_id)
+    assert sample("llm_errors_total", role="metrics-test") == 1
+
+
+def test_cache_lookups_are_counted():
+    before = sample("cache_requests_total", cache="metrics-test", result="hit")
+    record_cache_lookup("metrics-test", True)
+    assert sample("cache_requests_total", cache="metrics-test", result="hit") == before + 1
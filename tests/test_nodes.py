@@ -0,0 +1,49 @@
+import pytest
+from langchain_core.messages import HumanMessage
+
+from app.api.v1.utils import nodes
+from app.api.v1.utils.nodes import _score_gate
+from app.api.v1.utils.shared import RagJudgeModel
+
+
+@pytest.mark.parametrize("chunks, top_score, expected", [
+    ([], None, (False, "no hits")),
+    (["a"], None, (None, "no vector score")),
+    (["a"], 0.95, (True, "high score")),
+    (["a"], 0.5, (False, "low score")),
+    (["a"], 0.8, (None, "ambiguous score")),
+])
+def test_score_gate(chunks, top_score, expected):
+    assert _score_gate(chunks, top_score) == expected
+
+
+def test_score_gate_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("RAG_GATE_ENABLED", "false")
+    assert _score_gate(["a"], 0.99) == (None, "gate disabled")
+
+
+class FakeJudge:
+    def __init__(self, sufficient):
+        self.sufficient = sufficient
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return RagJudgeModel(sufficient=self.sufficient)
+
+
+@pytest.mark.parametrize("scored, verdict, route, judged", [
+    ([("revenue grew 5%", 0.93)], False, "answer", 0),
+    ([("unrelated", 0.4)], True, "web", 0),
+    ([("maybe relevant", 0.8)], True, "answer", 1),
+    ([("sku-105 lexical match", None)], False, "web", 1),
+])
+def test_rag_node_only_asks_the_judge_when_scores_are_ambiguous(monkeypatch, scored, verdict, route, judged):
+    judge = FakeJudge(verdict)
+    monkeypatch.setattr(nodes, "search_knowledge_base", lambda query, session_id: scored)
+    monkeypatch.setattr(nodes, "get_judge_llm", lambda: judge)
+    state = {"messages": [HumanMessage(content="How did revenue develop?")], "session_id": "s"}
+    out = nodes.rag_node(state)
+    assert out["route"] == route
+    assert out["rag"] == [text for text, _ in scored]
+    assert judge.calls == judged
@@ -0,0 +1,36 @@
+import string
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from app.api.v1.utils.config import Config
+from app.api.v1.utils.prompts import PROMPTS, Prompt, get_prompt
+
+
+def variables(prompt: Prompt):
+    return {name for _, name, _, _ in string.Formatter().parse(prompt.human) if name}
+
+
+@pytest.mark.parametrize("name", sorted(PROMPTS))
+def test_prompts_share_a_static_prefix(name):
+    prompt = get_prompt(name)
+    first = prompt.render(**{v: "first value" for v in variables(prompt)})
+    second = prompt.render(**{v: "another {value}" for v in variables(prompt)})
+    assert isinstance(first[0], SystemMessage)
+    assert first[0].content == second[0].content == prompt.system
+    assert first[-1].content != second[-1].content
+
+
+def test_history_goes_between_the_static_and_variable_parts():
+    prompt = Prompt("test", system="Static rules with {braces}.", human="Q: {question}", history=True)
+    history = [HumanMessage(content="earlier"), AIMessage(content="answer")]
+    messages = prompt.render(chat_history=history, question="now?")
+    assert [m.content for m in messages] == ["Static rules with {braces}.", "earlier", "answer", "Q: now?"]
+    assert prompt.render(question="no history")[1:] == [HumanMessage(content="Q: no history")]
+    assert prompt.static_tokens > 0
+
+
+def test_analyst_row_limit_matches_the_fetch_cap():
+    rows = Config().analyst_max_result_rows
+    assert f"Max rows: {rows}. Add LIMIT {rows} if necessary." in get_prompt("analyst").system
+    assert "Max rows" not in get_prompt("analyst_export").system
@@ -0,0 +1,108 @@
+import pytest
+
+pytest.importorskip("pyodbc", reason="pyodbc needs the ODBC driver manager (libodbc)", exc_type=ImportError)
+
+from app.api.v1.utils import session_lifecycle
+from app.api.v1.utils.config import Config
+from app.api.v1.utils.session_lifecycle import SessionLifecycleManager
+
+
+class FakeVectorDB:
+    def __init__(self, failing=()):
+        self.failing = failing
+
+    def delete_session_chunks(self, session_id):
+        if session_id in self.failing:
+            raise RuntimeError("search service unavailable")
+        return 3
+
+
+class FakeAzureDB:
+    locks = set()
+
+    def __init__(self, expired=(), schema_applied=True):
+        self.expired = [list(batch) for batch in expired]
+        self.schema_applied = schema_applied
+        self.purged = []
+
+    def session_schema_applied(self):
+        return self.schema_applied
+
+    def try_app_lock(self, resource):
+        if resource in FakeAzureDB.locks:
+            return False
+        FakeAzureDB.locks.add(resource)
+        return True
+
+    def release_app_lock(self, resource):
+        FakeAzureDB.locks.discard(resource)
+
+    def get_expired_sessions(self, idle_seconds, limit):
+        return self.expired.pop(0) if self.expired else []
+
+    def purge_sessions(self, session_ids, archive=True):
+        self.purged.append((list(session_ids), archive))
+        return 2 * len(session_ids)
+
+    def disconnect(self):
+        pass
+
+
+@pytest.fixture
+def manager(monkeypatch, tmp_path):
+    monkeypatch.setenv("UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(session_lifecycle, "delete_checkpoints", lambda session_id: None)
+    monkeypatch.setattr(session_lifecycle, "get_vector_db_manager", lambda: FakeVectorDB(failing={"broken"}))
+    for session_id in ("s1", "broken"):
+        (tmp_path / session_id).mkdir()
+        (tmp_path / session_id / "report.txt").write_text("12345")
+    return SessionLifecycleManager(Config())
+
+
+def test_purge_releases_data_and_keeps_sessions_that_failed(manager, tmp_path):
+    azure_db = FakeAzureDB()
+    stats = manager.purge(["s1", "broken"], archive=True, azure_db=azure_db)
+
+    assert azure_db.purged == [(["s1"], True)]
+    assert stats == {"sessions": 1, "vector_chunks": 3, "files": 1, "bytes": 5, "history_rows": 2}
+    assert not (tmp_path / "s1").exists()
+    assert (tmp_path / "broken" / "report.txt").exists()
+
+
+def test_session_ids_cannot_escape_the_upload_dir(manager, tmp_path):
+    assert manager._remove_files("..") == (0, 0)
+    assert manager._remove_files("../etc") == (0, 0)
+    assert tmp_path.exists()
+
+
+def test_sweep_stops_at_sessions_it_could_not_release(manager, monkeypatch):
+    azure_db = FakeAzureDB(expired=[["s1", "broken"], ["broken"]])
+    monkeypatch.setattr(session_lifecycle, "AzureSQLManager", lambda conf: azure_db)
+    totals = manager.sweep()
+    assert azure_db.purged == [(["s1"], manager.conf.session_archive_history)]
+    assert totals["sessions"] == 1
+    assert manager.last_sweep is totals
+
+
+def test_only_one_worker_sweeps_at_a_time(manager, monkeypatch):
+    azure_db = FakeAzureDB(expired=[["s1"]])
+    monkeypatch.setattr(session_lifecycle, "AzureSQLManager", lambda conf: azure_db)
+    # Another worker holds the sweep lock.
+    FakeAzureDB.locks.add(session_lifecycle.SWEEP_LOCK)
+    try:
+        assert manager.sweep()["skipped"] == "another worker is sweeping"
+        assert azure_db.purged == []
+    finally:
+        FakeAzureDB.locks.clear()
+
+    assert manager.sweep()["sessions"] == 1
+    # The lock is released once the sweep is done.
+    assert FakeAzureDB.locks == set()
+
+
+def test_sweep_waits_for_the_session_schema(manager, monkeypatch):
+    azure_db = FakeAzureDB(expired=[["s1"]], schema_applied=False)
+    monkeypatch.setattr(session_lifecycle, "AzureSQLManager", lambda conf: azure_db)
+    assert manager.sweep()["skipped"] == "schema not applied"
+    assert azure_db.purged == []
+    assert FakeAzureDB.locks == set()
@@ -0,0 +1,60 @@
+import threading
+import time
+
+import pytest
+
+from app.api.v1.utils.single_flight import SingleFlight, normalize_key
+
+
+def test_normalize_key_ignores_case_and_spacing():
+    assert normalize_key("  Total  Revenue\tby Region ") == "total revenue by region"
+
+
+def test_concurrent_calls_with_one_key_share_one_execution():
+    group = SingleFlight("test")
+    calls, started = [], threading.Event()
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        time.sleep(0.2)
+        return value * 2
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(group.do("k", slow, 21)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(group.do("k", slow, 21))) for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader, *followers]:
+        thread.join()
+
+    assert calls == [21]
+    assert results == [42] * 5
+    # Nothing is cached once the call completed.
+    assert group.do("k", lambda: "again") == "again"
+
+
+def test_followers_receive_the_leaders_exception():
+    group = SingleFlight("test")
+    started, errors = threading.Event(), []
+
+    def failing():
+        started.set()
+        time.sleep(0.1)
+        raise ValueError("boom")
+
+    def follower():
+        started.wait()
+        try:
+            group.do("k", lambda: "unused")
+        except ValueError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=follower)
+    thread.start()
+    with pytest.raises(ValueError):
+        group.do("k", failing)
+    thread.join()
+    assert [str(e) for e in errors] == ["boom"]
@@ -0,0 +1,71 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.spark import apis
+from app.api.v1.spark.services import SALES_COLUMNS
+
+
+class FakeDatabase:
+    instances = []
+
+    def __init__(self, **kwargs):
+        self.loads, self.scripts = [], []
+        FakeDatabase.instances.append(self)
+
+    def connect(self):
+        pass
+
+    def execute_ddl_script(self, script):
+        self.scripts.append(script)
+        return True
+
+    def copy_csv_chunks(self, table, columns, chunks, truncate=False):
+        rows = [line for chunk in chunks for line in chunk.read().splitlines()]
+        self.loads.append((table, columns, truncate, rows))
+        return len(rows)
+
+    def close_connection(self):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("BRONZE_SCHEMA", "bronze")
+    monkeypatch.setenv("BRZ_SALES_TABLE_NAME", "sales_data")
+    monkeypatch.setattr(apis, "PostgreSQLDatabase", FakeDatabase)
+    FakeDatabase.instances = []
+    app = FastAPI()
+    app.include_router(apis.spark_router)
+    return TestClient(app)
+
+
+def ingest(client, **params):
+    return client.post("/spark/ingest-bronze-tables", params=params).json()
+
+
+def test_numpy_mode_truncates_and_copies_in_one_load(client):
+    body = ingest(client, mode="numpy", num_rows=2_500, chunk_size=1_000, seed=7)
+    assert body["message"] == "2500 records loaded successfully" and body["mode"] == "numpy"
+    (db,) = FakeDatabase.instances
+    # No separate TRUNCATE: it runs inside copy_csv_chunks' transaction.
+    assert db.scripts == []
+    ((table, columns, truncate, rows),) = db.loads
+    assert (table, columns, truncate, len(rows)) == ("bronze.sales_data", SALES_COLUMNS, True, 2_500)
+
+
+def test_numpy_mode_is_reproducible_with_a_seed(client):
+    ingest(client, mode="numpy", num_rows=100, chunk_size=30, seed=7)
+    ingest(client, mode="numpy", num_rows=100, chunk_size=30, seed=7)
+    first, second = (db.loads[0][3] for db in FakeDatabase.instances)
+    assert first == second
+
+
+def test_failed_copy_is_reported(client, monkeypatch):
+    monkeypatch.setattr(FakeDatabase, "copy_csv_chunks",
+                        lambda self, table, columns, chunks, truncate=False: -1)
+    assert ingest(client, mode="numpy", num_rows=10)["message"] == "Data ingestion failed"
+
+
+def test_unknown_mode_is_rejected(client):
+    assert client.post("/spark/ingest-bronze-tables", params={"mode": "pandas"}).status_code == 422
@@ -0,0 +1,108 @@
+from app.api.v1.utils import tools
+from app.api.v1.utils.sql_templates import SqlTemplateLibrary
+
+SQL = "SELECT SUM(amount) FROM sales WHERE region = %s AND year = %s"
+
+
+def make_library(**kwargs):
+    # Every question embeds alike, so only the alignment in `extract` decides a match.
+    library = SqlTemplateLibrary("", embed=lambda text: [1.0, 0.0], **kwargs)
+    library.learn("analyst", "total revenue for South in 2022", SQL, ["South", 2022], "Revenue of a region.")
+    library.learn("analyst", "total revenue for East in 2021", SQL, ["East", 2021], "Revenue of a region.")
+    return library
+
+
+def test_extracts_slot_values_with_the_learned_types():
+    template, params = make_library().match("analyst", "total revenue for North in 2023")
+    assert template.sql == SQL
+    assert params == ["North", 2023]
+
+
+def test_filler_words_may_differ():
+    _, params = make_library().match("analyst", "show me the total revenue for west in 2020 please")
+    assert params == ["West", 2020]
+
+
+def test_slot_does_not_swallow_neighbouring_words():
+    library = SqlTemplateLibrary("", embed=lambda text: [1.0, 0.0])
+    sql = "SELECT SUM(amount) FROM sales WHERE region = %s"
+    library.learn("analyst", "total revenue for South", sql, ["South"], "")
+    library.learn("analyst", "total revenue for East", sql, ["East"], "")
+    assert library.match("analyst", "total revenue for North in 2023") is None
+    assert library.match("analyst", "total revenue for North and South") is None
+    assert library.match("analyst", "total revenue for North")[1] == ["North"]
+
+
+def test_changed_qualifier_is_not_a_match():
+    library = SqlTemplateLibrary("", embed=lambda text: [1.0, 0.0])
+    sql = "SELECT * FROM orders WHERE created_at >= date_trunc(%s, now()) AND status = %s"
+    library.learn("analyst", "open orders this month with status shipped", sql, ["month", "shipped"], "")
+    library.learn("analyst", "open orders this month with status pending", sql, ["month", "pending"], "")
+    assert library.match("analyst", "open orders last month with status shipped") is None
+    assert library.match("analyst", "open orders this week with status failed")[1] == ["week", "failed"]
+
+
+def test_template_needs_support_and_inlined_literals_are_not_learned():
+    library = SqlTemplateLibrary("", embed=lambda text: [1.0, 0.0])
+    library.learn("analyst", "total revenue for South in 2022", SQL, ["South", 2022], "")
+    assert library.match("analyst", "total revenue for North in 2023") is None
+    assert not library.learn("analyst", "total revenue for South in 2022",
+                             "SELECT SUM(amount) FROM sales WHERE region = %s AND year = 2022", ["South"], "")
+
+
+def test_empty_template_result_falls_back_to_the_llm(monkeypatch):
+    library = make_library()
+    monkeypatch.setattr(tools, "get_sql_templates", lambda: library)
+    executed = []
+
+    def execute(sql, params):
+        executed.append(params)
+        return {"columns": ["sum"], "rows": [] if params[0] == "North" else [[10]], "truncated": False}
+
+    def is_empty(output):
+        return not output["rows"]
+
+    assert tools._run_sql_template("total revenue for North in 2023", execute, "analyst", is_empty) is None
+    output, response = tools._run_sql_template("total revenue for West in 2023", execute, "analyst", is_empty)
+    assert output["rows"] == [[10]]
+    assert response.params == ["West", 2023]
+    assert executed == [["North", 2023], ["West", 2023]]
+    template = next(iter(library.templates.values()))
+    assert (template.hits, template.failures) == (1, 0)
+
+
+def test_workers_merge_their_templates_in_the_shared_file(tmp_path):
+    path = str(tmp_path / "templates.json")
+    # Two libraries on one file behave like two worker processes.
+    first = SqlTemplateLibrary(path, embed=lambda text: [1.0, 0.0])
+    second = SqlTemplateLibrary(path, embed=lambda text: [1.0, 0.0])
+    first.learn("analyst", "total revenue for South in 2022", SQL, ["South", 2022], "")
+    second.learn("analyst", "total revenue for East in 2021", SQL, ["East", 2021], "")
+    other_sql = "SELECT COUNT(*) FROM orders WHERE status = %s"
+    first.learn("analyst", "orders with status shipped", other_sql, ["shipped"], "")
+
+    reloaded = SqlTemplateLibrary(path, embed=lambda text: [1.0, 0.0])
+    assert {t.sql: t.support for t in reloaded.templates.values()} == {SQL: 2, other_sql: 1}
+    # The first worker picks up the example the second one learned.
+    assert first.match("analyst", "total revenue for North in 2023")[1] == ["North", 2023]
+    template, _ = second.match("analyst", "total revenue for North in 2023")
+    second.record(template, success=False)
+    first.record(template, success=False)
+    assert SqlTemplateLibrary(path, embed=lambda text: [1.0, 0.0]).templates[template.key].failures == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["templates.json", "templates.json.lock"]
+
+
+def test_learning_is_opt_in(monkeypatch):
+    learned = []
+
+    class Library:
+        def learn(self, *args):
+            learned.append(args)
+
+    monkeypatch.setattr(tools, "get_sql_templates", Library)
+    response = tools.AnalystModel(sql=SQL, explanation="", params=["South", 2022])
+    tools._learn_sql_template("total revenue for South in 2022", response, "analyst")
+    assert learned == []
+    monkeypatch.setenv("SQL_TEMPLATES_LEARN", "true")
+    tools._learn_sql_template("total revenue for South in 2022", response, "analyst")
+    assert len(learned) == 1
@@ -0,0 +1,38 @@
+import threading
+import time
+
+from app.api.v1.utils.startup import StartupTimer, lazy_client, startup_timer
+
+
+def test_lazy_client_builds_once_across_threads_and_reports_it():
+    built = []
+
+    @lazy_client("startup_test_client")
+    def get_client():
+        time.sleep(0.05)
+        built.append(object())
+        return built[-1]
+
+    assert built == []
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(get_client())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(built) == 1
+    assert all(result is built[0] for result in results)
+    assert startup_timer.phases["lazy:startup_test_client"] >= 0.05
+
+    get_client.cache_clear()
+    assert get_client() is not results[0]
+
+
+def test_startup_timer_reports_phases_and_total():
+    timer = StartupTimer()
+    with timer.phase("import_test"):
+        time.sleep(0.01)
+    phases = timer.report()
+    assert phases["import_test"] >= 0.01
+    assert phases["ready"] >= phases["import_test"]
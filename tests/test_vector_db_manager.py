@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.documents import Document
+
+from app.api.v1.utils.config import Config
+from app.api.v1.utils.lexical_index import LexicalIndexRegistry
+from app.api.v1.utils.vector_db_manager import VectorDBManager, apply_search_index_schema
+
+
+class FakeVectorStore:
+    def __init__(self):
+        self.searches = 0
+
+    def similarity_search_with_relevance_scores(self, query, k, filters):
+        self.searches += 1
+        return []
+
+
+def test_search_cache_follows_index_updates_of_other_workers(tmp_path):
+    store = FakeVectorStore()
+    manager = VectorDBManager(Config(), vector_store=store, lexical_indexes=LexicalIndexRegistry(str(tmp_path)))
+    other_worker = LexicalIndexRegistry(str(tmp_path))
+
+    manager.lexical_indexes.update("s", {"1": "quarterly revenue report"})
+    first = manager.search_chunks("quarterly revenue", "s")
+    assert [doc.metadata["id"] for doc in first] == ["1"]
+    searches = store.searches
+    # Served from the retrieval cache.
+    assert manager.search_chunks("Quarterly revenue", "s")[0].page_content == "quarterly revenue report"
+    assert store.searches == searches
+
+    other_worker.update("s", {"2": "revenue forecast"})
+    ids = [doc.metadata["id"] for doc in manager.search_chunks("quarterly revenue", "s")]
+    assert sorted(ids) == ["1", "2"]
+
+
+class ScoredVectorStore:
+    """Answers like Azure AI Search: the raw @search.score of a cosine match."""
+
+    def __init__(self, cosines):
+        self.cosines = cosines
+
+    def similarity_search_with_relevance_scores(self, query, k, filters):
+        return [(Document(page_content=text, metadata={"id": doc_id}), 1 / (2 - cosine))
+                for doc_id, text, cosine in self.cosines][:k]
+
+
+def test_scores_are_cosine_similarities_on_the_vector_and_hybrid_paths(tmp_path):
+    store = ScoredVectorStore([("1", "quarterly revenue report", 0.9), ("2", "return policy", 0.4)])
+    manager = VectorDBManager(Config(), vector_store=store, lexical_indexes=LexicalIndexRegistry(str(tmp_path)))
+    scores = {doc.metadata["id"]: doc.metadata.get("score") for doc in manager.search_chunks("revenue", "s")}
+    assert scores == pytest.approx({"1": 0.9, "2": 0.4})
+
+    # Hybrid: the fused chunks keep their vector score, a lexical-only chunk has none.
+    manager.lexical_indexes.update("s", {"1": "quarterly revenue report", "3": "revenue forecast"})
+    scores = {doc.metadata["id"]: doc.metadata.get("score") for doc in manager.search_chunks("revenue", "s")}
+    assert scores == pytest.approx({"1": 0.9, "2": 0.4, "3": None})
+
+
+def test_lexical_fast_path_chunks_carry_no_score(tmp_path, monkeypatch):
+    monkeypatch.setenv("LEXICAL_FAST_PATH_MIN_SCORE", "0")
+    store = FakeVectorStore()
+    manager = VectorDBManager(Config(), vector_store=store, lexical_indexes=LexicalIndexRegistry(str(tmp_path)))
+    manager.lexical_indexes.update("s", {"1": "product sku-105 discontinued", "2": "revenue by region"})
+    docs = manager.search_chunks("sku-105", "s")
+    assert [doc.metadata["id"] for doc in docs] == ["1"]
+    assert docs[0].metadata.get("score") is None
+    assert store.searches == 0
+
+
+def test_search_index_schema_adds_only_missing_fields(monkeypatch):
+    from azure.search.documents.indexes.models import SimpleField
+
+    class FakeIndexClient:
+        fields = [SimpleField(name="id", type="Edm.String", key=True), SimpleField(name="document_id", type="Edm.String")]
+        updates = []
+
+        def __init__(self, endpoint, credential):
+            pass
+
+        def get_index(self, name):
+            return SimpleNamespace(name=name, fields=list(self.fields))
+
+        def create_or_update_index(self, index):
+            FakeIndexClient.updates.append([field.name for field in index.fields])
+            FakeIndexClient.fields = index.fields
+
+    monkeypatch.setattr("azure.search.documents.indexes.SearchIndexClient", FakeIndexClient)
+    monkeypatch.setenv("AZURE_AI_SEARCH_ENDPOINT", "https://search.example.net")
+    monkeypatch.setenv("AZURE_AI_SEARCH_KEY", "key")
+    assert apply_search_index_schema() == ["chunk_hash"]
+    assert apply_search_index_schema() == []
+    assert FakeIndexClient.updates == [["id", "document_id", "chunk_hash"]]
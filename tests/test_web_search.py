@@ -0,0 +1,60 @@
+import pytest
+
+from app.api.v1.utils import tools
+
+
+class FakeTavily:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.queries = []
+
+    def invoke(self, payload):
+        self.queries.append(payload["query"])
+        if self.fail:
+            raise RuntimeError("rate limited")
+        return {"results": [{"title": "Rates", "content": "Held at 4%", "url": "https://example.com"}]}
+
+
+@pytest.fixture
+def tavily(monkeypatch, tmp_path):
+    monkeypatch.setenv("WEB_CACHE_DIR", str(tmp_path))
+    tools.get_web_cache.cache_clear()
+    fake = FakeTavily()
+    monkeypatch.setattr(tools, "get_tavily", lambda: fake)
+    yield fake
+    tools.get_web_cache.cache_clear()
+
+
+def test_repeated_query_is_served_from_the_cache(tavily):
+    first = tools.web_search_tool.invoke({"query": "Interest rates today"})
+    assert first == "Title: Rates\nContent: Held at 4%\nURL: https://example.com"
+    assert tools.web_search_tool.invoke({"query": "interest  rates today"}) == first
+    assert tavily.queries == ["Interest rates today"]
+
+
+def test_disk_tier_survives_a_new_memory_tier(tavily):
+    first = tools.web_search_tool.invoke({"query": "interest rates"})
+    # A fresh worker process starts with an empty memory tier and the same directory.
+    tools.get_web_cache.cache_clear()
+    assert tools.web_search_tool.invoke({"query": "interest rates"}) == first
+    assert len(tavily.queries) == 1
+
+
+def test_search_parameters_are_part_of_the_key(tavily, monkeypatch):
+    tools.web_search_tool.invoke({"query": "interest rates"})
+    monkeypatch.setenv("TAVILY_TOPIC", "news")
+    tools.web_search_tool.invoke({"query": "interest rates"})
+    assert len(tavily.queries) == 2
+
+
+def test_errors_are_cached_briefly_and_only_in_memory(tavily, monkeypatch):
+    tavily.fail = True
+    assert tools.web_search_tool.invoke({"query": "interest rates"}) == "WEB_SEARCH_TOOL::rate limited"
+    assert tools.web_search_tool.invoke({"query": "interest rates"}) == "WEB_SEARCH_TOOL::rate limited"
+    assert len(tavily.queries) == 1
+
+    # Not written to disk, so a new worker retries once the outage is over.
+    tavily.fail = False
+    tools.get_web_cache.cache_clear()
+    assert tools.web_search_tool.invoke({"query": "interest rates"}).startswith("Title: Rates")
+    assert len(tavily.queries) == 2